@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Reports the time taken to import each module when pifmod.main, or
+the modules needed by an action, are loaded, in the manner of
+"python -X importtime" (which Python 2 lacks).
+
+    python benchmarks/bench_startup.py [MODULE ...]
+
+MODULE defaults to pifmod.main. Times are in microseconds; "self"
+excludes, and "cumulative" includes, the modules imported in turn. The
+start-up budget checked by the tests is in test/test_startup.py.
+"""
+
+import __builtin__
+import sys
+import time
+
+_import = __builtin__.__import__
+# (depth, module, self time, cumulative time), in order of completion
+_report = []
+_stack = []
+
+
+def timed_import(name, *args, **kwds):
+    if name in sys.modules:
+        return _import(name, *args, **kwds)
+    _stack.append(0.)
+    start = time.time()
+    try:
+        return _import(name, *args, **kwds)
+    finally:
+        cumulative = time.time() - start
+        nested = _stack.pop()
+        if _stack:
+            _stack[-1] += cumulative
+        _report.append((len(_stack), name, cumulative - nested, cumulative))
+
+
+def main(modules):
+    __builtin__.__import__ = timed_import
+    try:
+        for module in modules:
+            timed_import(module)
+    finally:
+        __builtin__.__import__ = _import
+    print '{:>10s} | {:>10s} | module'.format('self [us]', 'cumulative')
+    for depth, name, self_time, cumulative in _report:
+        print '{:10d} | {:10d} | {}{}'.format(
+            int(1e6*self_time), int(1e6*cumulative), '  '*depth, name)
+    total = sum(c for d,n,s,c in _report if d == 0)
+    print 'total: {:.3f} s'.format(total)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ['pifmod.main'])
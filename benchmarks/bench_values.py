@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Compares the string-parsing and typed classification of property values
+using the columns of a pore-distribution-style JSON file.
+
+    python benchmarks/bench_values.py [FILE] [REPEAT]
+"""
+
+import json
+import os
+import sys
+import timeit
+from pifmod import values
+
+
+def main(filename, repeat):
+    with open(filename) as ifs:
+        jdata = json.load(ifs)
+    # columns are either lists or {"values": [...], "units": ...}
+    cols = [v.get('values') if isinstance(v, dict) else v
+            for v in jdata.values()]
+    cols = [c for c in cols if isinstance(c, list)]
+    nvalues = sum(len(c) for c in cols)
+    cases = [
+        ('parse_value(str(column))',
+            lambda: [values.parse_value(c) for c in cols]),
+        ('classify_value(column)',
+            lambda: [values.classify_value(c) for c in cols]),
+        ('classify_value(column, as_array=True)',
+            lambda: [values.classify_value(c, as_array=True) for c in cols]),
+    ]
+    print '{} columns, {} values from {}'.format(len(cols), nvalues, filename)
+    baseline = None
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        baseline = best if baseline is None else baseline
+        print '{:40s} {:9.4f} s  {:6.1f}x'.format(name, best, baseline/best)
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    default = os.path.join(here, '..', 'test', 'data', 'pore-distribution.json')
+    filename = sys.argv[1] if len(sys.argv) > 1 else default
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    main(filename, repeat)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+Times the pifmod hot paths on synthetic data and saves the results as
+JSON so that runs can be compared across commits.
+
+    python benchmarks/suite.py [--size small|medium|large] [-r REPEAT]
+        [-k PATTERN] [-o FILE] [--compare FILE]
+
+Cases (see build_cases):
+
+    load, dumps              pif.loads/pif.dumps of one large record
+    package-load/-dumps      the same for a multi-record package
+    property-get/-set/...    pifmod property, run in-process
+    property-import(-disk,   property FILE NAME, parsing the source
+      -warm)                 file, from the on-disk source cache, or
+                             already in memory
+    property-list            property --list FILE
+    uid                      pifmod -f uid UID
+    package-select           property on one record of a package, chosen
+                             with --select
+    sagittariidae-*          fetching a mock sample catalogue and
+                             linking a package against it
+
+Results are written to benchmarks/results/COMMIT.json unless -o is
+given. Each case records the best, median and mean of REPEAT runs, in
+seconds. With --compare, the ratio of each time to that in an earlier
+results file is printed as well (> 1 is slower).
+"""
+
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from pypif import pif
+from pifmod import main as pifmod
+from pifmod import sourcecache, urlio
+from pifmod.linkages import sagittariidae
+from test import mockserver
+import synthetic
+
+# size --> parameters of the synthetic data
+SIZES = {
+    'small' : {'nproperties' : 100, 'ndetails' : 20, 'vector_length' : 1000,
+               'matrix_shape' : (30, 30), 'nrecords' : 50, 'ncolumns' : 6,
+               'column_length' : 4000, 'nsamples' : 200},
+    'medium' : {'nproperties' : 1000, 'ndetails' : 100,
+                'vector_length' : 10000, 'matrix_shape' : (100, 100),
+                'nrecords' : 500, 'ncolumns' : 20, 'column_length' : 40000,
+                'nsamples' : 2000},
+    'large' : {'nproperties' : 5000, 'ndetails' : 500,
+               'vector_length' : 100000, 'matrix_shape' : (300, 300),
+               'nrecords' : 5000, 'ncolumns' : 50, 'column_length' : 200000,
+               'nsamples' : 20000}
+}
+
+
+class CatalogueHandler(mockserver.Handler):
+    """
+    Mock sagittariidae catalogue serving /projects/PROJECT/samples.
+    """
+    samples = '[]'
+
+    def do_GET(self):
+        self.send_body(CatalogueHandler.samples)
+
+
+def measure(func, setup=None, repeat=5):
+    """
+    Calls FUNC(SETUP()) REPEAT times, timing only FUNC.
+
+    Returns
+    -------
+    List of times, in seconds.
+    """
+    times = []
+    for i in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.time()
+        func(arg)
+        times.append(time.time() - start)
+    return times
+
+
+def summarize(times):
+    ordered = sorted(times)
+    n = len(ordered)
+    median = ordered[n//2] if n % 2 else 0.5*(ordered[n//2-1] + ordered[n//2])
+    return {'best' : ordered[0], 'median' : median,
+            'mean' : sum(ordered)/n, 'repeat' : n}
+
+
+def run_action(argv):
+    """
+    Returns a function, f(pifdata), that runs the pifmod command ARGV on
+    a record, as the CLI would, and returns the output.
+    """
+    args = pifmod.build_parser().parse_args(argv)
+    def run(pifdata):
+        pifmod.args = args
+        return pifmod.serialize(pifmod.perform(pifdata, args.action),
+                                pifmod.output_format(args.ofile))
+    return run
+
+
+class Workspace(object):
+    """
+    Synthetic data for one size, written to a temporary directory.
+    """
+    def __init__(self, params):
+        self.params = params
+        self.dir = tempfile.mkdtemp(prefix='pifmod-bench-')
+        self.record = synthetic.make_record(0,
+            nproperties=params['nproperties'], ndetails=params['ndetails'],
+            vector_length=params['vector_length'],
+            matrix_shape=params['matrix_shape'])
+        self.record_text = pif.dumps(self.record)
+        self.package = synthetic.make_package(params['nrecords'],
+            nproperties=10, ndetails=params['ndetails'])
+        self.package_text = pif.dumps(self.package)
+        self.source = os.path.join(self.dir, 'pore-distribution.json')
+        synthetic.write_json(synthetic.make_pore_distribution(
+            params['ncolumns'], params['column_length']), self.source)
+        self.catalogue = synthetic.make_catalogue(params['nsamples'],
+            nrecords=params['nrecords'])
+
+    def fresh_record(self):
+        return pif.loads(self.record_text)
+
+    def fresh_package(self):
+        return pif.loads(self.package_text)
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def cold_source(ws):
+    """
+    Returns a fresh record after dropping the parsed source files held
+    by pifmod.
+    """
+    pifmod.clear_sources()
+    return ws.fresh_record()
+
+
+def build_cases(ws):
+    """
+    Returns (name, func, setup) for each case. The sagittariidae cases
+    require a running mock catalogue (see serve_catalogue).
+    """
+    middle = 'prop{:04d}'.format(ws.params['nproperties']//2)
+    column = 'column {:03d}'.format(ws.params['ncolumns']//2)
+    selected = 'synthetic-{:08d}'.format(ws.params['nrecords']//2)
+    cases = [
+        ('load', lambda _: pif.loads(ws.record_text), None),
+        ('dumps', lambda p: pif.dumps(p), ws.fresh_record),
+        ('package-load', lambda _: pif.loads(ws.package_text), None),
+        ('package-dumps', lambda p: pif.dumps(p), ws.fresh_package),
+        ('property-get', run_action(['property', middle]), ws.fresh_record),
+        ('property-set', run_action(['property', 'new=[1, 2, 3]']),
+            ws.fresh_record),
+        ('property-set-force',
+            run_action(['-f', 'property', '{}=2.5'.format(middle)]),
+            ws.fresh_record),
+        ('property-import',
+            run_action(['--no-source-cache', 'property', ws.source, column]),
+            lambda: cold_source(ws)),
+        ('property-import-disk', run_action(['property', ws.source, column]),
+            lambda: cold_source(ws)),
+        ('property-import-warm', run_action(['property', ws.source, column]),
+            ws.fresh_record),
+        ('property-list', run_action(['property', '--list', ws.source]),
+            lambda: cold_source(ws)),
+        ('uid', run_action(['-f', 'uid', 'benchmark-uid']), ws.fresh_record),
+        ('package-select',
+            run_action(['--select', 'uid={}'.format(selected),
+                        'property', 'new=1']),
+            ws.fresh_package),
+    ]
+    return cases
+
+
+def serve_catalogue(ws):
+    """
+    Starts a mock catalogue holding the workspace's samples.
+
+    Returns
+    -------
+    (server, host URL)
+    """
+    CatalogueHandler.samples = json.dumps(ws.catalogue)
+    return mockserver.serve(CatalogueHandler)
+
+
+def sagittariidae_cases(ws, host):
+    projects = [(host, 'bench')]
+    linker = [None]
+    def factory(_):
+        # refreshed, so that the catalogue is fetched each time rather
+        # than read from the URL cache
+        linker[0] = sagittariidae.multi_link_factory(projects, refresh=True)
+    def link(records):
+        if linker[0] is None:
+            factory(None)
+        linker[0].link_all(records)
+    return [('sagittariidae-fetch', factory, None),
+            ('sagittariidae-link', link, ws.fresh_package)]
+
+
+def commit():
+    """
+    Returns the current git commit, or 'unknown'.
+    """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=here, stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, filename):
+    """
+    Prints the ratio of each time in RESULTS to that in FILENAME.
+    """
+    with open(filename) as ifs:
+        previous = json.load(ifs)
+    print '\ncompared with {} ({})'.format(
+        previous['meta']['commit'], filename)
+    for name, result in sorted(results.items()):
+        if name not in previous['results']:
+            continue
+        before = previous['results'][name]['best']
+        print '{:24s} {:9.4f} s -> {:9.4f} s  {:6.2f}x'.format(
+            name, before, result['best'], result['best']/before)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-k', dest='pattern', default='*',
+        help='Run only the cases matching this glob pattern.')
+    parser.add_argument('-o', '--output', default=None)
+    parser.add_argument('--compare', default=None,
+        help='Earlier results file to compare against.')
+    opts = parser.parse_args(argv)
+    params = SIZES[opts.size]
+    cachedir = tempfile.mkdtemp(prefix='pifmod-bench-cache-')
+    urlio.configure_cache(directory=os.path.join(cachedir, 'urlio'))
+    sourcecache.configure_cache(directory=os.path.join(cachedir, 'sources'),
+                                enabled=True)
+    ws = Workspace(params)
+    server, host = serve_catalogue(ws)
+    results = {}
+    try:
+        cases = build_cases(ws) + sagittariidae_cases(ws, host)
+        stderr = sys.stderr
+        for name, func, setup in cases:
+            if not fnmatch.fnmatch(name, opts.pattern):
+                continue
+            # silence per-sample warnings, e.g. from linking
+            sys.stderr = open(os.devnull, 'w')
+            try:
+                times = measure(func, setup, opts.repeat)
+            finally:
+                sys.stderr.close()
+                sys.stderr = stderr
+            results[name] = summarize(times)
+            print '{:24s} best {:9.4f} s  median {:9.4f} s'.format(
+                name, results[name]['best'], results[name]['median'])
+    finally:
+        server.shutdown()
+        server.server_close()
+        urlio.close_connections()
+        ws.close()
+        shutil.rmtree(cachedir, ignore_errors=True)
+    report = {
+        'meta' : {
+            'commit' : commit(),
+            'date' : datetime.datetime.now().isoformat(),
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'size' : opts.size,
+            'params' : params
+        },
+        'results' : results
+    }
+    output = opts.output
+    if output is None:
+        output = os.path.join(here, 'results',
+                              '{}.json'.format(report['meta']['commit']))
+    if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+        os.makedirs(os.path.dirname(os.path.abspath(output)))
+    with open(output, 'w') as ofs:
+        json.dump(report, ofs, indent=2, sort_keys=True)
+    print 'results written to {}'.format(output)
+    if opts.compare is not None:
+        compare(results, opts.compare)
+
+
+if __name__ == '__main__':
+    main()
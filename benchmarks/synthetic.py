@@ -0,0 +1,132 @@
+"""
+Generators of synthetic PIF records, multi-record packages and
+pore-distribution-style property source files for the benchmarks.
+
+Records are shaped like test/data/pif.json: a ChemicalSystem whose
+first preparation step holds the details (plate number, build, column,
+row) from which sagittariidae sample names are built, plus any number
+of additional details and properties. All generators are seeded, so a
+given set of parameters always produces the same data.
+"""
+
+import json
+import random
+from pypif import pif
+from pypif.obj import ChemicalSystem, ProcessStep, Property, Value
+
+
+def sample_details(index):
+    """
+    Returns the (plate number, build, column, row) of the INDEX-th
+    sample, which map to a unique sagittariidae sample name.
+    """
+    row = index % 99 + 1
+    column = chr(ord('A') + (index // 99) % 26)
+    build = (index // (99*26)) % 999 + 1
+    plate = index // (99*26*999) + 1
+    return (plate, build, column, row)
+
+
+def sample_name(index):
+    """
+    Returns the sagittariidae sample name of the INDEX-th sample.
+    """
+    return 'P{:03d}_B{:03d}_{:s}{:02d}'.format(*sample_details(index))
+
+
+def make_record(index=0, nproperties=10, ndetails=20, vector_length=0,
+                matrix_shape=None, seed=0):
+    """
+    Generates a synthetic PIF record.
+
+    Parameters
+    ----------
+    :index, int: Sample number (see sample_details).
+    :nproperties, int: Number of scalar properties, named prop0000, ...
+    :ndetails, int: Number of preparation details in addition to the
+        four that name the sample.
+    :vector_length, int: If nonzero, adds a property "vector" with this
+        many floats.
+    :matrix_shape, tuple: If given, (rows, columns) of an added
+        property "matrix" of floats.
+    :seed, int: Random seed.
+
+    Returns
+    -------
+    ChemicalSystem
+    """
+    rng = random.Random('{}-{}'.format(seed, index))
+    plate, build, column, row = sample_details(index)
+    details = [Value(name='plate number', scalars=plate),
+               Value(name='build', scalars=build),
+               Value(name='column', scalars=column),
+               Value(name='row', scalars=row)]
+    details.extend(Value(name='detail {:04d}'.format(i),
+                         scalars=round(rng.uniform(0, 100), 3), units='mm')
+                   for i in range(ndetails))
+    props = [Property(name='prop{:04d}'.format(i),
+                      scalars=round(rng.gauss(0, 1), 6), units='mm')
+             for i in range(nproperties)]
+    if vector_length:
+        props.append(Property(name='vector',
+            vectors=[rng.random() for i in range(vector_length)]))
+    if matrix_shape:
+        nrows, ncols = matrix_shape
+        props.append(Property(name='matrix',
+            matrices=[[rng.random() for j in range(ncols)]
+                      for i in range(nrows)]))
+    return ChemicalSystem(
+        uid='synthetic-{:08d}'.format(index),
+        names=['synthetic sample {}'.format(index)],
+        preparation=[ProcessStep(name='printing', details=details)],
+        properties=props)
+
+
+def make_package(nrecords=100, seed=0, **kwds):
+    """
+    Generates a list of NRECORDS records with consecutive sample
+    numbers. Other keywords are passed to make_record.
+    """
+    return [make_record(i, seed=seed, **kwds) for i in range(nrecords)]
+
+
+def make_catalogue(nsamples, nrecords=None):
+    """
+    Generates a sagittariidae sample list of NSAMPLES samples. The first
+    NRECORDS (default: all) match the records from make_package.
+    """
+    nrecords = nsamples if nrecords is None else nrecords
+    return [{'id' : 'id{:06d}'.format(i),
+             'name' : sample_name(i if i < nrecords else i + 10**6)}
+            for i in range(nsamples)]
+
+
+def make_pore_distribution(ncolumns=6, length=4000, seed=0):
+    """
+    Generates a pore-distribution-style source file: an integer
+    "Pore ID" list and NCOLUMNS float columns of LENGTH values, each
+    stored as {"values": [...], "units": ...}.
+
+    Returns
+    -------
+    dict, as decoded by json.load.
+    """
+    rng = random.Random(seed)
+    jdata = {'Pore ID' : range(1, length+1)}
+    for i in range(ncolumns):
+        jdata['column {:03d}'.format(i)] = {
+            'units' : 'mm',
+            'values' : [round(rng.expovariate(1.), 6) for j in range(length)]
+        }
+    return jdata
+
+
+def write_json(obj, filename):
+    """
+    Writes OBJ, PIF objects or JSON-serializable data, to FILENAME.
+    """
+    with open(filename, 'w') as ofs:
+        if isinstance(obj, dict):
+            json.dump(obj, ofs)
+        else:
+            pif.dump(obj, ofs)
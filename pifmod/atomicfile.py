@@ -0,0 +1,188 @@
+"""
+Atomic replacement of output files.
+
+Output is written to a temporary file in the same directory, flushed to
+disk and moved over the destination, so that readers see either the old
+or the new file and never a partial one, even if pifmod is interrupted.
+
+While the output matches the existing file, nothing is written: the
+data are compared against the file as they arrive, and only when they
+first differ is a temporary file created (holding the common prefix,
+copied from the existing file). Output identical to the existing file
+therefore leaves it untouched, including its modification time, which
+keeps make-style pipelines from rebuilding downstream files.
+
+    with AtomicFile('out.pif') as ofs:
+        ofs.write(...)
+
+Files that can be rebuilt, e.g. cache entries, may skip flushing to
+disk with sync=False.
+"""
+
+import os
+import tempfile
+
+
+def _read_umask():
+    """
+    Returns the umask of the process. os.umask can only read it by
+    setting it, which would briefly change it for other threads, so
+    where the kernel reports it in /proc that is used instead; this is
+    called once, at import.
+    """
+    try:
+        with open('/proc/self/status') as ifs:
+            for line in ifs:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (IOError, ValueError):
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# permissions of new files are 0666 less this
+_umask = _read_umask()
+
+
+class AtomicFile(object):
+    """
+    File-like object that atomically replaces FILENAME with the data
+    written to it when committed (or when a `with` block exits without
+    an exception). If the data are identical to the existing contents
+    of FILENAME, the file is left as it is. Unless SYNC is False, the
+    data are flushed to disk before the file is replaced.
+    """
+    def __init__(self, filename, sync=True):
+        # replace the target of a symbolic link rather than the link
+        self.filename = os.path.realpath(filename)
+        self.sync = sync
+        self.changed = None
+        self._tmp = None
+        self._ofs = None
+        self._size = 0
+        try:
+            self._existing = open(self.filename, 'rb')
+        except IOError:
+            self._existing = None
+            self._diverge()
+
+    def _diverge(self):
+        """
+        Starts the temporary file, holding the data written so far.
+        """
+        fd, self._tmp = tempfile.mkstemp(
+            prefix='.{}.'.format(os.path.basename(self.filename)),
+            dir=os.path.dirname(self.filename))
+        self._ofs = os.fdopen(fd, 'wb')
+        if self._existing is not None:
+            # copy the part that matched
+            self._existing.seek(0)
+            remaining = self._size
+            while remaining:
+                chunk = self._existing.read(min(remaining, 1024**2))
+                self._ofs.write(chunk)
+                remaining -= len(chunk)
+            self._existing.close()
+            self._existing = None
+
+    def write(self, data):
+        if self._ofs is None:
+            if self._existing.read(len(data)) == data:
+                self._size += len(data)
+                return
+            self._diverge()
+        self._ofs.write(data)
+
+    def flush(self):
+        if self._ofs is not None:
+            self._ofs.flush()
+
+    def commit(self):
+        """
+        Moves the data into place.
+
+        Returns
+        -------
+        True if FILENAME was replaced, False if it was left unchanged.
+        """
+        if self._ofs is None:
+            if self._existing.read(1) == '':
+                self._existing.close()
+                self._existing = None
+                self.changed = False
+                return False
+            # the existing file is longer
+            self._diverge()
+        try:
+            self._ofs.flush()
+            if self.sync:
+                os.fsync(self._ofs.fileno())
+            self._ofs.close()
+            self._ofs = None
+            _copy_mode(self.filename, self._tmp)
+            os.rename(self._tmp, self.filename)
+            self._tmp = None
+            if self.sync:
+                _fsync_directory(os.path.dirname(self.filename))
+        except:
+            self.discard()
+            raise
+        self.changed = True
+        return True
+
+    def discard(self):
+        """
+        Abandons the data written; FILENAME is left unchanged.
+        """
+        for f in (self._existing, self._ofs):
+            if f is not None:
+                f.close()
+        self._existing = self._ofs = None
+        if self._tmp is not None:
+            try:
+                os.remove(self._tmp)
+            except OSError:
+                pass
+            self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+#end 'class AtomicFile(object):'
+
+
+def _copy_mode(filename, tmp):
+    """
+    Gives TMP (created private by mkstemp) the permissions of FILENAME
+    or, for a new file, the default permissions. The umask is not read
+    here, as writes may run in several threads (see _read_umask).
+    """
+    try:
+        mode = os.stat(filename).st_mode & 07777
+    except OSError:
+        mode = 0666 & ~_umask
+    os.chmod(tmp, mode)
+
+
+def _fsync_directory(dirname):
+    """
+    Flushes the directory entry of a renamed file to disk, where the
+    platform allows it.
+    """
+    try:
+        fd = os.open(dirname or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
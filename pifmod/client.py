@@ -0,0 +1,127 @@
+"""
+Thin client for a running "pifmod serve" daemon.
+
+A pifmod invocation is forwarded over a Unix socket to the daemon, which
+keeps the interpreter, pypif and parsed data warm. If no daemon is
+listening, or the daemon cannot handle the command, the caller falls
+back to running the command in-process.
+"""
+
+import json
+import os
+import socket
+import sys
+from StringIO import StringIO
+
+# socket on which "pifmod serve" listens and to which requests are sent
+SOCKET = os.environ.get('PIFMOD_SOCKET',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pifmod', 'pifmod.sock'))
+
+# actions that may be forwarded to the daemon
+_actions = ('uid', 'property', 'apply', 'patch', 'sagittariidae')
+# actions that are always run in-process
+_local_actions = ('batch', 'diff', 'serve', 'store')
+
+
+def split_action(argv):
+    """
+    Splits ARGV into the global options and the action with its
+    arguments.
+    """
+    for i,arg in enumerate(argv):
+        if arg in _actions or arg in _local_actions:
+            return (argv[:i], argv[i:])
+    return (argv, [])
+
+
+def has_input(options):
+    """
+    Returns True if the global OPTIONS name an input file (-i/--input),
+    False otherwise.
+    """
+    for arg in options:
+        if arg.startswith('--input') or \
+           (arg.startswith('-') and not arg.startswith('--') and 'i' in arg):
+            return True
+    return False
+
+
+def request(message, socket_path=None):
+    """
+    Sends MESSAGE (dict) to the daemon and returns its response (dict),
+    or None if no daemon is listening on SOCKET_PATH. Raises
+    UnicodeDecodeError if MESSAGE holds strings that are not UTF-8.
+    """
+    socket_path = SOCKET if socket_path is None else socket_path
+    data = json.dumps(message) + '\n'
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return None
+    try:
+        sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        for chunk in iter(lambda: sock.recv(64*1024), ''):
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    return json.loads(''.join(chunks))
+
+
+def run(argv, socket_path=None):
+    """
+    Runs the pifmod command ARGV on the daemon.
+
+    Returns
+    -------
+    Exit status, or None if the command should be run in-process
+    instead, e.g. because no daemon is running.
+    """
+    options, action = split_action(argv)
+    if not action or action[0] not in _actions or '--jsonl' in options:
+        return None
+    # sagittariidae --snapshot reads no PIF and fetches in-process
+    if any(arg.startswith('--snapshot') for arg in action):
+        return None
+    socket_path = SOCKET if socket_path is None else socket_path
+    if not os.path.exists(socket_path):
+        return None
+    message = {'argv' : argv, 'cwd' : os.getcwd(), 'stdin' : None}
+    if not has_input(options):
+        message['stdin'] = sys.stdin.read()
+        if message['stdin'][:1] not in ('{', '[', ' ', '\t', '\n', '\r'):
+            # compressed/binary PIFs cannot be sent as JSON
+            sys.stdin = StringIO(message['stdin'])
+            return None
+    try:
+        response = request(message, socket_path)
+    except UnicodeDecodeError:
+        # nor can input that is not UTF-8
+        sys.stdin = StringIO(message['stdin'])
+        return None
+    if response is None or response['status'] == 'unsupported':
+        if message['stdin'] is not None:
+            # stdin has been consumed; hand it back for the in-process run
+            sys.stdin = StringIO(message['stdin'])
+        return None
+    if response['status'] != 'ok':
+        return 1
+    if response.get('timings') is not None:
+        sys.stderr.write(json.dumps(response['timings'], sort_keys=True) + '\n')
+    output = response['output']
+    if output is None:
+        return 0
+    # decoded from the JSON response
+    output = output.encode('utf-8')
+    if response['ofile'] is not None:
+        from pifmod.main import authorize_overwrite
+        if authorize_overwrite(response['ofile'], response['force']):
+            from pifmod.atomicfile import AtomicFile
+            with AtomicFile(response['ofile']) as ofs:
+                ofs.write(output)
+    else:
+        sys.stdout.write(output)
+    return 0
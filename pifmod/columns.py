@@ -0,0 +1,115 @@
+"""
+Columnar (NumPy-backed) values for properties read from source files.
+
+Source files such as pore distributions hold long, homogeneous columns
+of numbers. Rather than round-tripping each column through a string,
+columns are converted directly to typed NumPy arrays and kept as arrays
+until the PIF is serialized.
+"""
+
+import numpy as np
+from pypif.pif import Property
+
+# array kinds that can be stored in a PIF: signed/unsigned integers,
+# floats and (unicode) strings.
+_numeric_kinds = 'iuf'
+_string_kinds = 'SU'
+
+
+def to_array(values):
+    """
+    Converts a list of values into a typed NumPy array.
+
+    Parameters
+    ----------
+    :values, list: A list of numbers or strings (vector) or a list of
+        equal-length lists of these (matrix).
+
+    Returns
+    -------
+    1D or 2D NumPy array with an integer, float or string dtype, or
+    None if `values` is not a list, is empty, is ragged, or mixes
+    strings, numbers, booleans or None.
+    """
+    if not isinstance(values, list) or len(values) == 0:
+        return None
+    try:
+        array = np.array(values)
+    except ValueError:
+        # ragged
+        return None
+    if array.ndim not in (1, 2) or array.size == 0:
+        return None
+    kind = array.dtype.kind
+    flat = _flatten(values, array.ndim)
+    if kind in _numeric_kinds:
+        # booleans are silently promoted when mixed with numbers
+        if any(isinstance(v, bool) for v in flat):
+            return None
+        return array
+    elif kind in _string_kinds:
+        # numbers are silently converted when mixed with strings
+        if all(isinstance(v, basestring) for v in flat):
+            return array
+        return None
+    else:
+        return None
+
+
+def _flatten(values, ndim):
+    if ndim == 1:
+        return values
+    return (v for row in values for v in row)
+
+
+def is_array(value):
+    """
+    Returns True if `value` is a NumPy array, False otherwise.
+    """
+    return isinstance(value, np.ndarray)
+
+
+def value_type(array):
+    """
+    Returns the Property keyword, 'vectors' or 'matrices', under which
+    `array` is stored.
+    """
+    return 'vectors' if array.ndim == 1 else 'matrices'
+
+
+class ArrayProperty(Property):
+    """
+    Property whose vectors/matrices may be NumPy arrays. Arrays are
+    stored as given and only converted to lists when serialized.
+    Non-array values are handled exactly as by Property.
+    """
+    def __init__(self, *args, **kwds):
+        Property.__init__(self, *args, **kwds)
+
+    def _get_vectors(self):
+        return self._vectors
+
+    def _set_vectors(self, vectors):
+        if is_array(vectors):
+            self._vectors = vectors
+        else:
+            Property.vectors.fset(self, vectors)
+
+    def _get_matrices(self):
+        return self._matrices
+
+    def _set_matrices(self, matrices):
+        if is_array(matrices):
+            self._matrices = matrices
+        else:
+            Property.matrices.fset(self, matrices)
+
+    vectors = property(_get_vectors, _set_vectors, Property.vectors.fdel)
+    matrices = property(_get_matrices, _set_matrices, Property.matrices.fdel)
+
+    def as_dictionary(self):
+        result = Property.as_dictionary(self)
+        for key in ('vectors', 'matrices'):
+            if is_array(result.get(key)):
+                result[key] = result[key].tolist()
+        return result
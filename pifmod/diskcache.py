@@ -0,0 +1,104 @@
+"""
+Housekeeping shared by the on-disk caches, pifmod.urlio (URL responses)
+and pifmod.sourcecache (properties parsed from source files).
+
+An entry of a cache is a set of files in the cache directory named by
+the entry's key and one of the cache's extensions, e.g. KEY.body and
+KEY.json. The first extension names the file whose modification time
+records the last access of the entry, which is used for
+least-recently-used eviction.
+
+    make_directory(directory)
+    write(os.path.join(directory, key + '.json'), data)
+    evict(directory, max_size, ('.body', '.json'))
+"""
+
+import errno
+import os
+from pifmod.atomicfile import AtomicFile
+
+
+def make_directory(directory):
+    """
+    Creates DIRECTORY, which other threads or processes may be creating
+    at the same time.
+    """
+    try:
+        os.makedirs(directory)
+    except OSError, e:
+        if e.errno != errno.EEXIST or not os.path.isdir(directory):
+            raise
+
+
+def write(filename, data):
+    """
+    Atomically replaces FILENAME with DATA (str) and marks it as
+    recently used. Entries can be rebuilt, so the file is not flushed
+    to disk.
+    """
+    with AtomicFile(filename, sync=False) as ofs:
+        ofs.write(data)
+    if not ofs.changed:
+        touch(filename)
+
+
+def touch(filename):
+    """
+    Marks FILENAME as recently used. Failures are ignored.
+    """
+    try:
+        os.utime(filename, None)
+    except OSError:
+        pass
+
+
+def remove(directory, key, extensions):
+    """
+    Removes the files of the entry KEY.
+    """
+    for ext in extensions:
+        try:
+            os.remove(os.path.join(directory, key + ext))
+        except OSError:
+            pass
+
+
+def evict(directory, max_size, extensions):
+    """
+    Removes the least recently used entries until the files of the
+    entries in DIRECTORY fit within MAX_SIZE bytes.
+    """
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(extensions[0]) or name.startswith('.'):
+            continue
+        key = name[:-len(extensions[0])]
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        size = st.st_size
+        for ext in extensions[1:]:
+            try:
+                size += os.path.getsize(os.path.join(directory, key + ext))
+            except OSError:
+                pass
+        entries.append((st.st_mtime, size, key))
+    total = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total <= max_size:
+            break
+        remove(directory, key, extensions)
+        total -= size
+
+
+def clear(directory, extensions):
+    """
+    Removes every entry in DIRECTORY.
+    """
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        key, ext = os.path.splitext(name)
+        if ext in extensions and not name.startswith('.'):
+            remove(directory, key, extensions)
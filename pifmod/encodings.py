@@ -0,0 +1,269 @@
+"""
+Encodings of PIF records on disk.
+
+    json    JSON text, as written by pypif (default)
+    gz      gzip-compressed JSON
+    bz2     bzip2-compressed JSON
+    npz     binary PIF: a NumPy .npz (ZIP) archive holding the record
+            as compact JSON in which each list of scalars, vector or
+            matrix of at least PACK_MIN_SIZE numbers or strings is
+            replaced by a reference to a typed array stored in binary
+            form
+
+The format of a file to be written is chosen explicitly or from its
+extension (.gz, .bz2, .npz; anything else is JSON). When reading, the
+format is detected from the first bytes of the data, so any encoding
+may be given wherever a PIF is read.
+
+JSON, gz and bz2 are written in chunks of about CHUNK_SIZE bytes (see
+iterencode), so the complete text of a record is never held in memory.
+The output is reproducible: the same record always encodes to the same
+bytes, in every format.
+"""
+
+import bz2
+import gzip
+import json
+import os
+import zipfile
+import zlib
+from StringIO import StringIO
+
+FORMATS = ('json', 'gz', 'bz2', 'npz')
+# shorter lists of values are left in the JSON of an npz
+PACK_MIN_SIZE = 64
+# zlib compression level of gz (gzip's own default, 9, is much slower
+# for little gain on PIFs)
+COMPRESS_LEVEL = 6
+# bytes of JSON text gathered before each write
+CHUNK_SIZE = 64*1024
+
+_extensions = {'.gz' : 'gz', '.bz2' : 'bz2', '.npz' : 'npz'}
+_magic = (('\x1f\x8b', 'gz'), ('BZh', 'bz2'), ('PK\x03\x04', 'npz'))
+# JSON object that stands in for a packed array in an npz
+_ref = '$array'
+_packed = ('scalars', 'vectors', 'matrices')
+
+
+def format_from_filename(filename):
+    """
+    Returns the format implied by the extension of FILENAME.
+    """
+    if filename is None:
+        return 'json'
+    return _extensions.get(os.path.splitext(filename)[1].lower(), 'json')
+
+
+def detect(data):
+    """
+    Returns the format of the encoded DATA (str).
+    """
+    for magic, fmt in _magic:
+        if data.startswith(magic):
+            return fmt
+    return 'json'
+
+
+def _mixed_numbers(array, values):
+    """
+    True if the float ARRAY was built from VALUES that include integers,
+    which would not survive the round trip as integers.
+    """
+    if array.dtype.kind != 'f':
+        return False
+    flat = values if array.ndim == 1 else (x for row in values for x in row)
+    return any(isinstance(x, (int, long)) for x in flat)
+
+
+def _pack(obj, arrays):
+    """
+    Replaces the lists of scalars, vectors and matrices in OBJ, a PIF as
+    a dictionary, with references to typed arrays added to ARRAYS.
+    """
+    from pifmod import columns
+    if isinstance(obj, list):
+        return [_pack(v, arrays) for v in obj]
+    if not isinstance(obj, dict):
+        return obj
+    packed = {}
+    for k,v in iter(obj.items()):
+        if k in _packed and isinstance(v, list):
+            array = columns.to_array(v)
+            if array is not None and array.size >= PACK_MIN_SIZE and \
+               not _mixed_numbers(array, v):
+                name = 'a{}'.format(len(arrays))
+                arrays[name] = array
+                packed[k] = {_ref : name}
+                continue
+        packed[k] = _pack(v, arrays)
+    return packed
+
+
+def _is_container(obj):
+    return isinstance(obj, (dict, list)) or hasattr(obj, 'as_dictionary')
+
+
+def _pieces(obj, encode, depth):
+    """
+    Yields the JSON text of OBJ in pieces. Dictionaries and lists of
+    objects are split into their members down to DEPTH levels; below
+    that, and for lists of plain values, each value is encoded whole by
+    ENCODE.
+    """
+    if hasattr(obj, 'as_dictionary'):
+        obj = obj.as_dictionary()
+    if depth == 0 or not isinstance(obj, (dict, list)) or not obj or \
+       (isinstance(obj, list) and not _is_container(obj[0])):
+        yield encode(obj)
+    elif isinstance(obj, list):
+        yield '['
+        for i,item in enumerate(obj):
+            if i:
+                yield ', '
+            for piece in _pieces(item, encode, depth - 1):
+                yield piece
+        yield ']'
+    else:
+        yield '{'
+        for i,(key,value) in enumerate(obj.iteritems()):
+            yield ', ' if i else ''
+            yield encode(key)
+            yield ': '
+            for piece in _pieces(value, encode, depth - 1):
+                yield piece
+        yield '}'
+
+
+def iterencode(pifdata, chunk_size=None):
+    """
+    Encodes PIFDATA, a PIF object or list of them, as JSON in chunks of
+    about CHUNK_SIZE bytes. The joined chunks are identical to
+    pypif.pif.dumps(PIFDATA), but only one record, property, etc. is
+    held as text at a time.
+    """
+    from pypif.util.pif_encoder import PifEncoder
+    chunk_size = CHUNK_SIZE if chunk_size is None else chunk_size
+    # encodes a whole value with the C encoder, as pif.dumps does
+    encode = PifEncoder().encode
+    pieces, size = [], 0
+    for piece in _pieces(pifdata, encode, 3):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(pieces)
+            pieces, size = [], 0
+    if pieces:
+        yield ''.join(pieces)
+
+
+def as_dictionary(pifdata):
+    """
+    Returns PIFDATA, a PIF object or list of them, as plain
+    dictionaries/lists.
+    """
+    if isinstance(pifdata, list):
+        return [as_dictionary(p) for p in pifdata]
+    return pifdata.as_dictionary()
+
+
+def _npz(pifdata):
+    """
+    Returns PIFDATA encoded as npz. Unlike numpy.savez_compressed, the
+    members of the archive carry a fixed timestamp.
+    """
+    import numpy as np
+    arrays = {}
+    skeleton = json.dumps(_pack(as_dictionary(pifdata), arrays),
+                          separators=(',', ':'))
+    arrays['pif'] = np.frombuffer(skeleton, dtype=np.uint8)
+    ofs = StringIO()
+    with zipfile.ZipFile(ofs, 'w', zipfile.ZIP_DEFLATED) as npz:
+        for name in sorted(arrays):
+            member = StringIO()
+            np.lib.format.write_array(member, arrays[name],
+                                      allow_pickle=False)
+            info = zipfile.ZipInfo(name + '.npy', (1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0644 << 16
+            npz.writestr(info, member.getvalue())
+    return ofs.getvalue()
+
+
+def write(pifdata, ofs, fmt='json'):
+    """
+    Writes PIFDATA, a PIF object or list of them, to the file-like OFS
+    in format FMT. JSON, gz and bz2 are written in chunks; npz, which
+    is compressed, is built in memory and written at once.
+
+    Parameters
+    ----------
+    :pifdata, PIF: Record(s) to encode.
+    :ofs, file: Destination; only its write method is used.
+    :fmt, str: One of FORMATS.
+    """
+    if fmt == 'json':
+        for chunk in iterencode(pifdata):
+            ofs.write(chunk)
+    elif fmt == 'gz':
+        # no file name or time in the header, for reproducible output
+        with gzip.GzipFile(filename='', fileobj=ofs, mode='wb',
+                           compresslevel=COMPRESS_LEVEL, mtime=0) as gz:
+            for chunk in iterencode(pifdata):
+                gz.write(chunk)
+    elif fmt == 'bz2':
+        compressor = bz2.BZ2Compressor()
+        for chunk in iterencode(pifdata):
+            data = compressor.compress(chunk)
+            if data:
+                ofs.write(data)
+        ofs.write(compressor.flush())
+    elif fmt == 'npz':
+        ofs.write(_npz(pifdata))
+    else:
+        raise ValueError('Unrecognized format {}. Use one of {}.'.format(
+            fmt, ', '.join(FORMATS)))
+
+
+def encode(pifdata, fmt='json'):
+    """
+    Encodes PIFDATA, a PIF object or list of them, in format FMT.
+
+    Returns
+    -------
+    Encoded data (str).
+    """
+    ofs = StringIO()
+    write(pifdata, ofs, fmt)
+    return ofs.getvalue()
+
+
+def decode_object(data):
+    """
+    Decodes DATA, in any of FORMATS, into plain dictionaries/lists.
+    """
+    import numpy as np
+    fmt = detect(data)
+    if fmt == 'npz':
+        with np.load(StringIO(data), allow_pickle=False) as npz:
+            def unpack(obj):
+                if len(obj) == 1 and _ref in obj:
+                    return npz[obj[_ref]].tolist()
+                return obj
+            return json.loads(npz['pif'].tostring(), object_hook=unpack)
+    elif fmt == 'gz':
+        # 16 + MAX_WBITS: expect a gzip header
+        data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    elif fmt == 'bz2':
+        data = bz2.decompress(data)
+    return json.loads(data)
+
+
+def decode(data):
+    """
+    Decodes DATA, in any of FORMATS, into a PIF object or a list of
+    them.
+    """
+    from pypif import pif
+    if detect(data) == 'json':
+        return pif.loads(data)
+    return pif.loado(decode_object(data))
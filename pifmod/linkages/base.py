@@ -1,14 +1,13 @@
-from ..urlio import fetch, clear_cache
+from ..urlio import fetch
 import json
 
 def _json_from_url(url, refresh=False):
     """
-    Fetches a list of JSON formatted object from `url`.
+    Fetches a list of JSON formatted object from `url`. If `refresh`,
+    a cached response is revalidated with the server before it is used.
     """
-    if refresh:
-        clear_cache(url)
     # get the response as text
-    response = fetch(url)
+    response = fetch(url, ttl=(0 if refresh else None))
     # decode the response
     response = json.loads(response)
     # ensure the response is a list
@@ -0,0 +1,215 @@
+"""
+Enrichment of linked PIF records with the sample data behind their
+sagittariidae references.
+
+A linked record holds only the URL of its sample,
+record.sagittariidae.url (HOST/projects/PROJECT/samples/ID). enrich
+fetches each distinct sample once, with at most JOBS requests in
+flight, at most RATE requests per second and failed requests retried
+(see pifmod.urlio), and adds the selected fields of the sample to each
+record as properties:
+
+    fields = parse_fields(['stage', 'id=sample id'])
+    summary = enrich(records, fields, jobs=8, rate=20.)
+"""
+
+import json
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from pypif import pif
+from pifmod import urlio
+from pifmod.properties import PropertyIndex
+
+
+class RateLimiter(object):
+    """
+    Spaces the requests of any number of threads at least 1/RATE
+    seconds apart. A RATE of None or 0 does not limit the requests.
+    """
+    def __init__(self, rate=None):
+        self.interval = 1./rate if rate else 0.
+        self._next = 0.
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until the next request may be sent.
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+#end 'class RateLimiter(object):'
+
+
+def parse_fields(specs):
+    """
+    Parses FIELD[=PROPERTY] specifications: FIELD of the sample is
+    added as the property PROPERTY (default: FIELD).
+
+    Returns
+    -------
+    List of (field, property name) pairs.
+    """
+    fields = []
+    for spec in specs:
+        field, _, name = spec.partition('=')
+        field, name = field.strip(), name.strip()
+        if not field:
+            raise ValueError('No sample field in "{}".'.format(spec))
+        fields.append((field, name or field))
+    return fields
+
+
+def sample_url(record):
+    """
+    Returns the URL of the sagittariidae sample of RECORD, or None if it
+    is not linked.
+    """
+    return getattr(getattr(record, 'sagittariidae', None), 'url', None)
+
+
+def fetch_sample(url, limiter=None, retries=None):
+    """
+    Fetches the sample at URL.
+
+    Returns
+    -------
+    The sample, a dictionary.
+    """
+    sample = json.loads(urlio.fetch(url, retries=retries, limiter=limiter))
+    if isinstance(sample, list) and len(sample) == 1:
+        sample = sample[0]
+    if not isinstance(sample, dict):
+        raise ValueError('{} does not hold a sample.'.format(url))
+    return sample
+
+
+def fetch_all(urls, jobs=4, rate=None, retries=None):
+    """
+    Fetches the samples at URLS, with at most JOBS requests in flight
+    and at most RATE requests per second.
+
+    Returns
+    -------
+    (samples, errors): dictionaries from URL to the sample and to the
+    reason it could not be fetched, respectively.
+    """
+    limiter = RateLimiter(rate)
+    def fetch(url):
+        try:
+            return (url, fetch_sample(url, limiter, retries), None)
+        except (IOError, ValueError), e:
+            return (url, None, '{}'.format(e))
+    jobs = max(1, min(jobs, len(urls)))
+    if jobs == 1:
+        results = [fetch(url) for url in urls]
+    else:
+        pool = ThreadPool(jobs)
+        try:
+            results = pool.map(fetch, urls)
+        finally:
+            pool.close()
+            pool.join()
+    samples, errors = {}, {}
+    for url, sample, error in results:
+        if error is None:
+            samples[url] = sample
+        else:
+            errors[url] = error
+    return (samples, errors)
+
+
+def sample_properties(sample, fields):
+    """
+    Returns the FIELDS, (field, property name) pairs, of SAMPLE as
+    properties. Fields the sample does not have are skipped; objects
+    are stored as JSON strings.
+    """
+    props = []
+    for field, name in fields:
+        if field not in sample or sample[field] is None:
+            continue
+        value = sample[field]
+        if isinstance(value, dict) or (isinstance(value, list) and
+           any(isinstance(v, (dict, list)) for v in value)):
+            value = json.dumps(value, sort_keys=True)
+        props.append(pif.Property(name=name, scalars=value))
+    return props
+
+
+def merge(record, props, force=False):
+    """
+    Adds PROPS to RECORD. A property that already exists is replaced if
+    FORCE, and otherwise left as it is unless its value is the same.
+
+    Returns
+    -------
+    Names of the properties that were left as they are.
+    """
+    if getattr(record, 'properties', None) is None:
+        record.properties = []
+    index = PropertyIndex(record.properties)
+    kept = []
+    for prop in props:
+        existing = index.get(prop.name)
+        if existing is None:
+            index.add(prop)
+        elif force:
+            index.replace(prop)
+        elif getattr(existing, 'scalars', None) != prop.scalars:
+            kept.append(prop.name)
+    return kept
+
+
+def enrich(records, fields, jobs=4, rate=None, retries=None, force=False):
+    """
+    Adds FIELDS of the sagittariidae sample of each of RECORDS to the
+    record. See the module documentation.
+
+    Parameters
+    ----------
+    :records, list: PIF records, modified in place.
+    :fields, list: (field, property name) pairs, as from parse_fields.
+    :jobs, int: Maximum number of requests in flight.
+    :rate, float: Maximum number of requests per second, or None.
+    :retries, int: Number of times a failed request is retried.
+        Default: urlio.RETRIES.
+    :force, bool: Replace properties that already exist.
+
+    Returns
+    -------
+    Summary dictionary: 'enriched', 'unlinked' and 'failed' hold the
+    positions of the records that were enriched, had no sample URL, or
+    whose sample could not be fetched; 'errors' maps the URLs that
+    could not be fetched to the reason.
+    """
+    urls = [sample_url(r) for r in records]
+    distinct = sorted(set(url for url in urls if url is not None))
+    samples, errors = fetch_all(distinct, jobs=jobs, rate=rate,
+                                retries=retries)
+    for url in sorted(errors):
+        sys.stderr.write('Sample {} could not be fetched ({}). ' \
+                         'Skipping.\n'.format(url, errors[url]))
+    summary = {'enriched' : [], 'unlinked' : [], 'failed' : [],
+               'errors' : errors}
+    for i,(record, url) in enumerate(zip(records, urls)):
+        if url is None:
+            summary['unlinked'].append(i)
+            continue
+        if url not in samples:
+            summary['failed'].append(i)
+            continue
+        kept = merge(record, sample_properties(samples[url], fields), force)
+        if kept:
+            sys.stderr.write('{} already in {}. Use -f to replace.\n'.format(
+                ', '.join(kept), getattr(record, 'uid', None) or url))
+        summary['enriched'].append(i)
+    sys.stderr.flush()
+    return summary
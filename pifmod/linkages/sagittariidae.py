@@ -1,9 +1,25 @@
 from .base import fetch_samples
 from ..urlio import DataManagementError
+import os
 import sys
+import time
 from copy import deepcopy
 from pypif import pif
+from multiprocessing.pool import ThreadPool
 import json
+
+# identifies snapshot files written by write_snapshot
+SNAPSHOT_FORMAT = 'pifmod-sagittariidae-snapshot'
+SNAPSHOT_VERSION = 1
+# age, in seconds, beyond which a snapshot is reported as stale
+SNAPSHOT_MAX_AGE = float(os.environ.get('PIFMOD_SNAPSHOT_MAX_AGE', 7*24*3600))
+
+
+class SnapshotError(ValueError):
+    def __init__(self, *args, **kwds):
+        super(SnapshotError, self).__init__(*args, **kwds)
+#end 'class SnapshotError(ValueError):'
+
 # debugging
 import sys
 def debug(msg):
@@ -11,39 +27,279 @@ def debug(msg):
     #sys.stdout.flush()
     pass
 
+def index_samples(samples):
+    """
+    Builds a map from sample name to sample ID.
+
+    Returns
+    -------
+    (index, duplicates), where duplicates is the set of names shared by
+    more than one sample. Duplicated names are not in the index.
+    """
+    index = {}
+    duplicates = set()
+    for s in samples:
+        name = s['name']
+        if name in index or name in duplicates:
+            duplicates.add(name)
+            index.pop(name, None)
+        else:
+            index[name] = s['id']
+    return (index, duplicates)
+
+
+def sample_name(pifdata):
+    """
+    Constructs the sagittariidae sample name from the preparation
+    details of `pifdata`.
+    """
+    # first occurrence of each detail wins
+    details = {}
+    for d in pifdata.preparation[0].details:
+        details.setdefault(d.name, d.scalars)
+    # extract fields required to generate the sample name
+    return 'P{plate:03d}_B{build:03d}_{column:s}{row:02d}'.format(
+        plate=details['plate number'], build=details['build'],
+        column=details['column'], row=details['row'])
+
+
 def link_factory(projectID,
-    host='http://sagittariidae.adapt.mines.edu'):
+    host='http://sagittariidae.adapt.mines.edu', refresh=False):
+    return multi_link_factory([(host, projectID)], refresh=refresh)
+
+
+def fetch_catalogues(projects, jobs=4, refresh=False):
+    """
+    Fetches the samples of each (host, projectID) pair in `projects`,
+    with at most `jobs` requests in flight at once. Catalogues are
+    served from the urlio cache until they are older than its TTL
+    unless `refresh`, in which case they are revalidated with the
+    server.
+
+    Returns
+    -------
+    List of sample lists, in the same order as `projects`.
+    """
+    def fetch(hp):
+        host, projectID = hp
+        return fetch_samples(host, projectID, refresh=refresh)
+    jobs = max(1, min(jobs, len(projects)))
+    if jobs == 1:
+        return [fetch(hp) for hp in projects]
+    pool = ThreadPool(jobs)
+    try:
+        return pool.map(fetch, projects)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def multi_link_factory(projects, jobs=4, refresh=False):
+    """
+    As link_factory, but links against the samples of several projects,
+    possibly on several hosts. The sample catalogues are fetched
+    concurrently and merged into a single lookup.
+
+    Parameters
+    ----------
+    :projects, list: (host, projectID) pairs.
+    :jobs, int: Maximum number of catalogues fetched at once.
+    :refresh, bool: If True, cached catalogues are revalidated with the
+        server (see fetch_catalogues).
+    """
     debug('entered link factory')
-    samples = fetch_samples(host, projectID, refresh=True)
-    debug('fetched sample: {}'.format(samples[:5]))
+    catalogues = fetch_catalogues(projects, jobs=jobs, refresh=refresh)
+    for samples in catalogues:
+        debug('fetched sample: {}'.format(samples[:5]))
+    return index_link_factory(projects,
+        [index_samples(samples) for samples in catalogues])
+
+
+def merge_indexes(projects, indexes):
+    """
+    Merges the sample indexes of several projects into a single lookup.
+
+    Parameters
+    ----------
+    :projects, list: (host, projectID) pairs.
+    :indexes, list: (index, duplicates) of each project, as from
+        index_samples.
+
+    Returns
+    -------
+    (index, duplicates): index maps each sample name to its URL;
+    duplicates is the set of names found more than once, in one project
+    or across projects, and which are not in the index.
+    """
+    # sample name --> sample URL
+    index = {}
+    duplicates = set()
+    for (host, projectID), (ids, dups) in zip(projects, indexes):
+        duplicates.update(dups)
+        for name, sampleID in iter(ids.items()):
+            if name in index or name in duplicates:
+                duplicates.add(name)
+                index.pop(name, None)
+                continue
+            index[name] = '{host:}/projects/{project:}/samples/{sample:}'.format(
+                host=host, project=projectID, sample=sampleID)
+    for name in duplicates:
+        index.pop(name, None)
+    return (index, duplicates)
+
+
+def index_link_factory(projects, indexes):
+    """
+    As multi_link_factory, but from the sample indexes of PROJECTS, as
+    from index_samples, rather than from their catalogues.
+    """
+    index, duplicates = merge_indexes(projects, indexes)
+    if duplicates:
+        sys.stderr.write('{} sample names are not unique in {}: {}\n'.format(
+            len(duplicates), ', '.join(p for _, p in projects),
+            ', '.join(sorted(duplicates))))
+        sys.stderr.flush()
     def adder(pifdata):
         """
         Add a reference to sagittariidae data.
+
+        Returns
+        -------
+        (sample name, True if the reference was added, False otherwise)
         """
-        details = pifdata.preparation[0].details
-        # extract fields required to generate the sample name
-        plate = [d.scalars for d in details if d.name == 'plate number'][0]
-        build = [d.scalars for d in details if d.name == 'build'][0]
-        column = [d.scalars for d in details if d.name == 'column'][0]
-        row = [d.scalars for d in details if d.name == 'row'][0]
         # sample name
-        name = 'P{plate:03d}_B{build:03d}_{column:s}{row:02d}'.format(
-            plate=plate, build=build, column=column, row=row)
-        # get sample ID
+        name = sample_name(pifdata)
+        # get sample URL
         try:
-            sampleID = [s['id'] for s in samples if s['name'] == name][0]
-            url = '{host:}/projects/{project:}/samples/{sample:}'.format(
-                host=host, project=projectID, sample=sampleID)
+            url = index[name]
             # modify pifdata in place.
             #pdata = deepcopy(pifdata)
             pifdata.sagittariidae = pif.Reference(url=url)
             #return pif.dumps(pdata)
-        except IndexError:
-            sys.stderr.write('Sample {} was not found. ' \
-                             'Skipping.\n'.format(name))
+            return (name, True)
+        except KeyError:
+            if name in duplicates:
+                msg = 'Sample {} is not unique. Skipping.\n'
+            else:
+                msg = 'Sample {} was not found. Skipping.\n'
+            sys.stderr.write(msg.format(name))
             sys.stderr.flush()
+            return (name, False)
         except Exception:
             sys.stderr.write('Unknown error. Aborting.\n')
             sys.stderr.flush()
             raise
+    def link_all(records):
+        """
+        Add references to sagittariidae data to each of `records`.
+
+        Returns
+        -------
+        Summary dictionary: 'linked' and 'missing' hold the names of the
+        samples that were and were not found; 'ambiguous' holds those
+        missing samples whose names are not unique.
+        """
+        summary = {'linked' : [], 'missing' : [], 'ambiguous' : []}
+        for p in records:
+            name, linked = adder(p)
+            if linked:
+                summary['linked'].append(name)
+            else:
+                summary['missing'].append(name)
+                if name in duplicates:
+                    summary['ambiguous'].append(name)
+        return summary
+    adder.link_all = link_all
     return adder
+
+
+def write_snapshot(filename, projects, jobs=4, refresh=False):
+    """
+    Fetches the sample catalogues of PROJECTS, a list of (host,
+    projectID) pairs, and saves their indexes to FILENAME as
+    gzip-compressed JSON, so that records can be linked later without
+    network access (see snapshot_link_factory). If REFRESH, cached
+    catalogues are revalidated with the server (see fetch_catalogues).
+
+    Returns
+    -------
+    The snapshot, a dictionary.
+    """
+    import gzip
+    from ..atomicfile import AtomicFile
+    catalogues = fetch_catalogues(projects, jobs=jobs, refresh=refresh)
+    entries = []
+    for (host, projectID), samples in zip(projects, catalogues):
+        ids, dups = index_samples(samples)
+        entries.append({'host' : host, 'project' : projectID,
+                        'samples' : ids, 'duplicates' : sorted(dups)})
+    snapshot = {'format' : SNAPSHOT_FORMAT, 'version' : SNAPSHOT_VERSION,
+                'created' : time.time(), 'projects' : entries}
+    with AtomicFile(filename) as ofs:
+        # mtime=0: identical catalogues give identical files
+        gz = gzip.GzipFile(filename='', mode='wb', fileobj=ofs, mtime=0)
+        json.dump(snapshot, gz, sort_keys=True, separators=(',', ':'))
+        gz.close()
+    return snapshot
+
+
+def read_snapshot(filename):
+    """
+    Reads the snapshot FILENAME, written by write_snapshot.
+
+    Raises
+    ------
+    SnapshotError if FILENAME is not a snapshot.
+    """
+    from ..encodings import decode_object
+    with open(filename, 'rb') as ifs:
+        data = ifs.read()
+    try:
+        snapshot = decode_object(data)
+    except (IOError, ValueError, EOFError):
+        snapshot = None
+    if not isinstance(snapshot, dict) or \
+       snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise SnapshotError('{} is not a sagittariidae snapshot.'.format(
+            filename))
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError('Unsupported snapshot version {} in {}.'.format(
+            snapshot.get('version'), filename))
+    return snapshot
+
+
+def snapshot_link_factory(filename, projects=None, max_age=None):
+    """
+    As multi_link_factory, but links against the catalogues saved in the
+    snapshot FILENAME (see write_snapshot), without network access. A
+    warning is written if the snapshot is older than MAX_AGE seconds
+    (default: SNAPSHOT_MAX_AGE).
+
+    Parameters
+    ----------
+    :filename, str: Snapshot file.
+    :projects, list: (host, projectID) pairs to link against. Default:
+        every project in the snapshot.
+    :max_age, float: Age, in seconds, beyond which the snapshot is
+        stale.
+    """
+    snapshot = read_snapshot(filename)
+    max_age = SNAPSHOT_MAX_AGE if max_age is None else max_age
+    age = time.time() - snapshot['created']
+    if age > max_age:
+        sys.stderr.write('Snapshot {} is {:.1f} days old (taken {} UTC); ' \
+            'samples added since are not linked.\n'.format(filename,
+            age/86400., time.strftime('%Y-%m-%d %H:%M',
+            time.gmtime(snapshot['created']))))
+        sys.stderr.flush()
+    entries = dict(((e['host'], e['project']), e)
+                   for e in snapshot['projects'])
+    if projects is None:
+        projects = [(e['host'], e['project']) for e in snapshot['projects']]
+    missing = [p for p in projects if tuple(p) not in entries]
+    if missing:
+        raise SnapshotError('{} not in snapshot {}.'.format(
+            ', '.join('{}@{}'.format(p, h) for h, p in missing), filename))
+    indexes = [(entries[tuple(p)]['samples'],
+                set(entries[tuple(p)]['duplicates'])) for p in projects]
+    return index_link_factory(projects, indexes)
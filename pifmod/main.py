@@ -11,18 +11,23 @@ EXAMPLES
     TODO: Show some examples of how to use this script.
 """
 
+# Only light modules are imported here. pypif (and with it NumPy),
+# sagittariidae/urlio, multiprocessing and SocketServer are imported by
+# the actions that use them, so that "pifmod --help", commands forwarded
+# to a daemon, and actions that do not need them start quickly. See
+# test/test_startup.py for the modules that must not be loaded at start.
 import sys, os, textwrap, traceback, argparse
+import glob
+import copy
 import time
-import shutil
 import re
-import ast
 import json
+from collections import OrderedDict
 from StringIO import StringIO
 #from pexpect import run, spawn
-from pypif import pif
-from pypif.pif import Property, Value, Person
 #
-from pifmod.linkages import sagittariidae
+from pifmod.properties import PropertyIndex
+from pifmod import client, timing
 
 # exceptions
 class LocalException(Exception):
@@ -40,6 +45,29 @@ class UnrecognizedOptionValueError(LocalException):
         super(UnrecognizedOptionValueError, self).__init__(self, *args, **kwds)
 #end 'class UnrecognizedOptionValueError(Exception):'
 
+class UIDMismatchError(LocalException):
+    def __init__(self, *args, **kwds):
+        super(UIDMismatchError, self).__init__(*args, **kwds)
+#end 'class UIDMismatchError(LocalException):'
+
+class BatchError(LocalException):
+    def __init__(self, *args, **kwds):
+        super(BatchError, self).__init__(*args, **kwds)
+#end 'class BatchError(LocalException):'
+
+class InvalidEditError(LocalException):
+    def __init__(self, *args, **kwds):
+        super(InvalidEditError, self).__init__(*args, **kwds)
+#end 'class InvalidEditError(LocalException):'
+
+def error_message(e):
+    """
+    Returns the message of the exception E, to report it: its last
+    argument (LocalExceptions carry themselves as the first) or, if it
+    has none, the name of its class.
+    """
+    return e.args[-1] if e.args else e.__class__.__name__
+
 
 # authorize overwrite
 def file_exists(filename):
@@ -53,11 +81,13 @@ def file_exists(filename):
         return False
 
 
-def authorize_overwrite(filename):
+def authorize_overwrite(filename, force=None):
     """
     Returns True if FILENAME should be overwritten, False otherwise.
+    The user is asked unless FORCE (default: -f) is set.
     """
-    if file_exists(filename) and not args.force:
+    force = args.force if force is None else force
+    if file_exists(filename) and not force:
         msg = "{} exists. Overwrite? (y/N): ".format(filename)
         ans = raw_input(msg).strip()
         try:
@@ -87,6 +117,300 @@ def check_tag(pifdata, tag):
     return getattr(pifdata, tag, None) is not None
 
 
+def property_adder(index, prop_exists, force=False):
+    """
+    Generator that abstracts away how new properties are added to an
+    existing property list (PropertyIndex). If FORCE, an existing
+    property is overwritten.
+    """
+    def no_conflict(padd):
+        index.add(padd)
+    def conflict(padd):
+        if force:
+            index.replace(padd)
+        else:
+            # Do not overwrite.
+            msg = 'A property named "{}" already exists.'.format(padd.name)
+            raise EntryExistsError(msg)
+    return conflict if prop_exists else no_conflict
+
+
+def parse_units(units):
+    return units
+
+
+def parse_condition(cond):
+    from pypif.pif import Value
+    from pifmod.values import parse_value
+    kwds = {}
+    if cond is None:
+        return None
+    try:
+        k,v,u = cond.strip().split('=')
+        kwds['units'] = u
+    except ValueError:
+        k,v = cond.strip().split('=')
+    vtype, v = parse_value(v)
+    kwds['name'] = k
+    kwds[vtype] = v
+    return Value(**kwds)
+
+
+def parse_data_type(dtype):
+    allowedRE = re.compile(r'(MACHINE_LEARNING|COMPUTATIONAL|EXPERIMENTAL)',
+                           re.IGNORECASE)
+    if dtype is None:
+        return None
+    elif re.match(allowedRE, dtype):
+        return dtype
+    else:
+        msg = 'Data type must be one of: MACHINE_LEARNING, ' \
+              'COMPUTATIONAL, or EXPERIMENTAL.'
+        raise UnrecognizedOptionValueError(msg)
+
+
+def parse_contact(cont):
+    from pypif.pif import Person
+    kwds = {}
+    if cont is None:
+        return None
+    # split name and email
+    try:
+        name,email = cont.strip().split(',')
+        kwds['email'] = email.strip()
+    except ValueError:
+        name = cont.strip()
+    # split given name from family name
+    try:
+        name = name.split()
+        given = name[0]
+        family = ' '.join(name[1:])
+    except ValueError:
+        given = name.strip()
+        family = None
+    kwds['given'] = given
+    kwds['family'] = family
+    return Person(**kwds)
+
+
+def parse_tag(tag):
+    return tag
+
+
+def parse_json(filename):
+    # load the json file
+    with timing.phase('read'):
+        with open(filename) as ifs:
+            text = ifs.read()
+    timing.add_bytes('read', len(text))
+    with timing.phase('parse'):
+        jdata = json.loads(text)
+        del text
+        return json_properties(jdata)
+
+
+def json_properties(jdata):
+    """
+    Converts the decoded contents of a JSON-formatted source file into
+    a list of (Array)Property.
+    """
+    from pifmod.columns import ArrayProperty
+    return [ArrayProperty(**property_fields(k, v))
+            for k,v in iter(jdata.items())]
+
+
+def property_fields(name, value):
+    """
+    Converts the member NAME: VALUE of a JSON-formatted source file into
+    keywords for (Array)Property. Vectors and matrices of a single type
+    become NumPy arrays.
+    """
+    from pifmod.values import classify_value
+    # which key/keys are equivalent to scalar values?
+    valueRE = re.compile(r'value.*?\b', re.IGNORECASE)
+    # TODO: which key/keys are equivalent to vectors? matrices?
+    if isinstance(value, dict):
+        # if value is a dictionary, i.e. has
+        # [scalar/vector/matrix equivalent][, units[, ...]]
+        # create a Property from this data.
+        kwds = dict(value)
+        for key in value.keys():
+            if re.match(valueRE, key):
+                vtype, val = classify_value(kwds.pop(key), as_array=True)
+                kwds[vtype] = val
+    else:
+        # list, scalar, etc. -- something that doesn't have the
+        # map defining the characteristics of the entry.
+        vtype, val = classify_value(value, as_array=True)
+        kwds = { vtype : val }
+    kwds['name'] = name
+    return kwds
+
+
+def source_key(filename):
+    """
+    Returns the (absolute path, size, mtime) of FILENAME, which
+    identifies a version of a source file.
+    """
+    st = os.stat(filename)
+    return (os.path.abspath(filename), st.st_size, st.st_mtime)
+
+
+# number of source files whose parsed properties are kept in memory,
+# e.g. between the requests to a daemon (see serve)
+MAX_SOURCES = int(os.environ.get('PIFMOD_MAX_SOURCES', 8))
+
+
+def _lookup(cache, key):
+    """
+    Returns the entry KEY of CACHE, an OrderedDict of source files from
+    least to most recently used, marking it as most recently used, or
+    None if there is none.
+    """
+    if key not in cache:
+        return None
+    value = cache.pop(key)
+    cache[key] = value
+    return value
+
+
+def _remember(cache, key, value):
+    """
+    Stores VALUE as the entry KEY of CACHE (see _lookup), replacing
+    the entries for other versions of the file in KEY, and forgets the
+    least recently used files beyond MAX_SOURCES.
+    """
+    for k in [k for k in cache if k[0] == key[0] and k != key]:
+        del cache[k]
+    cache[key] = value
+    while len(cache) > max(MAX_SOURCES, 1):
+        cache.popitem(last=False)
+    return value
+
+
+# (absolute path, size, mtime) --> PropertyIndex
+_sources = OrderedDict()
+def load_source(filename):
+    """
+    Returns a PropertyIndex of the properties in the JSON-formatted
+    source FILENAME. Each file is parsed once per modification, so the
+    same file may be used repeatedly, e.g. by apply or serve, at no
+    extra cost. The returned properties are shared and must be copied
+    before they are modified.
+    """
+    key = source_key(filename)
+    index = _lookup(_sources, key)
+    if index is None:
+        index = _remember(_sources, key, PropertyIndex(parse_json(filename)))
+    return index
+
+
+# (absolute path, size, mtime) --> {folded name: property or None}
+_source_properties = OrderedDict()
+def source_property(filename, name):
+    """
+    Returns the property NAME (case insensitive) from the JSON-formatted
+    source FILENAME, or None if there is none.
+
+    Unless the whole file has already been parsed (see load_source),
+    the file is scanned only up to NAME and only its value is decoded
+    (see pifmod.scan). As with load_source, the property is shared and
+    must be copied before it is modified.
+    """
+    from pifmod.properties import fold
+    key = source_key(filename)
+    index = _lookup(_sources, key)
+    if index is not None:
+        return index.get(name)
+    found = _lookup(_source_properties, key)
+    if found is None:
+        found = _remember(_source_properties, key, {})
+    if fold(name) not in found:
+        found[fold(name)] = read_source_property(key, name)
+    return found[fold(name)]
+
+
+def read_source_property(key, name):
+    """
+    Reads the property NAME from the source file identified by KEY, as
+    from source_key, through the on-disk cache of parsed properties
+    (see pifmod.sourcecache) unless --no-source-cache was given.
+
+    Returns
+    -------
+    ArrayProperty, or None if the source file has no property NAME.
+    """
+    from pifmod import scan, sourcecache
+    from pifmod.columns import ArrayProperty
+    use_cache = not args.no_source_cache
+    if use_cache:
+        with timing.phase('read'):
+            fields = sourcecache.get(key, name)
+        if fields is not None:
+            return ArrayProperty(**fields)
+    with timing.phase('read'):
+        rval = scan.find(key[0], name)
+    if rval is None:
+        return None
+    pname, text, nbytes = rval
+    timing.add_bytes('read', nbytes)
+    with timing.phase('parse'):
+        fields = property_fields(pname, json.loads(text))
+    if use_cache:
+        sourcecache.put(key, name, fields)
+    return ArrayProperty(**fields)
+
+
+def source_names(filename):
+    """
+    Returns the property names in the JSON-formatted source FILENAME,
+    without decoding their values unless the file has already been
+    parsed.
+    """
+    from pifmod import scan, sourcecache
+    key = source_key(filename)
+    index = _lookup(_sources, key)
+    if index is not None:
+        return index.names()
+    use_cache = not args.no_source_cache
+    names = sourcecache.get_names(key) if use_cache else None
+    if names is None:
+        with timing.phase('read'):
+            names = scan.keys(filename)
+        timing.add_bytes('read', key[1])
+        if use_cache:
+            sourcecache.put_names(key, names)
+    return names
+
+
+def clear_sources():
+    """
+    Forgets all parsed source files, e.g. to measure a cold start.
+    """
+    _sources.clear()
+    _source_properties.clear()
+
+
+def property_keywords(units=None, conditions=(), datatype=None, contacts=(),
+                      tags=()):
+    """
+    Converts the optional property fields, given as on the command line,
+    into keywords for Property.
+    """
+    kwds = {}
+    units = parse_units(units)
+    if units is not None: kwds['units'] = units
+    conditions = [parse_condition(c) for c in conditions]
+    if conditions != [] : kwds['conditions'] = conditions
+    dataType = parse_data_type(datatype)
+    if dataType is not None: kwds['data_type'] = dataType
+    contacts = [parse_contact(c) for c in contacts]
+    if contacts != [] : kwds['contacts'] = contacts
+    tags = [parse_tag(t) for t in tags]
+    if tags != []: kwds['tags'] = tags
+    return kwds
+
+
 # property
 def property(pifdata):
     """
@@ -136,6 +460,15 @@ def property(pifdata):
             # in the PIF-formatted PIF file as well. Note that this only
             # lists the keys and not the values.
 
+        6. pifmod -i material.pif property [-f] --reduce=median,p95 [PIF] NAME
+            # Adds scalar properties that summarize the vector or matrix
+            # property NAME, taken from the PIF-formatted file PIF or,
+            # if PIF is not given, from material.pif. Each is named
+            # "REDUCTION NAME", e.g. "median volume", and carries the
+            # units of NAME unless --units is given. Recognized
+            # reductions are count, sum, mean, std, min, max, median
+            # and pNN, the NN-th percentile (see pifmod.reductions).
+
     Parameters
     ----------
     :pifdata, PIF: PIF-formatted data.
@@ -143,147 +476,16 @@ def property(pifdata):
     Returns
     -------
     Use case:
-        1. Matching property as a PIF Property
-        2-4. pifdata string with Property added as appropriate.
-    """
-    def get_property(plist, name, case_sensitive=False):
-        """Returns the first property whose name matches NAME."""
-        #plist = pdata.properties if pdata.properties else []
-        name = name if case_sensitive else name.lower()
-        for prop in plist:
-            nom = prop.name if case_sensitive else prop.name.lower()
-            if nom == name:
-                return prop
-        return None
-    def property_adder(plist, prop_exists):
-        """
-        Generator that abstracts away how new properties are added to an
-        existing property list.
-        """
-        def no_conflict(padd):
-            plist.append(padd)
-        def conflict(padd):
-            if args.force:
-                for i,entry in enumerate(plist):
-                    if entry.name == padd.name:
-                        plist[i] = padd
-                        return
-            else:
-                # Do not overwrite.
-                msg = 'A property named "{}" already exists.'.format(padd.name)
-                raise EntryExistsError(msg)
-        return conflict if prop_exists else no_conflict
-    def infer_value(vstr):
-        """
-        Infer whether the value string is a scalar, vector, or
-        matrix.
-
-            scalars: single value
-            vectors: one or more scalars in square brackets, e.g. [1, 2, 3]
-            matrices: vector of vectors (row-dominant).
-
-        Returns
-        -------
-            (value type, value)
-        """
-        # ensure all character strings are quoted, otherwise they will
-        # be treated as variables and raise an Exception
-        quoteRE = re.compile(r"""(\b[a-zA-Z_]\w*)""")
-        vstr = re.sub(quoteRE, r'"\1"', str(vstr))
-        # do not use the built in eval as this is a huge security
-        # vulnerability. ast.literal_eval only allows evaluation to
-        # basic types, lists, tuples, dicts and None.
-        value = ast.literal_eval(vstr)
-        if not isinstance(value, list):
-            # is value a scalar?
-            return ('scalars', value)
-        elif not isinstance(value[0], list):
-            # is value a list of scalars, e.g. vector?
-            return ('vectors', value)
-        else:
-            # value must be a vector of vectors
-            return ('matrices', value)
-    def parse_units(units):
-        return units
-    def parse_condition(cond):
-        kwds = {}
-        if cond is None:
-            return None
-        try:
-            k,v,u = cond.strip().split('=')
-            kwds['units'] = u
-        except ValueError:
-            k,v = cond.strip().split('=')
-        vtype, v = infer_value(v)
-        kwds['name'] = k
-        kwds[vtype] = v
-        return Value(**kwds)
-    def parse_data_type(dtype):
-        allowedRE = re.compile(r'(MACHINE_LEARNING|COMPUTATIONAL|EXPERIMENTAL)',
-                               re.IGNORECASE)
-        if dtype is None:
-            return None
-        elif re.match(allowedRE, dtype):
-            return dtype
-        else:
-            msg = 'Data type must be one of: MACHINE_LEARNING, ' \
-                  'COMPUTATIONAL, or EXPERIMENTAL.'
-            UnrecognizedOptionValueError(msg)
-    def parse_contact(cont):
-        kwds = {}
-        if cont is None:
-            return None
-        # split name and email
-        try:
-            name,email = cont.strip().split(',')
-            kwds['email'] = email.strip()
-        except ValueError:
-            name = cont.strip()
-        # split given name from family name
-        try:
-            name = name.split()
-            given = name[0]
-            family = ' '.join(name[1:])
-        except ValueError:
-            given = name.strip()
-            family = None
-        kwds['given'] = given
-        kwds['family'] = family
-        return Person(**kwds)
-    def parse_tag(tag):
-        return tag
-    def parse_json(filename):
-        # which key/keys are equivalent to scalar values?
-        valueRE = re.compile(r'value.*?\b', re.IGNORECASE)
-        # TODO: which key/keys are equivalent to vectors? matrices?
-        # load the json file
-        with open(filename) as ifs:
-            jdata = json.load(ifs)
-        # create an empty list of properties
-        props = []
-        for k,v in iter(jdata.items()):
-            try:
-                # if v is a dictionary, i.e. has
-                # [scalar/vector/matrix equivalent][, units[, ...]]
-                # create a Property from this data.
-                for key in v.keys():
-                    if re.match(valueRE, key):
-                        vtype, val = infer_value(v[key])
-                        v[vtype] = v[key]
-                        del v[key]
-                prop = Property(k, **v)
-            except AttributeError:
-                # list, scalar, etc. -- something that doesn't have the
-                # map defining the characteristics of the entry.
-                vtype, val = infer_value(v)
-                kwds = { vtype : val }
-                prop = Property(k, **kwds)
-            props.append(prop)
-        return props
+        1. Matching property as a JSON-formatted string.
+        2-4, 6. pifdata with Property added as appropriate.
+        5. Property names as a string.
+    """
+    from pypif.pif import Property
+    from pifmod.values import parse_value
     # parse command line options
     if pifdata.properties is None:
         pifdata.properties = []
-    proplist = pifdata.properties
+    proplist = PropertyIndex(pifdata.properties)
     # only list the available property names
     if args.list:
         ostream = StringIO()
@@ -291,11 +493,10 @@ def property(pifdata):
         for prop in proplist:
             ostream.write("- {}\n".format(prop.name))
         try:
-            properties = args.arglist[0]
-            properties = parse_json(properties)
+            names = source_names(args.arglist[0])
             ostream.write("{}\n".format(args.arglist[0]))
-            for prop in properties:
-                ostream.write("- {}\n".format(prop.name))
+            for name in names:
+                ostream.write("- {}\n".format(name))
         except IndexError:
             pass
         result = ostream.getvalue()
@@ -303,17 +504,26 @@ def property(pifdata):
         return result
     nargs = len(args.arglist)
     # were any other parameters specified?
-    kwds = {}
-    units = parse_units(args.units)
-    if units is not None: kwds['units'] = units
-    conditions = [parse_condition(c) for c in args.conditions]
-    if conditions != [] : kwds['conditions'] = conditions
-    dataType = parse_data_type(args.datatype)
-    if dataType is not None: kwds['data_type'] = dataType
-    contacts = [parse_contact(c) for c in args.contacts]
-    if contacts != [] : kwds['contacts'] = contacts
-    tags = [parse_tag(t) for t in args.tags]
-    if tags != []: kwds['tags'] = tags
+    kwds = property_keywords(args.units, args.conditions, args.datatype,
+                             args.contacts, args.tags)
+    # summarize a vector/matrix property
+    if args.reduce is not None:
+        from pifmod.reductions import parse_reductions
+        reductions = parse_reductions(args.reduce)
+        if nargs == 1:
+            ifile, propname = None, args.arglist[0].strip()
+            src = proplist.get(propname)
+        else:
+            ifile, propname = args.arglist
+            src = source_property(ifile, propname)
+        if src is None:
+            msg = '{} was not found in {}.'.format(propname,
+                'the PIF data' if ifile is None else ifile)
+            raise ValueError(msg)
+        for newprop in reduced_properties(src, reductions, kwds):
+            property_adder(proplist, prop_exists=(newprop.name in proplist),
+                force=args.force)(newprop)
+        return pifdata
     # This is longer than it should be, and could use some refactoring.
     # But the logic is this:
     # 1. If only one argument was given, we are getting or setting a property
@@ -333,8 +543,8 @@ def property(pifdata):
         if v is not None:
             # setting a property
             # does the property exist?
-            prop = get_property(proplist, k, case_sensitive=False)
-            vtype,v = infer_value(v) # scalar, vector, matrix
+            prop = proplist.get(k)
+            vtype,v = parse_value(v) # scalar, vector, matrix
             # construct the arguments to Property...
             # ... name
             kwds['name'] = k
@@ -342,33 +552,95 @@ def property(pifdata):
             kwds[vtype] = v
             # add the property to pifdata
             newprop = Property(**kwds)
-            property_adder(proplist, prop_exists=(prop is not None))(newprop)
-            return '{}'.format(pif.dumps(pifdata))
+            property_adder(proplist, prop_exists=(prop is not None),
+                force=args.force)(newprop)
+            return pifdata
         else:
-            prop = get_property(proplist, k, case_sensitive=False)
-            return pif.dumps(prop)
+            prop = proplist.get(k)
+            return dumps(prop)
     elif nargs == 2:
         # reading a property from a json-formatted source file
         ifile, propname = args.arglist
         # get desired property from input file
-        dst = get_property(proplist, propname, case_sensitive=False)
-        # parse the properties present in the source file
-        props = parse_json(ifile)
-        src = get_property(props, propname, case_sensitive=False)
-        for k,v in iter(kwds.items()):
-            setattr(src, k, v)
+        dst = proplist.get(propname)
+        # parse only the requested property of the source file
+        src = source_property(ifile, propname)
         if src is None:
             msg = '{} was not found in {}.'.format(propname, ifile)
             raise ValueError(msg)
+        # the parsed source may be reused, so modify a copy
+        src = copy.copy(src)
+        for k,v in iter(kwds.items()):
+            setattr(src, k, v)
         # create a function to add the property
-        property_adder(proplist, prop_exists=(dst is not None))(src)
-        return '{}'.format(pif.dumps(pifdata))
+        property_adder(proplist, prop_exists=(dst is not None),
+            force=args.force)(src)
+        return pifdata
     else:
         # should never get here if the parser custom action did its job.
         msg = "If you're seeing this, the custom parser didn't do its job."
         raise RuntimeError(msg)
 
 
+def reduced_properties(prop, reductions, kwds=None):
+    """
+    Summarizes the vector or matrix property PROP.
+
+    Parameters
+    ----------
+    :prop, Property: Property whose values are reduced.
+    :reductions, list: Reductions, e.g. ['median', 'p95'] (see
+        pifmod.reductions).
+    :kwds, dict: Other keywords for each new Property. Units default to
+        those of PROP, except for count.
+
+    Returns
+    -------
+    List of scalar Properties named "REDUCTION NAME".
+    """
+    from pypif.pif import Property
+    from pifmod.reductions import reduce_values
+    values = prop.vectors if prop.vectors is not None else prop.matrices
+    if values is None:
+        msg = '{} is not a vector or matrix property.'.format(prop.name)
+        raise ValueError(msg)
+    kwds = {} if kwds is None else kwds
+    props = []
+    for reduction, value in reduce_values(values, reductions):
+        pkwds = dict(kwds)
+        pkwds['name'] = '{} {}'.format(reduction, prop.name)
+        pkwds['scalars'] = value
+        if 'units' not in kwds and reduction != 'count' and \
+           prop.units is not None:
+            pkwds['units'] = prop.units
+        props.append(Property(**pkwds))
+    return props
+
+
+def set_uid(pifdata, uidval, force=False):
+    """
+    Sets the UID of PIFDATA to UIDVAL. Unless FORCE is True, an existing
+    UID is left alone: nothing is done if it matches UIDVAL and
+    UIDMismatchError is raised if it does not.
+
+    Returns
+    -------
+    True if the UID was set, False if it already matched.
+    """
+    if check_tag(pifdata, 'uid'):
+        # stop if UID already exists and force not specified
+        # check if the UIDs match
+        if not force:
+            if pifdata.uid == uidval:
+                return False
+            else:
+                msg = 'UID {} does not match {}.'.format(
+                    pifdata.uid, uidval)
+                raise UIDMismatchError(msg)
+    pifdata.uid = uidval
+    return True
+
+
 # uid
 def uid(pifdata):
     """
@@ -386,7 +658,8 @@ def uid(pifdata):
       pifmod -i INPUT.pif -o OUTPUT.pif uid
 
       # sets the UID to "jasdk-2132-asdfkasf". If UID already exists,
-      # returns os._exit(0) if the UIDs match.
+      # nothing is written if the UIDs match and UIDMismatchError is
+      # raised if they do not.
       pifmod -i INPUT.pif -o OUTPUT.pif uid jasdk-2132-asdfkasf
 
       # sets the UID to "jasdk-2132-asdfkasf", overwriting the UID
@@ -394,21 +667,15 @@ def uid(pifdata):
       pifmod -i INPUT.pif -o OUTPUT.pif uid -f jasdk-2132-asdfkasf
 
     For the first case, this returns the UID, if it exists, or None.
-    For the second or third case, returns nothing.
+    For the second or third case, returns the modified PIF data, or
+    None if the UIDs already match.
     """
     try:
         # handle cases two and three
         uidval = args.arglist[0]
-        if check_tag(pifdata, 'uid'):
-            # exit if UID already exists and force not specified
-            # check if the UIDs match
-            if not args.force:
-                if pifdata.uid == uidval:
-                    os._exit(0)
-                else:
-                    os._exit(1)
-        pifdata.uid = uidval
-        return '{}\n'.format(pif.dumps(pifdata))
+        if not set_uid(pifdata, uidval, force=args.force):
+            return None
+        return pifdata
     except IndexError:
         # handle case one
         rval = getattr(pifdata, 'uid', None)
@@ -416,205 +683,1468 @@ def uid(pifdata):
         return '{}\n'.format(rval)
 
 
-def main ():
-    global args
-    # read PIF
-    if args.ifile is not None:
-        with open(args.ifile) as ifs:
-            pifdata = pif.load(ifs)
+# apply
+# required and optional fields of each type of edit
+_edit_fields = {
+    'set' : (('name', 'value'),
+             ('units', 'conditions', 'data_type', 'contacts', 'tags', 'force')),
+    'import' : (('file', 'name'),
+                ('units', 'conditions', 'data_type', 'contacts', 'tags',
+                 'force')),
+    'uid' : (('uid',), ('force',))
+}
+
+
+def load_edits(filename=None, sets=()):
+    """
+    Reads a list of edits from the JSON-formatted FILENAME and appends a
+    "set" edit for each NAME=VALUE string in SETS.
+    """
+    from pifmod.values import parse_value
+    edits = []
+    if filename is not None:
+        with open(filename) as ifs:
+            edits = json.load(ifs)
+        if isinstance(edits, dict):
+            edits = [edits]
+    for kv in sets:
+        try:
+            k,v = kv.strip().split('=')
+        except ValueError:
+            msg = '--set requires NAME=VALUE, not "{}".'.format(kv)
+            raise InvalidEditError(msg)
+        edits.append({'op' : 'set', 'name' : k, 'value' : parse_value(v)[1]})
+    return edits
+
+
+def prepare_edit(edit, force=False):
+    """
+    Validates EDIT and returns a function, f(pifdata, index), that
+    applies it to a record and its PropertyIndex.
+    """
+    from pypif.pif import Property
+    from pifmod.values import classify_value
+    op = edit.get('op')
+    if op not in _edit_fields:
+        msg = 'op must be one of {}, not {}.'.format(
+            ', '.join(sorted(_edit_fields)), op)
+        raise ValueError(msg)
+    required, optional = _edit_fields[op]
+    missing = [k for k in required if k not in edit]
+    if missing:
+        raise ValueError('Missing {}.'.format(', '.join(missing)))
+    unknown = [k for k in edit if k != 'op' and k not in required + optional]
+    if unknown:
+        raise ValueError('Unknown {}.'.format(', '.join(sorted(unknown))))
+    force = edit.get('force', force)
+    if op == 'uid':
+        uidval = edit['uid']
+        def action(pifdata, index):
+            set_uid(pifdata, uidval, force=force)
+        return action
+    kwds = property_keywords(edit.get('units'), edit.get('conditions', []),
+                             edit.get('data_type'), edit.get('contacts', []),
+                             edit.get('tags', []))
+    if op == 'set':
+        vtype, val = classify_value(edit['value'])
+        kwds['name'] = edit['name']
+        kwds[vtype] = val
+        prop = Property(**kwds)
     else:
-        pifdata = pif.load(sys.stdin)
-    # perform requested action
-    if args.action == 'property':
-        rval = str(property(pifdata))
-    elif args.action == 'uid':
-        rval = str(uid(pifdata))
-    elif args.action == 'sagittariidae':
-        if not isinstance(pifdata, list):
-            pifdata = [pifdata]
-        add_link = sagittariidae.link_factory(
-			projectID='nq3X4-concept-inconel718',
-			host='http://sagittariidae.adapt.mines.edu')
-        for p in pifdata:
-            add_link(p)
-        return json.dumps(pifdata)
+        ifile, propname = edit['file'], edit['name']
+        src = source_property(ifile, propname)
+        if src is None:
+            msg = '{} was not found in {}.'.format(propname, ifile)
+            raise ValueError(msg)
+        prop = copy.copy(src)
+        for k,v in iter(kwds.items()):
+            setattr(prop, k, v)
+    def action(pifdata, index):
+        property_adder(index, prop_exists=(prop.name in index),
+            force=force)(prop)
+    return action
+
+
+def prepare_edits(edits, force=False):
+    """
+    Validates every edit in EDITS before any is applied.
+
+    Returns
+    -------
+    List of functions, f(pifdata, index), as from prepare_edit.
+    """
+    if not edits:
+        raise InvalidEditError('No edits were given.')
+    prepared = []
+    for i,edit in enumerate(edits):
+        try:
+            prepared.append(prepare_edit(edit, force=force))
+        except (KeyError, ValueError, TypeError, AttributeError, IOError,
+                LocalException), e:
+            raise InvalidEditError('Edit {}: {}'.format(i+1,
+                                                        error_message(e)))
+    return prepared
+
+
+_edits = None
+def apply(pifdata):
+    """
+    Applies many property/uid edits to the PIF-formatted data in a
+    single pass, e.g.
+
+        pifmod -i material.pif -o out.pif apply EDITS.json
+        pifmod -i material.pif -o out.pif apply --set foo=bar --set baz=1
+
+    EDITS.json holds a list of edits, each a JSON object with an "op":
+
+        {"op": "set", "name": NAME, "value": VALUE[, "units": UNITS,
+         "conditions": [...], "data_type": TYPE, "contacts": [...],
+         "tags": [...], "force": BOOL]}
+            # As "property [--units=...] NAME=VALUE". Conditions and
+            # contacts take the same form as on the command line.
+        {"op": "import", "file": FILE, "name": NAME[, ...]}
+            # As "property FILE NAME", with the same options as "set".
+        {"op": "uid", "uid": UID[, "force": BOOL]}
+            # As "uid UID".
+
+    Every edit is validated before any is applied, and nothing is
+    written unless all of them succeed. "force" defaults to -f.
+
+    Returns
+    -------
+    pifdata with the edits applied.
+    """
+    global _edits
+    if _edits is None:
+        _edits = prepare_edits(load_edits(args.edits, args.sets),
+                               force=args.force)
+    if pifdata.properties is None:
+        pifdata.properties = []
+    index = PropertyIndex(pifdata.properties)
+    for action in _edits:
+        action(pifdata, index)
+    return pifdata
+
+
+# diff/patch
+def diff():
+    """
+    Compares two PIFs and returns the JSON Patch (RFC 6902) that turns
+    the first into the second, e.g.
+
+        pifmod diff old.pif new.pif > changes.json
+        pifmod -i old.pif -o new.pif patch changes.json
+
+    Properties, preparation steps, details, etc. are matched by name,
+    and records in a package by uid, rather than by position, so the
+    patch holds only what changed. See pifmod.patch for the format.
+    Either PIF may be "-" for stdin.
+
+    Returns
+    -------
+    JSON-formatted patch (string).
+    """
+    from pifmod import encodings
+    from pifmod import patch as pifpatch
+    trees = [encodings.as_dictionary(read_pif(None if f == '-' else f))
+             for f in (args.old, args.new)]
+    with timing.phase('action'):
+        ops = pifpatch.diff(*trees)
+    return json.dumps(ops)
+
+
+_patch_ops = None
+def patch(pifdata):
+    """
+    Applies a JSON Patch, as written by diff, to the PIF-formatted data,
+    e.g.
+
+        pifmod -i old.pif -o new.pif patch changes.json
+
+    Returns
+    -------
+    Patched pifdata.
+    """
+    global _patch_ops
+    from pypif import pif
+    from pifmod import encodings
+    from pifmod import patch as pifpatch
+    if _patch_ops is None:
+        with open(args.patch) as ifs:
+            _patch_ops = json.load(ifs)
+    tree = encodings.as_dictionary(pifdata)
+    try:
+        return pif.loado(pifpatch.apply_patch(tree, _patch_ops))
+    except pifpatch.PatchError, e:
+        raise InvalidEditError(e.args[0])
+
+
+def read_pif(filename=None):
+    """
+    Reads PIF-formatted data, in any of the formats of pifmod.encodings,
+    from FILENAME or, if FILENAME is None, from stdin.
+    """
+    return loads(read_data(filename))
+
+
+def read_data(filename=None):
+    """
+    Reads the contents of FILENAME or, if FILENAME is None, of stdin.
+    """
+    with timing.phase('read'):
+        if filename is not None:
+            with open(filename, 'rb') as ifs:
+                text = ifs.read()
+        else:
+            text = sys.stdin.read()
+    timing.add_bytes('read', len(text))
+    return text
+
+
+def loads(text):
+    """
+    Decodes the PIF-formatted string TEXT, detecting its format (JSON,
+    compressed JSON or npz; see pifmod.encodings).
+    """
+    from pifmod import encodings
+    with timing.phase('parse'):
+        return encodings.decode(text)
+
+
+def dumps(pifdata):
+    """
+    Encodes PIFDATA as a JSON-formatted string.
+    """
+    from pypif import pif
+    with timing.phase('serialize'):
+        rval = pif.dumps(pifdata)
+    timing.add_bytes('serialize', len(rval))
+    return rval
+
+
+def output_format(filename=None):
+    """
+    Returns the format in which PIF records are written to FILENAME
+    (None for stdout): --format if given, otherwise the format implied
+    by the extension of FILENAME.
+    """
+    from pifmod import encodings
+    if args.format is not None:
+        return args.format
+    return encodings.format_from_filename(filename)
+
+
+def serialize(rval, fmt='json'):
+    """
+    Converts RVAL, a result from perform, into a string: PIF records are
+    encoded in format FMT (see pifmod.encodings) and strings are
+    returned as they are. To write RVAL, use write_result, which does
+    not hold the whole encoded result in memory.
+    """
+    from pifmod import encodings
+    if rval is None or isinstance(rval, basestring):
+        return rval
+    with timing.phase('serialize'):
+        data = encodings.encode(rval, fmt)
+    timing.add_bytes('serialize', len(data))
+    return data
+
+
+def write_result(ofs, rval, fmt='json'):
+    """
+    Writes RVAL, a result from perform, to the file-like OFS. PIF
+    records are encoded in format FMT and streamed to OFS in chunks;
+    strings are written as they are.
+    """
+    from pifmod import encodings
+    if isinstance(rval, basestring):
+        write_output(ofs, rval)
+        return
+    out = timing.TimedWriter(ofs, 'write')
+    # time spent writing chunks is charged to 'write'
+    with timing.phase('serialize'):
+        encodings.write(rval, out, fmt)
+    timing.add_bytes('serialize', out.nbytes)
+
+
+def write_file(filename, rval, fmt='json'):
+    """
+    Writes RVAL, a result from perform, to FILENAME, replacing it
+    atomically (see pifmod.atomicfile). If the output is identical to
+    the existing file, the file is left untouched.
+
+    Returns
+    -------
+    True if FILENAME was written, False if it was unchanged.
+    """
+    from pifmod.atomicfile import AtomicFile
+    with AtomicFile(filename) as ofs:
+        write_result(ofs, rval, fmt)
+    return ofs.changed
+
+
+def write_output(ofs, text):
+    """
+    Writes the string TEXT to the file-like OFS.
+    """
+    with timing.phase('write'):
+        ofs.write(text)
+    timing.add_bytes('write', len(text))
+
+
+def parse_projects(projects, host):
+    """
+    Converts PROJECT[@HOST] strings into (host, project) pairs. Projects
+    without an explicit host are found on HOST.
+    """
+    pairs = []
+    for project in projects:
+        project, _, phost = project.partition('@')
+        pairs.append((phost or host, project))
+    return pairs
+
+
+# (projects, jobs) or (snapshot, projects, modified) --> (time created,
+# link function)
+_linkers = {}
+def sagittariidae_linker():
+    """
+    Returns the sagittariidae link function, fetching the sample lists
+    only the first time they are needed. Link functions older than the
+    urlio cache TTL, or all with --refresh, are rebuilt so that a
+    long-running process sees changes to the catalogue. With --catalog,
+    the sample lists are read from the snapshot instead, once per
+    version of the file.
+    """
+    from pifmod import urlio
+    from pifmod.linkages import sagittariidae
+    if args.catalog is not None:
+        projects = parse_projects(args.projects, args.host) or None
+        key = (os.path.abspath(args.catalog),
+               None if projects is None else tuple(projects),
+               os.path.getmtime(args.catalog))
+        created, linker = _linkers.get(key, (None, None))
+        if linker is None:
+            linker = sagittariidae.snapshot_link_factory(args.catalog,
+                                                         projects)
+            _linkers[key] = (time.time(), linker)
+        return linker
+    projects = parse_projects(
+        args.projects or ['nq3X4-concept-inconel718'], args.host)
+    key = (tuple(projects), args.jobs)
+    created, linker = _linkers.get(key, (None, None))
+    if linker is None or args.refresh or \
+       time.time() - created > urlio.CACHE_TTL:
+        linker = sagittariidae.multi_link_factory(projects, jobs=args.jobs,
+                                                  refresh=args.refresh)
+        _linkers[key] = (time.time(), linker)
+    return linker
+
+
+def enrich_records(records):
+    """
+    Adds the --enrich fields of the linked sagittariidae samples to
+    RECORDS.
+    """
+    from pifmod.linkages import enrich
+    try:
+        fields = enrich.parse_fields(args.enrich)
+    except ValueError, e:
+        raise UnrecognizedOptionValueError(e.args[0])
+    return enrich.enrich(records, fields, jobs=args.jobs, rate=args.rate,
+                         retries=args.retries, force=args.force)
+
+
+def snapshot():
+    """
+    Saves the sample catalogues of the sagittariidae projects to
+    --snapshot, for linking with --catalog.
+    """
+    from pifmod.linkages import sagittariidae
+    projects = parse_projects(
+        args.projects or ['nq3X4-concept-inconel718'], args.host)
+    sagittariidae.write_snapshot(args.snapshot, projects, jobs=args.jobs,
+                                 refresh=args.refresh)
+
+
+# actions that operate on one record at a time
+_record_actions = ('property', 'uid', 'apply')
+
+
+def perform(pifdata, action):
+    """
+    Performs ACTION on PIFDATA, a record or a package (list) of records,
+    and returns the result: the modified PIF data, a string (e.g. a UID
+    or property) to be written as is, or None if there is nothing to
+    write. See serialize.
+
+    property, uid and apply act on each record of a package in turn.
+    With --select, every action acts only on the matching records.
+    """
+    with timing.phase('action'):
+        if args.select or \
+           (isinstance(pifdata, list) and action in _record_actions):
+            return perform_records(pifdata, action)
+        return perform_record(pifdata, action)
+
+
+def perform_record(pifdata, action):
+    """
+    Performs ACTION on PIFDATA. See perform.
+    """
+    if action == 'property':
+        return property(pifdata)
+    elif action == 'uid':
+        return uid(pifdata)
+    elif action == 'apply':
+        return apply(pifdata)
+    elif action == 'patch':
+        return patch(pifdata)
+    elif action == 'sagittariidae':
+        add_link = sagittariidae_linker()
+        records = pifdata if isinstance(pifdata, list) else [pifdata]
+        add_link.link_all(records)
+        if args.enrich:
+            enrich_records(records)
+        return pifdata
     else:
-        msg = '{} is not a recognized action.'.format(args.action)
+        msg = '{} is not a recognized action.'.format(action)
         raise ValueError(msg)
+
+
+def selected_records(records):
+    """
+    Returns the positions of the RECORDS selected by --select, or of
+    every record if there is no selection.
+    """
+    if not args.select:
+        return range(len(records))
+    from pifmod.selection import RecordIndex, parse_selection
+    selections = [parse_selection(spec) for spec in args.select]
+    return RecordIndex(records).select(selections)
+
+
+def perform_records(pifdata, action):
+    """
+    Performs ACTION on each selected record of PIFDATA, a record or a
+    list of records; the others are left unchanged.
+
+    Returns
+    -------
+    The string results (e.g. UIDs), one per line, if ACTION returns
+    strings; PIFDATA, with the modified records, if any record was
+    modified; otherwise None.
+    """
+    records = pifdata if isinstance(pifdata, list) else [pifdata]
+    positions = selected_records(records)
+    if action == 'sagittariidae':
+        if not positions:
+            return None
+        perform_record([records[i] for i in positions], action)
+        return pifdata
+    texts, modified = [], False
+    for i in positions:
+        rval = perform_record(records[i], action)
+        if rval is None:
+            continue
+        elif isinstance(rval, basestring):
+            texts.append(rval if rval.endswith('\n') else rval + '\n')
+        else:
+            # e.g. patch returns a new record
+            records[i] = rval
+            modified = True
+    if texts:
+        return ''.join(texts)
+    if not modified:
+        return None
+    return pifdata if isinstance(pifdata, list) else records[0]
+
+
+def package_workers(action):
+    """
+    Returns True if ACTION is to be performed on the records of a
+    package by --workers processes (see perform_package).
+    """
+    if args.workers == 1 or action == 'sagittariidae':
+        return False
+    if action not in _record_actions and not args.select:
+        return False
+    # workers write JSON
+    return output_format(args.ofile) == 'json'
+
+
+# (records, action) shared with the worker processes of perform_package,
+# which inherit it when they are forked
+_pool_records = None
+
+
+def package_pool_worker(positions):
+    """
+    Builds the records at POSITIONS of _pool_records, performs the
+    action on them and encodes them, in a worker process. Exceptions,
+    which may not survive pickling, are returned rather than raised.
+
+    Returns
+    -------
+    (status, value, timings): status is 'text' and value the string
+    results; 'records' or 'unchanged' and value the JSON text of each
+    record, modified or not; or 'error' and value (exception class,
+    message). Timings are as from timing.report.
+    """
+    from pifmod import encodings
+    from pypif import pif
+    timing.reset()
+    objs, action = _pool_records
+    try:
+        with timing.phase('parse'):
+            records = pif.loado([objs[i] for i in positions])
+        with timing.phase('action'):
+            rval = perform_records(records, action)
+        if isinstance(rval, basestring):
+            return ('text', rval, timing.report())
+        with timing.phase('serialize'):
+            texts = [''.join(encodings.iterencode(r)) for r in records]
+        status = 'unchanged' if rval is None else 'records'
+        return (status, texts, timing.report())
+    except Exception, e:
+        return ('error', (e.__class__, u'{}'.format(error_message(e))),
+                timing.report())
+
+
+def perform_package(data, action):
+    """
+    Performs ACTION on each record of DATA, a PIF-formatted string, as
+    perform does, dividing the records among --workers processes. The
+    workers build, modify and encode the records of their chunk of the
+    package, which is where most of the time goes, and the chunks are
+    reassembled in order.
+
+    Returns
+    -------
+    As perform, except that a modified package is returned as its JSON
+    text. A single record, or a package when there is only one worker,
+    is performed on in this process.
+    """
+    global _pool_records
+    import multiprocessing
+    from pifmod import encodings
+    from pypif import pif
+    with timing.phase('parse'):
+        objs = encodings.decode_object(data)
+    workers = args.workers if args.workers > 0 else \
+        multiprocessing.cpu_count()
+    if not isinstance(objs, list) or min(workers, len(objs)) < 2:
+        with timing.phase('parse'):
+            pifdata = pif.loado(objs)
+        return perform(pifdata, action)
+    workers = min(workers, len(objs))
+    chunksize = max(1, len(objs)//(4*workers))
+    chunks = [range(i, min(i + chunksize, len(objs)))
+              for i in range(0, len(objs), chunksize)]
+    _pool_records = (objs, action)
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        # map preserves the order of the chunks
+        outputs = pool.map(package_pool_worker, chunks, 1)
+    finally:
+        pool.close()
+        pool.join()
+        _pool_records = None
+    for status, value, report in outputs:
+        timing.merge(report)
+        if status == 'error':
+            cls, msg = value
+            raise cls(msg)
+    texts = [value for status, value, report in outputs if status == 'text']
+    if texts:
+        return ''.join(texts)
+    if all(status == 'unchanged' for status, value, report in outputs):
+        return None
+    # as pif.dumps writes a list
+    return '[' + ', '.join(text for status, value, report in outputs
+                           for text in value) + ']'
+
+
+# batch
+def batch_files(patterns):
+    """
+    Expands the glob PATTERNS into a sorted list of unique filenames.
+    """
+    filenames = set()
+    for pattern in patterns:
+        filenames.update(f for f in glob.glob(pattern) if os.path.isfile(f))
+    return sorted(filenames)
+
+
+def batch_output(ifile):
+    """
+    Returns the output filename of the batch input IFILE: the file of the
+    same name in --outdir.
+    """
+    return os.path.join(args.outdir, os.path.basename(ifile))
+
+
+def batch_collisions(filenames):
+    """
+    Returns (input filename, first input filename with the same output)
+    for each of FILENAMES whose output file (see batch_output) is that
+    of an earlier file, e.g. a/pif.json and b/pif.json.
+    """
+    first, collisions = {}, []
+    for ifile in filenames:
+        ofile = os.path.abspath(batch_output(ifile))
+        if ofile in first:
+            collisions.append((ifile, first[ofile]))
+        else:
+            first[ofile] = ifile
+    return collisions
+
+
+def batch_worker(ifile):
+    """
+    Applies the batch action to a single file. Errors are caught and
+    reported rather than raised so that one bad file does not stop the
+    remaining files from being processed.
+
+    Returns
+    -------
+    (input filename, True on success/False on failure, message)
+    """
+    try:
+        ofile = batch_output(ifile)
+        if file_exists(ofile) and not args.force:
+            msg = '{} exists. Use -f to overwrite.'.format(ofile)
+            raise EntryExistsError(msg)
+        rval = perform(read_pif(ifile), args.batch_action)
+        if rval is not None:
+            write_file(ofile, rval, output_format(ofile))
+        return (ifile, True, ofile)
+    except Exception, e:
+        return (ifile, False, '{}'.format(error_message(e)))
+
+
+def batch_pool_worker(ifile):
+    """
+    As batch_worker, for a worker process. The timings of the file, as
+    from timing.report, are appended to the result so that they can be
+    added to those of the parent.
+    """
+    timing.reset()
+    return batch_worker(ifile) + (timing.report(),)
+
+
+def batch():
+    """
+    Applies a single uid/property/apply/patch action to many PIF files.
+    There is one anticipated use case:
+
+        pifmod [-f] batch [-j JOBS] --inputs 'dir/*.json' --outdir out/ \
+            property --units=mm foo=bar
+            # Applies "property --units=mm foo=bar" to every file
+            # matching dir/*.json and writes the result to a file of
+            # the same name in out/. Files are distributed across JOBS
+            # worker processes (default: number of CPUs).
+
+    A summary of each file's success or failure is written to stdout
+    once all files have been processed. Inputs of the same name in
+    different directories would overwrite one another's output, so
+    none of the files is processed if there are any.
+
+    Returns
+    -------
+    (number of successes, number of failures)
+    """
+    filenames = batch_files(args.inputs)
+    collisions = batch_collisions(filenames)
+    if collisions:
+        for ifile, other in collisions:
+            sys.stdout.write('FAILED {}: same output file {} as {}\n'.format(
+                ifile, batch_output(ifile), other))
+        msg = '{} of {} files have the same output file as another.'.format(
+            len(collisions), len(filenames))
+        raise BatchError(msg)
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+    import multiprocessing
+    jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+    jobs = min(jobs, max(len(filenames), 1))
+    if jobs == 1:
+        results = [batch_worker(f) for f in filenames]
+    else:
+        pool = multiprocessing.Pool(processes=jobs)
+        try:
+            chunksize = max(1, len(filenames)//(4*jobs))
+            results = pool.map(batch_pool_worker, filenames, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+        for result in results:
+            timing.merge(result[-1])
+        results = [result[:-1] for result in results]
+    # report
+    succeeded, failed = 0, 0
+    for ifile, ok, msg in results:
+        if ok:
+            succeeded += 1
+            sys.stdout.write('OK {} -> {}\n'.format(ifile, msg))
+        else:
+            failed += 1
+            sys.stdout.write('FAILED {}: {}\n'.format(ifile, msg))
+    sys.stdout.write('{} succeeded, {} failed\n'.format(succeeded, failed))
+    return (succeeded, failed)
+
+
+# store
+def store_ingest(db):
+    """
+    Adds the records of the --inputs files to the store DB. Records
+    whose UID is already stored are replaced only with -f.
+
+    Returns
+    -------
+    (number of files ingested, number that failed)
+    """
+    succeeded, failed = 0, 0
+    for ifile in batch_files(args.inputs):
+        try:
+            pifdata = read_pif(ifile)
+            records = pifdata if isinstance(pifdata, list) else [pifdata]
+            counts = {'added' : 0, 'replaced' : 0, 'skipped' : 0}
+            for record in records:
+                counts[db.add(record, os.path.abspath(ifile),
+                              replace=args.force)] += 1
+        except Exception, e:
+            failed += 1
+            sys.stdout.write('FAILED {}: {}\n'.format(ifile,
+                                                      error_message(e)))
+            continue
+        succeeded += 1
+        sys.stdout.write('OK {}: {added} added, {replaced} replaced, ' \
+                         '{skipped} skipped\n'.format(ifile, **counts))
+    sys.stdout.write('{} succeeded, {} failed\n'.format(succeeded, failed))
+    return (succeeded, failed)
+
+
+def store_export(db, ids):
+    """
+    Returns the records IDS of the store DB: a package, or a record if
+    a single record was named with --record.
+    """
+    texts = db.texts(ids)
+    single = len(args.records) == 1 and not args.select and len(texts) == 1
+    if output_format(args.ofile) != 'json':
+        pifdata = loads('[' + ', '.join(texts) + ']')
+        return pifdata[0] if single else pifdata
+    # stored as written by pif.dumps
+    return texts[0] if single else '[' + ', '.join(texts) + ']'
+
+
+def store_perform(db, ids, action):
+    """
+    Performs ACTION on each of the records IDS of the store DB, as
+    perform_records does on a package. Modified records are written
+    back to the store.
+
+    Returns
+    -------
+    The string results (e.g. UIDs or properties), one per line, or None.
+    """
+    texts = []
+    for rowid, record in db.load(ids):
+        with timing.phase('action'):
+            rval = perform_record(record, action)
+        if rval is None:
+            continue
+        elif isinstance(rval, basestring):
+            texts.append(rval if rval.endswith('\n') else rval + '\n')
+        else:
+            db.update(rowid, rval)
+    return ''.join(texts) or None
+
+
+def store():
+    """
+    Keeps PIF records in a local SQLite database (see pifmod.store), so
+    that records are found through the indexes of UIDs, properties and
+    preparation details rather than by reading every file:
+
+        pifmod [-f] store --db pifs.db ingest 'dir/*.json'
+            # Adds the records of every file matching dir/*.json.
+            # Records whose UID is stored are replaced only with -f.
+        pifmod store --db pifs.db --record UID property volume
+            # Gets/sets properties, or UIDs with "uid", or applies
+            # edits/patches to the stored records named with --record
+            # or selected with --select (default: every record).
+            # Modified records are written back to the store.
+        pifmod [-o FILE] [--select ...] store --db pifs.db export
+            # Writes the records as a package.
+
+    Returns
+    -------
+    Output to write, or None.
+    """
+    from pifmod.selection import parse_selection
+    from pifmod.store import Store, StoreError
+    with Store(args.db) as db:
+        if args.store_action == 'ingest':
+            succeeded, failed = store_ingest(db)
+            if failed:
+                msg = '{} of {} files failed.'.format(failed,
+                                                      succeeded + failed)
+                raise BatchError(msg)
+            return None
+        try:
+            selections = [parse_selection(spec) for spec in args.select]
+            ids = db.ids(args.records, selections)
+            if args.store_action == 'export':
+                return store_export(db, ids)
+            return store_perform(db, ids, args.store_action)
+        except StoreError, e:
+            raise InvalidEditError(e.args[0])
+
+
+# json lines
+def jsonl(ifs, ofs):
+    """
+    Applies the requested action to a stream of PIF records, one
+    JSON-formatted record per line, e.g.
+
+        cat package.jsonl | pifmod --jsonl property --units=mm foo=bar
+
+    Each record is read, modified and written before the next is read,
+    so memory use does not grow with the size of the stream. Records
+    that the action leaves untouched (e.g. matching UIDs) are passed
+    through unchanged.
+
+    Returns
+    -------
+    Number of records processed.
+    """
+    nrecords = 0
+    while True:
+        with timing.phase('read'):
+            line = ifs.readline()
+        if not line:
+            break
+        timing.add_bytes('read', len(line))
+        line = line.strip()
+        if not line:
+            continue
+        rval = perform(loads(line), args.action)
+        if rval is None:
+            write_output(ofs, line + '\n')
+        elif isinstance(rval, basestring):
+            write_output(ofs, rval.rstrip('\n') + '\n')
+        else:
+            write_result(ofs, rval)
+            write_output(ofs, '\n')
+        nrecords += 1
+    return nrecords
+
+
+# serve
+def handle_connection(rfile, wfile):
+    """
+    Handles one JSON-formatted request from pifmod.client, read from
+    RFILE, and writes the response to WFILE.
+    """
+    try:
+        response = handle_request(json.loads(rfile.readline()))
+    except Exception, e:
+        response = {'status' : 'error',
+                    'error' : '{}'.format(error_message(e))}
+    wfile.write(json.dumps(response))
+
+
+def handle_request(message):
+    """
+    Runs the pifmod command in MESSAGE inside the daemon. MESSAGE holds
+
+        argv: command line arguments, as for pifmod
+        cwd: working directory against which paths are resolved
+        stdin: input PIF, if no input file is given, or None
+
+    Returns
+    -------
+    Response, a dict with keys
+        status: 'ok', 'error' or 'unsupported' (run the command in the
+            client instead)
+        output: result to write, or None
+        ofile: absolute path of the output file, or None for stdout
+        force: whether the output may be overwritten without asking
+        error: error message, if status is 'error'
+        timings: timings of the request (see timing.report), if -v
+    """
+    global args, _edits, _patch_ops
+    unsupported = {'status' : 'unsupported'}
+    # parse quietly; the client reports usage errors and help itself.
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = StringIO(), StringIO()
+    try:
+        args = build_parser().parse_args(message['argv'])
+    except SystemExit:
+        return unsupported
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    if args.action not in ('uid', 'property', 'apply', 'patch',
+                           'sagittariidae') or \
+       args.jsonl or args.profile is not None:
+        return unsupported
+    if args.action == 'sagittariidae' and args.snapshot is not None:
+        return unsupported
+    # binary output cannot be returned in a JSON response
+    if output_format(args.ofile) != 'json':
+        return unsupported
+    if args.ifile is None and message.get('stdin') is None:
+        return unsupported
+    os.chdir(message['cwd'])
+    _edits = _patch_ops = None
+    timing.reset()
+    try:
+        if args.ifile is not None:
+            pifdata = read_pif(args.ifile)
+        else:
+            # decoded from the JSON message
+            text = message['stdin'].encode('utf-8')
+            timing.add_bytes('read', len(text))
+            pifdata = loads(text)
+        rval = serialize(perform(pifdata, args.action))
+    except Exception, e:
+        return {'status' : 'error', 'error' : '{}'.format(error_message(e))}
+    record = timings_record()
+    if args.timings is not None:
+        write_timings(record, args.timings)
+    return {
+        'status' : 'ok',
+        'output' : rval,
+        'ofile' : None if args.ofile is None else os.path.abspath(args.ofile),
+        'force' : args.force,
+        'timings' : record if args.verbose else None
+    }
+
+
+def serve():
+    """
+    Runs a daemon that accepts pifmod commands on a Unix socket, e.g.
+
+        pifmod serve [--socket PATH]
+
+    The interpreter, pypif, the properties parsed from the MAX_SOURCES
+    most recently used source files ($PIFMOD_MAX_SOURCES) and
+    sagittariidae sample indices stay loaded between commands. Once
+    the daemon is running, pifmod forwards uid, property, apply, patch
+    and sagittariidae commands to it (see pifmod.client) and runs them
+    in-process when no daemon is listening. Requests are handled one
+    at a time.
+    """
+    import signal
+    import SocketServer
+    class DaemonHandler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            handle_connection(self.rfile, self.wfile)
+    path = args.socket
+    if client.request({'argv' : []}, path) is not None:
+        raise LocalException('A daemon is already listening on {}.'.format(path))
+    if os.path.exists(path):
+        # left behind by a daemon that did not exit cleanly
+        os.remove(path)
+    if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+        os.makedirs(os.path.dirname(os.path.abspath(path)))
+    server = SocketServer.UnixStreamServer(path, DaemonHandler)
+    # remove the socket when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+# timings
+def timings_record():
+    """
+    Returns the timings of this run (see timing.report), labelled with
+    the action.
+    """
+    record = timing.report()
+    record['action'] = args.action
+    if args.action == 'batch':
+        record['batch_action'] = args.batch_action
+    return record
+
+
+def write_timings(record, filename='-'):
+    """
+    Appends the timings RECORD as a line of JSON to FILENAME, or writes
+    it to stderr if FILENAME is '-'.
+    """
+    line = json.dumps(record, sort_keys=True) + '\n'
+    if filename == '-':
+        sys.stderr.write(line)
+    else:
+        with open(filename, 'a') as ofs:
+            ofs.write(line)
+
+
+def main ():
+    global args
+    # run as a daemon
+    if args.action == 'serve':
+        serve()
+        return
+    # compare two PIFs
+    if args.action == 'diff':
+        rval = diff()
+        if args.ofile is None:
+            write_output(sys.stdout, rval)
+        elif authorize_overwrite(args.ofile):
+            write_file(args.ofile, rval)
+        return
+    # save sample catalogues for offline linking
+    if args.action == 'sagittariidae' and args.snapshot is not None:
+        if authorize_overwrite(args.snapshot):
+            snapshot()
+        return
+    # query or modify the records of a store
+    if args.action == 'store':
+        rval = store()
+        if rval is None:
+            return
+        fmt = output_format(args.ofile)
+        if args.ofile is None:
+            write_result(sys.stdout, rval, fmt)
+        elif authorize_overwrite(args.ofile):
+            write_file(args.ofile, rval, fmt)
+        return
+    # apply the action to many files
+    if args.action == 'batch':
+        succeeded, failed = batch()
+        if failed:
+            msg = '{} of {} files failed.'.format(failed, succeeded + failed)
+            raise BatchError(msg)
+        return
+    # process one record per line
+    if args.jsonl:
+        if output_format() != 'json':
+            raise UnrecognizedOptionValueError('--jsonl writes JSON only.')
+        ifs = sys.stdin if args.ifile is None else open(args.ifile)
+        try:
+            if args.ofile is None:
+                jsonl(ifs, sys.stdout)
+            elif authorize_overwrite(args.ofile):
+                from pifmod.atomicfile import AtomicFile
+                with AtomicFile(args.ofile) as ofs:
+                    jsonl(ifs, ofs)
+        finally:
+            if ifs is not sys.stdin:
+                ifs.close()
+        return
+    # read PIF and perform requested action
+    if package_workers(args.action):
+        rval = perform_package(read_data(args.ifile), args.action)
+    else:
+        pifdata = read_pif(args.ifile)
+        rval = perform(pifdata, args.action)
+    if rval is None:
+        return
     # write PIF
+    fmt = output_format(args.ofile)
     if args.ofile is not None:
         if authorize_overwrite(args.ofile):
-            with open(args.ofile, 'w') as ofs:
-                ofs.write(rval)
+            write_file(args.ofile, rval, fmt)
     else:
-        sys.stdout.write(rval)
+        write_result(sys.stdout, rval, fmt)
 #end 'def main ():'
 
 
+# either 1 or 2 arguments are required --> custom action
+# see 'http://stackoverflow.com/questions/4194948/python-argparse-is-there-a-way-to-specify-a-range-in-nargs'
+def required_length(nmin, nmax):
+    class RequiredLength(argparse.Action):
+        def __call__(self, parser, args, values, option_string=None):
+            if not nmin <= len(values) <= nmax:
+                msg = 'Option "{f}" requires between {nmin} ' \
+                      'and {nmax} arguments.'.format(
+                        f=self.dest, nmin=nmin, nmax=nmax
+                      )
+                raise argparse.ArgumentTypeError(msg)
+            setattr(args, self.dest, values)
+    return RequiredLength
+
+
+def add_action_parsers(subparsers):
+    """
+    Adds the subparsers for the actions that operate on a single PIF,
+    i.e. uid, property, apply and patch, to SUBPARSERS.
+    """
+    # modify or return the UID
+    uid_parser = subparsers.add_parser('uid',
+        help='Get/set the PIF UID.')
+    # uid_parser.add_argument('-f',
+    #     '--force',
+    #     default=False,
+    #     action='store_true',
+    #     help='Force set the UID. This will overwrite the current UID, ' \
+    #          'and is irreversible. The resulting file will no longer ' \
+    #          'associate with the original file.')
+    uid_parser.add_argument('arglist',
+        metavar='UID',
+        type=str,
+        nargs='*', # if there are no other positional parameters
+        #nargs=argparse.REMAINDER, # if there are
+        help='New UID. If no UID is provided, then the current UID is ' \
+             'is returned. If a UID is provided, and one already exists ' \
+             'then these two IDs are compared.')
+    # property
+    property_parser = subparsers.add_parser('property',
+        help='Gets/sets properties in the input PIF record.')
+    # property_parser.add_argument('-f',
+    #     '--force',
+    #     action='store_true',
+    #     help='Forcibly insert this property. If another matching ' \
+    #          'property exists with the same name, it will be overwritten.')
+    property_parser.add_argument('--list',
+        dest='list',
+        default=False,
+        action='store_true',
+        help='Lists the keys from the pif file and from the property ' \
+             'file (if provided) and exits.')
+    property_parser.add_argument('--units',
+        help='Specify the units associated with the property.')
+    property_parser.add_argument('--reduce',
+        metavar='REDUCTIONS',
+        default=None,
+        help='Comma-separated reductions, e.g. median,mean,p95,count,std, ' \
+             'of a vector or matrix property, from a source file or from ' \
+             'the PIF. Each is added as a scalar property named ' \
+             '"REDUCTION NAME" with the units of the original.')
+    property_parser.add_argument('--condition',
+        dest='conditions',
+        metavar='CONDITION',
+        action='append',
+        default=[],
+        help='Specify a condition under which the property was ' \
+             'determined. The format of each condition is ' \
+             'NAME=VALUE[=UNITS]. Multiple conditions may be specified. ')
+    property_parser.add_argument('--data-type',
+        dest='datatype',
+        help='Sets the type of data that makes up the property. ' \
+             'Recognized values are MACHINE_LEARNING, COMPUTATIONAL, or ' \
+             'EXPERIMENTAL.')
+    property_parser.add_argument('--contact',
+        dest='contacts',
+        metavar='CONTACT',
+        action='append',
+        default=[],
+        help='Person to contact, with optional email, for more ' \
+             'information about this property. Format of the argument ' \
+             'is "NAME[,EMAIL]", e.g. "Jane Smith" would not include ' \
+             'an email; "Jane Smith,jsmith@server.com" would. Multiple ' \
+             'contacts may be specified.')
+    property_parser.add_argument('--tag',
+        dest='tags',
+        metavar='TAG',
+        action='append',
+        default=[],
+        help='List of string tags to hold any relevant information not ' \
+             'appropriate for any other option. Multiple tags may be ' \
+             'specified.')
+    property_parser.add_argument('arglist',
+        metavar='PROPERTY',
+        type=str,
+        nargs='+', # if there are no other positional parameters
+        action=required_length(1,2),
+        help='Specify which property to get/set/modify. To get an ' \
+             'existing property, PROPERTY is the name of the property ' \
+             'to retrieve. To set a nonexistant property, the argument ' \
+             'would be PROPERTY=VALUE, or to overwrite a property that ' \
+             'already exists, use the force (-f) flag with entry ' \
+             'PROPERTY=VALUE. Finally, if two arguments are given, e.g. ' \
+             'property FILE PROP, then PROP is extracted from FILE and ' \
+             'added to the output. As before, a property that already ' \
+             'exists will only be overwritten if the force (-f) flag is ' \
+             'specified.')
+    # apply
+    apply_parser = subparsers.add_parser('apply',
+        help='Applies several property/uid edits in a single pass.')
+    apply_parser.add_argument('edits',
+        metavar='EDITS',
+        nargs='?',
+        default=None,
+        help='JSON-formatted file holding a list of edits. See ' \
+             'pifmod.main.apply for the format.')
+    apply_parser.add_argument('--set',
+        dest='sets',
+        metavar='NAME=VALUE',
+        action='append',
+        default=[],
+        help='Set property NAME to VALUE, as "property NAME=VALUE". ' \
+             'Multiple properties may be set. These are applied after ' \
+             'the edits in EDITS.')
+    # patch
+    patch_parser = subparsers.add_parser('patch',
+        help='Applies a JSON Patch, as written by diff, to the PIF.')
+    patch_parser.add_argument('patch',
+        metavar='PATCH',
+        help='JSON-formatted file holding the patch. See pifmod.patch ' \
+             'for the format.')
+    return subparsers
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+            #prog='HELLOWORLD', # default: sys.argv[0], uncomment to customize
+            description=textwrap.dedent(__doc__),
+            epilog=textwrap.dedent("""\
+                EXIT STATUS
+
+                    0 on success
+
+                AUTHOR
+
+                    Branden Kappes <bkappes@mines.edu>
+
+                LICENSE
+
+                    This script is in the public domain, free from copyrights
+                    or restrictions.
+                    """))
+    # positional parameters
+    # parser.add_argument('arglist',
+    #     metavar='file',
+    #     type=str,
+    #     nargs='*', # if there are no other positional parameters
+    #     #nargs=argparse.REMAINDER, # if there are
+    #     help='Files to process.')
+    # optional parameters
+    parser.add_argument('-i',
+        '--input',
+        dest='ifile',
+        default=None,
+        help='Specify an input filename.')
+    parser.add_argument('-f',
+        '--force',
+        default=False,
+        action='store_true',
+        help='Do not prompt before overwriting files, properties, etc.')
+    parser.add_argument('-o',
+        '--output',
+        dest='ofile',
+        default=None,
+        help='Specify an output filename.')
+    parser.add_argument('--format',
+        choices=('json', 'gz', 'bz2', 'npz'),
+        default=None,
+        help='Format in which PIF records are written: JSON, gzip- or ' \
+             'bzip2-compressed JSON, or npz (JSON with vectors and ' \
+             'matrices stored as binary arrays). Default: from the ' \
+             'extension of the output file (.gz, .bz2, .npz), otherwise ' \
+             'json. The format of the input is detected when it is read.')
+    parser.add_argument('--select',
+        metavar='SELECTION',
+        action='append',
+        default=[],
+        help='Apply the action only to the records of a package that ' \
+             'match SELECTION, a comma-separated list of uid=UID, ' \
+             'property:NAME[=VALUE] and preparation detail NAME=VALUE ' \
+             'terms, e.g. "plate number=2,build=1". A record must match ' \
+             'every term. If --select is given more than once, records ' \
+             'matching any of the selections are used. Records that are ' \
+             'not selected are written unchanged.')
+    parser.add_argument('--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes among which the records of a ' \
+             'package are divided by the property, uid and apply actions, ' \
+             'and by patch with --select, when writing JSON. 0 uses one ' \
+             'process per CPU. Default: %(default)s.')
+    parser.add_argument('--jsonl',
+        default=False,
+        action='store_true',
+        help='Read and write JSON Lines, i.e. one PIF record per line. ' \
+             'Records are processed one at a time.')
+    parser.add_argument('-v',
+        '--verbose',
+        action='count',
+        default=0,
+        help='Write the time spent reading, parsing, fetching, acting, ' \
+             'serializing and writing, and the bytes handled by each, ' \
+             'to stderr as a JSON record.')
+    parser.add_argument('--timings',
+        metavar='FILE',
+        default=None,
+        help='Append the timings written by -v to FILE, one JSON record ' \
+             'per run. Use "-" for stderr.')
+    parser.add_argument('--no-source-cache',
+        dest='no_source_cache',
+        default=False,
+        action='store_true',
+        help='Neither read nor store properties parsed from source files ' \
+             'in the on-disk cache ($PIFMOD_SOURCE_CACHE_DIR, default ' \
+             '~/.cache/pifmod/sources).')
+    parser.add_argument('--profile',
+        metavar='FILE',
+        default=None,
+        help='Profile the run and write the cProfile statistics to FILE ' \
+             '(see pstats).')
+    parser.add_argument('--version',
+        action='version',
+        version='%(prog)s 0.1')
+    # add subparsers
+    subparsers = parser.add_subparsers(dest='action')
+    add_action_parsers(subparsers)
+    # sagittariidae reference
+    sagittariidae_parser = subparsers.add_parser('sagittariidae',
+        help='Adds sagittariidae links to the PIF record.')
+    sagittariidae_parser.add_argument('--project',
+        dest='projects',
+        metavar='PROJECT[@HOST]',
+        action='append',
+        default=[],
+        help='Sagittariidae project whose samples are linked. A host ' \
+             'may be given after "@"; otherwise --host is used. Multiple ' \
+             'projects may be specified. Default: nq3X4-concept-inconel718.')
+    sagittariidae_parser.add_argument('--host',
+        default='http://sagittariidae.adapt.mines.edu',
+        help='Sagittariidae server for projects without an explicit host. ' \
+             'Default: %(default)s.')
+    sagittariidae_parser.add_argument('-j',
+        '--jobs',
+        type=int,
+        default=4,
+        help='Maximum number of sample lists, or with --enrich samples, ' \
+             'fetched at once. Default: %(default)s.')
+    sagittariidae_parser.add_argument('--refresh',
+        default=False,
+        action='store_true',
+        help='Ask the server whether cached sample lists have changed, ' \
+             'even if they are younger than $PIFMOD_CACHE_TTL seconds.')
+    sagittariidae_parser.add_argument('--snapshot',
+        metavar='FILE',
+        default=None,
+        help='Save the samples of the projects to FILE, for use with ' \
+             '--catalog, and exit. No PIF is read.')
+    sagittariidae_parser.add_argument('--catalog',
+        metavar='FILE',
+        default=None,
+        help='Link against the samples saved in FILE by --snapshot ' \
+             'rather than fetching them from the server. Only the ' \
+             'projects given with --project are used, or all of those ' \
+             'in FILE if there are none. A warning is written if FILE is ' \
+             'older than $PIFMOD_SNAPSHOT_MAX_AGE seconds (default: ' \
+             'one week).')
+    sagittariidae_parser.add_argument('--enrich',
+        metavar='FIELD[=PROPERTY]',
+        action='append',
+        default=[],
+        help='Fetch the sample of each linked record and add its FIELD ' \
+             'to the record as the property PROPERTY (default: FIELD). ' \
+             'Existing properties are replaced only with -f. Multiple ' \
+             'fields may be specified.')
+    sagittariidae_parser.add_argument('--rate',
+        type=float,
+        default=None,
+        help='Maximum number of sample requests per second with ' \
+             '--enrich. Default: no limit.')
+    sagittariidae_parser.add_argument('--retries',
+        type=int,
+        default=None,
+        help='Number of times a failed sample request is retried, ' \
+             'waiting longer after each attempt. Default: 3.')
+    # diff
+    diff_parser = subparsers.add_parser('diff',
+        help='Writes the JSON Patch that turns one PIF into another.')
+    diff_parser.add_argument('old',
+        metavar='OLD',
+        help='Original PIF ("-" for stdin).')
+    diff_parser.add_argument('new',
+        metavar='NEW',
+        help='Modified PIF ("-" for stdin).')
+    # serve
+    serve_parser = subparsers.add_parser('serve',
+        help='Runs a daemon that keeps pifmod loaded between commands.')
+    serve_parser.add_argument('--socket',
+        default=client.SOCKET,
+        help='Unix socket on which to listen. Default: %(default)s ' \
+             '(or $PIFMOD_SOCKET).')
+    # batch
+    batch_parser = subparsers.add_parser('batch',
+        help='Applies a uid/property/apply/patch action to many PIF files.')
+    batch_parser.add_argument('--inputs',
+        metavar='GLOB',
+        action='append',
+        required=True,
+        help='Input files to process. Shell-style wildcards should be ' \
+             'quoted so they are expanded by pifmod rather than the shell. ' \
+             'Multiple inputs may be specified.')
+    batch_parser.add_argument('--outdir',
+        required=True,
+        help='Directory into which the modified files are written. Each ' \
+             'output file has the same name as its input file.')
+    batch_parser.add_argument('-j',
+        '--jobs',
+        type=int,
+        default=0,
+        help='Number of worker processes. The default (0) uses one ' \
+             'process per CPU.')
+    add_action_parsers(batch_parser.add_subparsers(dest='batch_action'))
+    # store
+    store_parser = subparsers.add_parser('store',
+        help='Keeps PIF records in a local SQLite database.')
+    store_parser.add_argument('--db',
+        default=os.environ.get('PIFMOD_STORE', 'pifmod.db'),
+        help='Database file. Default: %(default)s ($PIFMOD_STORE).')
+    store_parser.add_argument('--record',
+        dest='records',
+        metavar='UID',
+        action='append',
+        default=[],
+        help='Act on, or export, the stored record with this UID. ' \
+             'Multiple records may be specified; with --select, records ' \
+             'that are named or selected are used. Default: every record.')
+    store_subparsers = store_parser.add_subparsers(dest='store_action')
+    add_action_parsers(store_subparsers)
+    ingest_parser = store_subparsers.add_parser('ingest',
+        help='Adds the records of PIF files to the store.')
+    ingest_parser.add_argument('inputs',
+        metavar='GLOB',
+        nargs='+',
+        help='Files to add. Shell-style wildcards should be quoted so ' \
+             'they are expanded by pifmod rather than the shell.')
+    store_subparsers.add_parser('export',
+        help='Writes the stored records as a PIF package.')
+    return parser
+
+
 if __name__ == '__main__':
     try:
-        start_time = time.time()
-        parser = argparse.ArgumentParser(
-                #prog='HELLOWORLD', # default: sys.argv[0], uncomment to customize
-                description=textwrap.dedent(globals()['__doc__']),
-                epilog=textwrap.dedent("""\
-                    EXIT STATUS
-
-                        0 on success
-
-                    AUTHOR
-
-                        Branden Kappes <bkappes@mines.edu>
-
-                    LICENSE
-
-                        This script is in the public domain, free from copyrights
-                        or restrictions.
-                        """))
-        # positional parameters
-        # parser.add_argument('arglist',
-        #     metavar='file',
-        #     type=str,
-        #     nargs='*', # if there are no other positional parameters
-        #     #nargs=argparse.REMAINDER, # if there are
-        #     help='Files to process.')
-        # optional parameters
-        parser.add_argument('-i',
-            '--input',
-            dest='ifile',
-            default=None,
-            help='Specify an input filename.')
-        parser.add_argument('-f',
-            '--force',
-            default=False,
-            action='store_true',
-            help='Do not prompt before overwriting files, properties, etc.')
-        parser.add_argument('-o',
-            '--output',
-            dest='ofile',
-            default=None,
-            help='Specify an output filename.')
-        parser.add_argument('-v',
-            '--verbose',
-            action='count',
-            default=0,
-            help='Verbose output')
-        parser.add_argument('--version',
-            action='version',
-            version='%(prog)s 0.1')
-        # add subparsers
-        subparsers = parser.add_subparsers(dest='action')
-        # modify or return the UID
-        uid_parser = subparsers.add_parser('uid',
-            help='Get/set the PIF UID.')
-        # uid_parser.add_argument('-f',
-        #     '--force',
-        #     default=False,
-        #     action='store_true',
-        #     help='Force set the UID. This will overwrite the current UID, ' \
-        #          'and is irreversible. The resulting file will no longer ' \
-        #          'associate with the original file.')
-        uid_parser.add_argument('arglist',
-            metavar='UID',
-            type=str,
-            nargs='*', # if there are no other positional parameters
-            #nargs=argparse.REMAINDER, # if there are
-            help='New UID. If no UID is provided, then the current UID is ' \
-                 'is returned. If a UID is provided, and one already exists ' \
-                 'then these two IDs are compared.')
-        # property
-        property_parser = subparsers.add_parser('property',
-            help='Gets/sets properties in the input PIF record.')
-        # property_parser.add_argument('-f',
-        #     '--force',
-        #     action='store_true',
-        #     help='Forcibly insert this property. If another matching ' \
-        #          'property exists with the same name, it will be overwritten.')
-        property_parser.add_argument('--list',
-            dest='list',
-            default=False,
-            action='store_true',
-            help='Lists the keys from the pif file and from the property ' \
-                 'file (if provided) and exits.')
-        property_parser.add_argument('--units',
-            help='Specify the units associated with the property.')
-        property_parser.add_argument('--condition',
-            dest='conditions',
-            metavar='CONDITION',
-            action='append',
-            default=[],
-            help='Specify a condition under which the property was ' \
-                 'determined. The format of each condition is ' \
-                 'NAME=VALUE[=UNITS]. Multiple conditions may be specified. ')
-        property_parser.add_argument('--data-type',
-            dest='datatype',
-            help='Sets the type of data that makes up the property. ' \
-                 'Recognized values are MACHINE_LEARNING, COMPUTATIONAL, or ' \
-                 'EXPERIMENTAL.')
-        property_parser.add_argument('--contact',
-            dest='contacts',
-            metavar='CONTACT',
-            action='append',
-            default=[],
-            help='Person to contact, with optional email, for more ' \
-                 'information about this property. Format of the argument ' \
-                 'is "NAME[,EMAIL]", e.g. "Jane Smith" would not include ' \
-                 'an email; "Jane Smith,jsmith@server.com" would. Multiple ' \
-                 'contacts may be specified.')
-        property_parser.add_argument('--tag',
-            dest='tags',
-            metavar='TAG',
-            action='append',
-            default=[],
-            help='List of string tags to hold any relevant information not ' \
-                 'appropriate for any other option. Multiple tags may be ' \
-                 'specified.')
-        # either 1 or 2 arguments are required --> custom action
-        # see 'http://stackoverflow.com/questions/4194948/python-argparse-is-there-a-way-to-specify-a-range-in-nargs'
-        def required_length(nmin, nmax):
-            class RequiredLength(argparse.Action):
-                def __call__(self, parser, args, values, option_string=None):
-                    if not nmin <= len(values) <= nmax:
-                        msg = 'Option "{f}" requires between {nmin} ' \
-                              'and {nmax} arguments.'.format(
-                                f=self.dest, nmin=nmin, nmax=nmax
-                              )
-                        raise argparse.ArgumentTypeError(msg)
-                    setattr(args, self.dest, values)
-            return RequiredLength
-        property_parser.add_argument('arglist',
-            metavar='PROPERTY',
-            type=str,
-            nargs='+', # if there are no other positional parameters
-            action=required_length(1,2),
-            help='Specify which property to get/set/modify. To get an ' \
-                 'existing property, PROPERTY is the name of the property ' \
-                 'to retrieve. To set a nonexistant property, the argument ' \
-                 'would be PROPERTY=VALUE, or to overwrite a property that ' \
-                 'already exists, use the force (-f) flag with entry ' \
-                 'PROPERTY=VALUE. Finally, if two arguments are given, e.g. ' \
-                 'property FILE PROP, then PROP is extracted from FILE and ' \
-                 'added to the output. As before, a property that already ' \
-                 'exists will only be overwritten if the force (-f) flag is ' \
-                 'specified.')
-        # sagittariidae reference
-        sagittariidae_parser = subparsers.add_parser('sagittariidae',
-            help='Adds sagittariidae links to the PIF record.')
-        #
+        timing.reset()
+        # hand the command to a running daemon, if there is one
+        status = client.run(sys.argv[1:])
+        if status is not None:
+            sys.exit(status)
+        parser = build_parser()
         args = parser.parse_args()
         # check for correct number of positional parameters
         #if len(args.filelist) < 1:
             #parser.error('missing argument')
         # timing
-        if args.verbose > 0: print time.asctime()
-        main()
-        if args.verbose > 0: print time.asctime()
-        if args.verbose:
-            delta_time = time.time() - start_time
-            hh = int(delta_time/3600.); delta_time -= float(hh)*3600.
-            mm = int(delta_time/60.); delta_time -= float(mm)*60.
-            ss = delta_time
-            print 'TOTAL TIME: {0:02d}:{1:02d}:{2:06.3f}'.format(hh,mm,ss)
+        if args.profile is not None:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            main()
+        finally:
+            if args.profile is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+            if args.verbose or args.timings is not None:
+                record = timings_record()
+                if args.verbose:
+                    write_timings(record)
+                if args.timings is not None:
+                    write_timings(record, args.timings)
         sys.exit(0)
     except KeyboardInterrupt, e: # Ctrl-C
         raise e
@@ -0,0 +1,347 @@
+"""
+Structural differences between PIFs as JSON Patches (RFC 6902).
+
+A patch is a list of operations on the JSON tree of a PIF (a record or
+a list of records), e.g.
+
+    [{"op": "replace", "path": "/properties/name=volume/units",
+      "value": "mm^3"},
+     {"op": "add", "path": "/properties/3", "value": {"name": "mass",
+      "scalars": 2.5}},
+     {"op": "remove", "path": "/uid"}]
+
+Paths are JSON Pointers (RFC 6901) with one extension: an element of a
+list of named objects (properties, details, conditions, ...) or of
+records is addressed by "name=NAME" or "uid=UID" rather than by its
+position, so a patch does not depend on the order of the list and
+touches only the elements that changed. Positions, "-" (end of the
+list) and the operations add, remove, replace, move, copy and test are
+as in RFC 6902.
+
+    ops = diff(a, b)          # a, b: PIF trees (dicts/lists)
+    apply_patch(a, ops)       # a is now equal to b
+"""
+
+import copy
+import re
+
+# fields, in order of preference, by which list elements are matched
+MATCH_KEYS = ('uid', 'name')
+
+_index = re.compile(r'^(0|[1-9][0-9]*)$')
+
+
+class PatchError(ValueError):
+    def __init__(self, *args, **kwds):
+        super(PatchError, self).__init__(*args, **kwds)
+#end 'class PatchError(ValueError):'
+
+
+# JSON Pointers
+def escape(segment):
+    return segment.replace('~', '~0').replace('/', '~1')
+
+
+def unescape(segment):
+    return segment.replace('~1', '/').replace('~0', '~')
+
+
+def split_path(path):
+    """
+    Splits the JSON Pointer PATH into its (unescaped) segments.
+    """
+    if path == '':
+        return []
+    if not path.startswith('/'):
+        raise PatchError(u'Path "{}" does not start with "/".'.format(path))
+    return [unescape(s) for s in path[1:].split('/')]
+
+
+def _join(path, segment):
+    return '{}/{}'.format(path, escape(u'{}'.format(segment)))
+
+
+# diff
+def _same(a, b):
+    """
+    True if the JSON values A and B are equal, including their types
+    (1 and 1.0 differ).
+    """
+    if isinstance(a, basestring) and isinstance(b, basestring):
+        return a == b
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return len(a) == len(b) and \
+            all(k in b and _same(v, b[k]) for k,v in iter(a.items()))
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_same(x, y) for x,y in zip(a, b))
+    return a == b
+
+
+def _plain(values):
+    """
+    True if VALUES holds no objects or lists, e.g. a vector.
+    """
+    return not any(isinstance(v, (dict, list)) for v in values)
+
+
+def match_key(*lists):
+    """
+    Returns the field in MATCH_KEYS that identifies every element of
+    LISTS, i.e. that every element has as a string unique within its
+    list, or None.
+    """
+    if not all(isinstance(v, dict) for values in lists for v in values):
+        return None
+    for key in MATCH_KEYS:
+        ok = True
+        for values in lists:
+            names = [v.get(key) if isinstance(v, dict) else None
+                     for v in values]
+            if not all(isinstance(n, basestring) for n in names) or \
+               len(set(names)) != len(names):
+                ok = False
+                break
+        if ok and any(lists):
+            return key
+    return None
+
+
+def _diff(a, b, path, ops):
+    if _same(a, b):
+        return
+    if isinstance(a, dict) and isinstance(b, dict):
+        _diff_dicts(a, b, path, ops)
+    elif isinstance(a, list) and isinstance(b, list):
+        key = match_key(a, b)
+        sub = []
+        if key is not None:
+            done = _diff_named(a, b, key, path, sub)
+        elif _plain(a) and _plain(b):
+            _diff_positional(a, b, path, sub)
+            # replacing a vector is simpler than changing most of it
+            done = len(sub) <= max(1, len(b)//2)
+        else:
+            _diff_positional(a, b, path, sub)
+            done = True
+        if done:
+            ops.extend(sub)
+        else:
+            ops.append({'op' : 'replace', 'path' : path, 'value' : b})
+    else:
+        ops.append({'op' : 'replace', 'path' : path, 'value' : b})
+
+
+def _diff_dicts(a, b, path, ops):
+    for k in a:
+        if k not in b:
+            ops.append({'op' : 'remove', 'path' : _join(path, k)})
+    for k,v in iter(b.items()):
+        if k not in a:
+            ops.append({'op' : 'add', 'path' : _join(path, k), 'value' : v})
+        else:
+            _diff(a[k], v, _join(path, k), ops)
+
+
+def _diff_named(a, b, key, path, ops):
+    """
+    Diffs lists whose elements are identified by KEY. Returns False,
+    and the list should be replaced, if the common elements are in a
+    different order.
+    """
+    bnames = set(v[key] for v in b)
+    anames = set(v[key] for v in a)
+    common = [v[key] for v in a if v[key] in bnames]
+    if common != [v[key] for v in b if v[key] in anames]:
+        return False
+    for v in a:
+        if v[key] not in bnames:
+            ops.append({'op' : 'remove',
+                        'path' : _join(path, u'{}={}'.format(key, v[key]))})
+    aitems = dict((v[key], v) for v in a)
+    for i,v in enumerate(b):
+        if v[key] in aitems:
+            _diff(aitems[v[key]], v, _join(path, u'{}={}'.format(key, v[key])),
+                  ops)
+        else:
+            # with the common elements in order, inserting at the final
+            # positions in increasing order reproduces B
+            ops.append({'op' : 'add', 'path' : _join(path, i), 'value' : v})
+    return True
+
+
+def _diff_positional(a, b, path, ops):
+    n = min(len(a), len(b))
+    for i in range(n):
+        _diff(a[i], b[i], _join(path, i), ops)
+    for i in range(len(a) - 1, n - 1, -1):
+        ops.append({'op' : 'remove', 'path' : _join(path, i)})
+    for i in range(n, len(b)):
+        ops.append({'op' : 'add', 'path' : _join(path, '-'), 'value' : b[i]})
+
+
+def diff(a, b):
+    """
+    Returns the JSON Patch, a list of operations, that turns A into B.
+
+    Parameters
+    ----------
+    :a, dict or list: PIF tree, e.g. from PIF.as_dictionary().
+    :b, dict or list: PIF tree.
+    """
+    ops = []
+    _diff(a, b, '', ops)
+    return ops
+
+
+# patch
+class _Document(object):
+    """
+    JSON tree to which operations are applied. The positions of the
+    elements of matched lists are indexed, so that resolving a path
+    does not search the list.
+    """
+    def __init__(self, root):
+        self.root = root
+        # id(list) --> (list, field, {value: position})
+        self._positions = {}
+
+    def _position(self, values, segment, path):
+        field, sep, name = segment.partition('=')
+        if field not in MATCH_KEYS or not sep:
+            raise PatchError(u'Invalid list position "{}" in {}.'.format(
+                segment, path))
+        cached = self._positions.get(id(values))
+        if cached is None or cached[1] != field:
+            positions = {}
+            for i,v in enumerate(values):
+                if isinstance(v, dict):
+                    positions.setdefault(v.get(field), i)
+            # the list is kept so that its id is not reused
+            cached = self._positions[id(values)] = (values, field, positions)
+        if name not in cached[2]:
+            raise PatchError(u'No element with {} "{}" in {}.'.format(
+                field, name, path))
+        return cached[2][name]
+
+    def _changed(self, values):
+        self._positions.pop(id(values), None)
+
+    def child(self, parent, segment, path, adding=False):
+        """
+        Returns the key or position of SEGMENT in PARENT. For ADDING to
+        a list, the position may be the end of the list.
+        """
+        if isinstance(parent, dict):
+            if not adding and segment not in parent:
+                raise PatchError(u'{} does not exist.'.format(path))
+            return segment
+        if not isinstance(parent, list):
+            raise PatchError(u'{} is not within an object or list.'.format(
+                path))
+        if segment == '-' and adding:
+            return len(parent)
+        if _index.match(segment):
+            i = int(segment)
+            if i > len(parent) or (i == len(parent) and not adding):
+                raise PatchError(u'{} is out of range.'.format(path))
+            return i
+        return self._position(parent, segment, path)
+
+    def resolve(self, path):
+        """
+        Returns (parent, last segment) of PATH.
+        """
+        segments = split_path(path)
+        if not segments:
+            return (None, None)
+        node = self.root
+        for segment in segments[:-1]:
+            node = node[self.child(node, segment, path)]
+        return (node, segments[-1])
+
+    def get(self, path):
+        parent, segment = self.resolve(path)
+        if parent is None:
+            return self.root
+        return parent[self.child(parent, segment, path)]
+
+    def add(self, path, value):
+        parent, segment = self.resolve(path)
+        if parent is None:
+            self.root = value
+            self._positions.clear()
+            return
+        k = self.child(parent, segment, path, adding=True)
+        if isinstance(parent, list):
+            parent.insert(k, value)
+            self._changed(parent)
+        else:
+            parent[k] = value
+
+    def remove(self, path):
+        parent, segment = self.resolve(path)
+        if parent is None:
+            raise PatchError(u'The whole document cannot be removed.')
+        k = self.child(parent, segment, path)
+        value = parent.pop(k)
+        if isinstance(parent, list):
+            self._changed(parent)
+        return value
+
+    def replace(self, path, value):
+        parent, segment = self.resolve(path)
+        if parent is None:
+            self.root = value
+            self._positions.clear()
+            return
+        k = self.child(parent, segment, path)
+        parent[k] = value
+        if isinstance(parent, list):
+            self._changed(parent)
+#end 'class _Document(object):'
+
+
+def apply_patch(doc, ops):
+    """
+    Applies the JSON Patch OPS to the PIF tree DOC. DOC is modified in
+    place when possible.
+
+    Returns
+    -------
+    The patched tree.
+
+    Raises
+    ------
+    PatchError if an operation is malformed, refers to a missing
+    location or, for "test", does not match.
+    """
+    if not isinstance(ops, list):
+        raise PatchError(u'A patch must be a list of operations.')
+    document = _Document(doc)
+    for i,op in enumerate(ops):
+        try:
+            name, path = op['op'], op['path']
+            if name == 'add':
+                document.add(path, copy.deepcopy(op['value']))
+            elif name == 'remove':
+                document.remove(path)
+            elif name == 'replace':
+                document.replace(path, copy.deepcopy(op['value']))
+            elif name == 'move':
+                value = document.remove(op['from'])
+                document.add(path, value)
+            elif name == 'copy':
+                document.add(path, copy.deepcopy(document.get(op['from'])))
+            elif name == 'test':
+                if not _same(document.get(path), op['value']):
+                    raise PatchError(u'Test of {} failed.'.format(path))
+            else:
+                raise PatchError(u'Unrecognized op "{}".'.format(name))
+        except (KeyError, TypeError), e:
+            raise PatchError(u'Operation {}: missing or invalid {}.'.format(
+                i+1, e))
+        except PatchError, e:
+            raise PatchError(u'Operation {}: {}'.format(i+1, e.args[0]))
+    return document.root
@@ -0,0 +1,107 @@
+"""
+Name-indexed access to the properties of a PIF record.
+"""
+
+
+def fold(name):
+    """
+    Returns the case-folded form of a property name used for lookups.
+    """
+    return name.lower() if name is not None else None
+
+
+class PropertyIndex(object):
+    """
+    Indexed view of a list of properties, e.g. pifdata.properties.
+
+    Properties are looked up by case-folded name in constant time. The
+    list is modified in place through add, replace and remove, which
+    keep the index consistent. As with a linear search, a lookup returns
+    the first property with a matching name; names that occur more than
+    once are collected in `duplicates`.
+    """
+    def __init__(self, plist):
+        self.plist = plist
+        self.reindex()
+
+    def reindex(self, start=0):
+        """
+        Rebuilds the index from position START of the list onward.
+        """
+        if start == 0:
+            self._index = {}
+            self.duplicates = set()
+        else:
+            self._index = dict((k, i) for k,i in iter(self._index.items())
+                               if i < start)
+        for i,prop in enumerate(self.plist[start:], start):
+            key = fold(prop.name)
+            if key in self._index:
+                self.duplicates.add(key)
+            else:
+                self._index[key] = i
+
+    def __len__(self):
+        return len(self.plist)
+
+    def __iter__(self):
+        return iter(self.plist)
+
+    def __contains__(self, name):
+        return fold(name) in self._index
+
+    def position(self, name):
+        """
+        Returns the position of the property named NAME, or None.
+        """
+        return self._index.get(fold(name))
+
+    def get(self, name):
+        """
+        Returns the property named NAME (case insensitive), or None.
+        """
+        i = self.position(name)
+        return None if i is None else self.plist[i]
+
+    def names(self):
+        return [prop.name for prop in self.plist]
+
+    def add(self, prop):
+        """
+        Appends PROP. If a property with the same name already exists,
+        the new property is recorded as a duplicate.
+        """
+        key = fold(prop.name)
+        if key in self._index:
+            self.duplicates.add(key)
+        else:
+            self._index[key] = len(self.plist)
+        self.plist.append(prop)
+
+    def replace(self, prop):
+        """
+        Replaces the property with the same name as PROP, or appends
+        PROP if there is none.
+        """
+        i = self.position(prop.name)
+        if i is None:
+            self.add(prop)
+        else:
+            self.plist[i] = prop
+
+    def remove(self, name):
+        """
+        Removes and returns the (first) property named NAME, or None.
+        """
+        i = self.position(name)
+        if i is None:
+            return None
+        prop = self.plist.pop(i)
+        key = fold(name)
+        if key in self.duplicates:
+            # the next property with this name takes its place
+            self.reindex()
+        else:
+            del self._index[key]
+            self.reindex(i)
+        return prop
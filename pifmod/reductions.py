@@ -0,0 +1,115 @@
+"""
+Reductions of vector and matrix property values to scalars.
+
+A reduction is named by one of
+
+    count, sum, mean, std, min, max, median, pNN
+
+where pNN is the NN-th percentile (0 <= NN <= 100, e.g. p95 or p99.9)
+and std is the population standard deviation. Matrices are reduced
+over all of their elements. The values are converted to a NumPy array
+once, and all percentiles, including the median, are found with a
+single call to numpy.percentile.
+"""
+
+import re
+import numpy as np
+
+_simple = ('count', 'sum', 'mean', 'std', 'min', 'max')
+_percentileRE = re.compile(r'^p(\d+(\.\d*)?)$')
+
+
+def percentile(reduction):
+    """
+    Returns the percentile computed by REDUCTION, e.g. 95. for p95 and
+    50. for median, or None if REDUCTION is not a percentile.
+    """
+    if reduction == 'median':
+        return 50.
+    m = _percentileRE.match(reduction)
+    return None if m is None else float(m.group(1))
+
+
+def parse_reductions(spec):
+    """
+    Splits the comma-separated SPEC, e.g. "median,mean,p95", into a list
+    of reductions.
+
+    Raises
+    ------
+    ValueError if a reduction is not recognized.
+    """
+    reductions = [r.strip().lower() for r in spec.split(',') if r.strip()]
+    if not reductions:
+        raise ValueError('No reductions were given.')
+    for r in reductions:
+        if r in _simple:
+            continue
+        q = percentile(r)
+        if q is None or not 0 <= q <= 100:
+            raise ValueError('Unrecognized reduction "{}". Use {}, median ' \
+                             'or pNN (0 <= NN <= 100).'.format(
+                                 r, ', '.join(_simple)))
+    return reductions
+
+
+def _unwrap(values):
+    """
+    Replaces the Scalars in VALUES, a (nested) list, with their values,
+    whether they are Scalar objects or dictionaries as read from JSON,
+    e.g. {"value": 1.5, "units": "mm"}.
+    """
+    if isinstance(values, list):
+        return [_unwrap(v) for v in values]
+    if isinstance(values, dict) and 'value' in values:
+        return values['value']
+    return getattr(values, 'value', values)
+
+
+def reduce_values(values, reductions):
+    """
+    Computes REDUCTIONS of VALUES, a (nested) list or NumPy array of
+    numbers or Scalars.
+
+    Returns
+    -------
+    List of (reduction, value) pairs in the order of REDUCTIONS. Values
+    are Python ints/floats.
+
+    Raises
+    ------
+    ValueError if VALUES are not numeric, or are empty and a reduction
+    other than count is requested.
+    """
+    if isinstance(values, list):
+        values = _unwrap(values)
+    array = np.asarray(values)
+    if array.dtype.kind not in 'iuf':
+        if array.size:
+            raise ValueError('Only numeric values can be reduced.')
+        array = array.astype(float)
+    array = array.ravel()
+    if array.size == 0 and any(r != 'count' for r in reductions):
+        raise ValueError('Cannot reduce an empty list of values.')
+    # all percentiles at once, sorting the data only once
+    qs = sorted(set(q for q in (percentile(r) for r in reductions)
+                    if q is not None))
+    pvals = dict(zip(qs, np.percentile(array, qs))) if qs else {}
+    results = []
+    for r in reductions:
+        if r == 'count':
+            val = array.size
+        elif r == 'sum':
+            val = array.sum()
+        elif r == 'mean':
+            val = array.mean()
+        elif r == 'std':
+            val = array.std()
+        elif r == 'min':
+            val = array.min()
+        elif r == 'max':
+            val = array.max()
+        else:
+            val = pvals[percentile(r)]
+        results.append((r, val.item() if hasattr(val, 'item') else val))
+    return results
@@ -0,0 +1,172 @@
+"""
+Incremental access to the top-level keys of a JSON object on disk.
+
+Property source files, e.g. pore distributions, are JSON objects whose
+values may be very long columns. Rather than decoding the whole file,
+the file is memory-mapped and scanned: values are skipped by matching
+brackets and quotes (with regular expressions, so that long runs of
+numbers are passed over in C), and only the value that is asked for is
+decoded. Finding a key therefore reads only the part of the file up to
+and including its value, and memory use does not grow with the size of
+the file.
+
+Unlike json.load, which keeps the last of several values with the same
+key, the first occurrence of a key is found.
+"""
+
+import json
+import mmap
+import re
+from contextlib import contextmanager
+from pifmod.properties import fold
+
+_whitespace = re.compile(r'[ \t\n\r]*')
+# characters that open or close a container or a string
+_structural = re.compile(r'[\[\]{}"]')
+# characters that end, or escape a character within, a string
+_string_special = re.compile(r'["\\]')
+# end of a number, true, false or null
+_scalar_end = re.compile(r'[,}\] \t\n\r]')
+
+
+class ScanError(ValueError):
+    def __init__(self, *args, **kwds):
+        super(ScanError, self).__init__(*args, **kwds)
+#end 'class ScanError(ValueError):'
+
+
+@contextmanager
+def mapped(filename):
+    """
+    Context manager that memory-maps FILENAME for reading.
+    """
+    with open(filename, 'rb') as ifs:
+        try:
+            buf = mmap.mmap(ifs.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            raise ScanError('{} is empty.'.format(filename))
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+
+def _skip_whitespace(buf, pos):
+    return _whitespace.match(buf, pos).end()
+
+
+def _expect(buf, pos, chars):
+    if pos >= len(buf) or buf[pos] not in chars:
+        found = buf[pos] if pos < len(buf) else 'end of file'
+        raise ScanError('Expected {} at byte {}, found {}.'.format(
+            ' or '.join(repr(c) for c in chars), pos, repr(found)))
+
+
+def _end_of_string(buf, pos):
+    """
+    Returns the position after the string that starts at POS.
+    """
+    pos += 1
+    while True:
+        m = _string_special.search(buf, pos)
+        if m is None:
+            raise ScanError('Unterminated string.')
+        if m.group() == '"':
+            return m.end()
+        # skip the escaped character
+        pos = m.end() + 1
+
+
+def _end_of_value(buf, pos):
+    """
+    Returns the position after the JSON value that starts at POS.
+    """
+    c = buf[pos:pos+1]
+    if c == '"':
+        return _end_of_string(buf, pos)
+    if c not in ('[', '{'):
+        m = _scalar_end.search(buf, pos)
+        return len(buf) if m is None else m.start()
+    depth = 0
+    while True:
+        m = _structural.search(buf, pos)
+        if m is None:
+            raise ScanError('Unterminated array or object.')
+        c = m.group()
+        if c == '"':
+            pos = _end_of_string(buf, m.start())
+            continue
+        pos = m.end()
+        depth += 1 if c in '[{' else -1
+        if depth == 0:
+            return pos
+
+
+def iter_items(buf):
+    """
+    Iterates over the top-level members of the JSON object in BUF
+    without decoding their values.
+
+    Yields
+    ------
+    (key, start of the value, end of the value)
+    """
+    pos = _skip_whitespace(buf, 0)
+    _expect(buf, pos, '{')
+    pos = _skip_whitespace(buf, pos + 1)
+    if buf[pos:pos+1] == '}':
+        return
+    while True:
+        _expect(buf, pos, '"')
+        end = _end_of_string(buf, pos)
+        key = json.loads(buf[pos:end])
+        pos = _skip_whitespace(buf, end)
+        _expect(buf, pos, ':')
+        start = _skip_whitespace(buf, pos + 1)
+        end = _end_of_value(buf, start)
+        yield (key, start, end)
+        pos = _skip_whitespace(buf, end)
+        _expect(buf, pos, ',}')
+        if buf[pos] == '}':
+            return
+        pos = _skip_whitespace(buf, pos + 1)
+
+
+def keys(filename):
+    """
+    Returns the top-level keys of the JSON object in FILENAME, in the
+    order in which they appear.
+    """
+    with mapped(filename) as buf:
+        return [key for key, start, end in iter_items(buf)]
+
+
+def find(filename, name):
+    """
+    Finds the first top-level key of the JSON object in FILENAME that
+    matches NAME (case insensitive).
+
+    Returns
+    -------
+    (key, JSON-formatted value, number of bytes scanned), or None if
+    there is no such key.
+    """
+    name = fold(name)
+    with mapped(filename) as buf:
+        for key, start, end in iter_items(buf):
+            if fold(key) == name:
+                return (key, buf[start:end], end)
+    return None
+
+
+def extract(filename, name):
+    """
+    As find, but returns the decoded value, i.e. (key, value, number of
+    bytes scanned) or None.
+    """
+    found = find(filename, name)
+    if found is None:
+        return None
+    key, text, nbytes = found
+    return (key, json.loads(text), nbytes)
@@ -0,0 +1,174 @@
+"""
+Selection of records in a multi-record PIF package.
+
+A selection is a comma-separated list of terms, all of which a record
+must match:
+
+    uid=UID                 the record's UID
+    property:NAME           has a property named NAME
+    property:NAME=VALUE     has a property NAME with scalar value VALUE
+    NAME=VALUE              a preparation detail NAME with value VALUE,
+                            e.g. "plate number=2,build=1"
+
+Names and string values are compared case-insensitively; numbers are
+compared as numbers, so "2" matches 2 and 2.0. A record whose detail or
+property holds a list of scalars matches if any of them does. Several
+selections may be given, in which case a record is selected if it
+matches any of them.
+
+The package is indexed once (RecordIndex) and each term is looked up in
+the index, so a selection costs a few set operations rather than a scan
+of every record.
+
+    index = RecordIndex(records)
+    positions = index.select([parse_selection('plate number=2,build=1')])
+"""
+
+from pifmod.properties import fold
+
+
+class SelectionError(ValueError):
+    def __init__(self, *args, **kwds):
+        super(SelectionError, self).__init__(*args, **kwds)
+#end 'class SelectionError(ValueError):'
+
+
+def value_key(value):
+    """
+    Normalizes a scalar for comparison: numbers (and numeric strings)
+    become floats, other strings are case-folded and stripped.
+    """
+    value = getattr(value, 'value', value)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, long, float)):
+        return float(value)
+    if isinstance(value, basestring):
+        try:
+            return float(value)
+        except ValueError:
+            return fold(value.strip())
+    return value
+
+
+def _scalar_keys(scalars):
+    """
+    Returns the set of normalized values of SCALARS, a scalar, Scalar
+    object or list of them.
+    """
+    if scalars is None:
+        return set()
+    if not isinstance(scalars, list):
+        scalars = [scalars]
+    keys = set()
+    for s in scalars:
+        try:
+            keys.add(value_key(s))
+        except TypeError:
+            # unhashable, e.g. a nested list
+            pass
+    return keys
+
+
+def parse_selection(spec):
+    """
+    Splits the selection SPEC into terms.
+
+    Returns
+    -------
+    List of (kind, name, value) tuples, kind one of 'uid', 'property'
+    and 'detail'. value is None for property presence.
+
+    Raises
+    ------
+    SelectionError if a term is malformed.
+    """
+    terms = []
+    for term in spec.split(','):
+        term = term.strip()
+        if not term:
+            continue
+        name, sep, value = term.partition('=')
+        name, value = name.strip(), value.strip()
+        if fold(name).startswith('property:'):
+            name = name[len('property:'):].strip()
+            if not name:
+                raise SelectionError('No property name in "{}".'.format(term))
+            terms.append(('property', name, value if sep else None))
+        elif not sep or not name:
+            raise SelectionError('Expected NAME=VALUE, uid=UID or ' \
+                'property:NAME[=VALUE], not "{}".'.format(term))
+        elif fold(name) == 'uid':
+            terms.append(('uid', None, value))
+        else:
+            terms.append(('detail', name, value))
+    if not terms:
+        raise SelectionError('Empty selection.')
+    return terms
+
+
+class RecordIndex(object):
+    """
+    Index of the records in a package by UID, preparation detail
+    values, property names and property values.
+    """
+    def __init__(self, records):
+        self.records = records
+        # key --> set of positions
+        self._uids = {}
+        self._details = {}
+        self._properties = {}
+        self._property_values = {}
+        for i,record in enumerate(records):
+            self.add(i, record)
+
+    def add(self, i, record):
+        """
+        Indexes RECORD as the record at position I.
+        """
+        uid = getattr(record, 'uid', None)
+        if uid is not None:
+            self._uids.setdefault(uid, set()).add(i)
+        for step in getattr(record, 'preparation', None) or []:
+            for detail in getattr(step, 'details', None) or []:
+                name = fold(detail.name)
+                for key in _scalar_keys(getattr(detail, 'scalars', None)):
+                    self._details.setdefault((name, key), set()).add(i)
+        for prop in getattr(record, 'properties', None) or []:
+            name = fold(prop.name)
+            self._properties.setdefault(name, set()).add(i)
+            for key in _scalar_keys(getattr(prop, 'scalars', None)):
+                self._property_values.setdefault((name, key), set()).add(i)
+
+    def match(self, terms):
+        """
+        Returns the set of positions of the records that match every
+        term in TERMS (see parse_selection).
+        """
+        selected = None
+        for kind, name, value in terms:
+            if kind == 'uid':
+                found = self._uids.get(value, set())
+            elif kind == 'property' and value is None:
+                found = self._properties.get(fold(name), set())
+            elif kind == 'property':
+                found = self._property_values.get(
+                    (fold(name), value_key(value)), set())
+            else:
+                found = self._details.get(
+                    (fold(name), value_key(value)), set())
+            selected = set(found) if selected is None else selected & found
+            if not selected:
+                break
+        return selected or set()
+
+    def select(self, selections):
+        """
+        Returns the sorted positions of the records that match any of
+        SELECTIONS, each a list of terms.
+        """
+        positions = set()
+        for terms in selections:
+            positions |= self.match(terms)
+        return sorted(positions)
+#end 'class RecordIndex(object):'
@@ -0,0 +1,142 @@
+"""
+Persistent, on-disk cache of properties parsed from source files.
+
+Importing a property from a large source file, e.g. a pore
+distribution, means scanning the file and decoding a long column of
+numbers. Pipelines that import the same columns into many PIFs pay this
+cost once: the typed column is stored in NumPy's binary .npz format and
+loaded directly by later invocations.
+
+Each entry is identified by the SHA-1 of the source file's absolute
+path, size and modification time and the (case-folded) property name,
+so any change to the source file invalidates its entries. An entry is
+a pair of files: KEY.npz holds the NumPy arrays of the property and
+KEY.json holds its other fields and the identity of the source. The
+modification time of KEY.npz records the last access and is used for
+least-recently-used eviction (see pifmod.diskcache). The list of
+property names in a source file is cached the same way, under the name
+None.
+"""
+
+import hashlib
+import json
+import os
+from StringIO import StringIO
+import numpy as np
+from pifmod import diskcache
+from pifmod.properties import fold
+
+# directory in which entries are stored
+CACHE_DIR = os.environ.get('PIFMOD_SOURCE_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pifmod', 'sources'))
+# bytes of entries kept on disk
+CACHE_MAX_SIZE = int(os.environ.get('PIFMOD_SOURCE_CACHE_MAX_SIZE',
+                                    1024**3))
+# set PIFMOD_SOURCE_CACHE=0 to neither read nor write entries
+ENABLED = os.environ.get('PIFMOD_SOURCE_CACHE', '1') != '0'
+
+
+def configure_cache(directory=None, max_size=None, enabled=None):
+    """
+    Sets the cache directory, maximum size (bytes) and whether the cache
+    is used. Parameters that are None are left unchanged.
+    """
+    global CACHE_DIR, CACHE_MAX_SIZE, ENABLED
+    if directory is not None:
+        CACHE_DIR = directory
+    if max_size is not None:
+        CACHE_MAX_SIZE = int(max_size)
+    if enabled is not None:
+        ENABLED = bool(enabled)
+
+
+def _identity(source, name):
+    """
+    Identity of the entry for property NAME of SOURCE, a tuple of
+    (absolute path, size, mtime).
+    """
+    path, size, mtime = source
+    return [path, size, repr(mtime), None if name is None else fold(name)]
+
+
+_extensions = ('.npz', '.json')
+
+
+def _cache_paths(source, name):
+    key = hashlib.sha1(json.dumps(_identity(source, name))).hexdigest()
+    base = os.path.join(CACHE_DIR, key)
+    return (base + '.npz', base + '.json')
+
+
+def get(source, name):
+    """
+    Returns the cached fields of property NAME of SOURCE, (absolute
+    path, size, mtime), as keywords for (Array)Property, or None if
+    there is no entry.
+    """
+    if not ENABLED:
+        return None
+    arrayfile, metafile = _cache_paths(source, name)
+    try:
+        with open(metafile) as ifs:
+            meta = json.load(ifs)
+        if meta.get('identity') != _identity(source, name):
+            return None
+        fields = meta['fields']
+        with np.load(arrayfile, allow_pickle=False) as npz:
+            for field in npz.files:
+                fields[field] = npz[field]
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+    diskcache.touch(arrayfile)
+    return fields
+
+
+def put(source, name, fields):
+    """
+    Stores FIELDS, keywords for (Array)Property, as the entry for
+    property NAME of SOURCE. NumPy arrays are stored in binary form;
+    the other fields must be JSON-serializable. Failures to write, e.g.
+    to a read-only directory, are ignored.
+    """
+    if not ENABLED:
+        return
+    arrays = dict((k, v) for k,v in iter(fields.items())
+                  if isinstance(v, np.ndarray))
+    meta = {
+        'identity' : _identity(source, name),
+        'fields' : dict((k, v) for k,v in iter(fields.items())
+                        if k not in arrays)
+    }
+    arrayfile, metafile = _cache_paths(source, name)
+    try:
+        diskcache.make_directory(CACHE_DIR)
+        data = StringIO()
+        np.savez(data, **arrays)
+        diskcache.write(arrayfile, data.getvalue())
+        diskcache.write(metafile, json.dumps(meta))
+        diskcache.evict(CACHE_DIR, CACHE_MAX_SIZE, _extensions)
+    except (IOError, OSError):
+        pass
+
+
+def get_names(source):
+    """
+    Returns the cached list of property names in SOURCE, or None.
+    """
+    fields = get(source, None)
+    return None if fields is None else fields.get('names')
+
+
+def put_names(source, names):
+    """
+    Stores NAMES, the property names in SOURCE.
+    """
+    put(source, None, {'names' : list(names)})
+
+
+def clear_cache():
+    """
+    Removes every entry.
+    """
+    diskcache.clear(CACHE_DIR, _extensions)
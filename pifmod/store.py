@@ -0,0 +1,274 @@
+"""
+Local SQLite store of PIF records.
+
+Each record is kept as its JSON text, as written by pif.dumps, along
+with index tables of its UID, property names and values, and
+preparation detail names and values:
+
+    records     (id, uid, source, digest, pif)
+    properties  (record, name, value)    one row per distinct value
+    details     (record, name, value)
+
+Names are case-folded and values normalized as for --select (see
+pifmod.selection), so that a selection is answered by queries of the
+indexes rather than by reading and parsing every record. Records
+without a UID are identified by the digest (SHA-1) of their JSON text
+instead, so that adding the same file twice does not store them twice.
+
+    with Store('pifs.db') as store:
+        store.add(record, source='a.json')
+        ids = store.ids(selections=[parse_selection('plate number=2')])
+        for rowid, record in store.load(ids):
+            ...
+"""
+
+import hashlib
+import sqlite3
+from pifmod.properties import fold
+from pifmod.selection import value_key
+
+_schema = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    uid TEXT UNIQUE,
+    source TEXT,
+    digest TEXT NOT NULL,
+    pif TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_digest ON records(digest);
+CREATE TABLE IF NOT EXISTS properties (
+    record INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS properties_name_value
+    ON properties(name, value);
+CREATE INDEX IF NOT EXISTS properties_record ON properties(record);
+CREATE TABLE IF NOT EXISTS details (
+    record INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS details_name_value ON details(name, value);
+CREATE INDEX IF NOT EXISTS details_record ON details(record);
+"""
+
+
+class StoreError(ValueError):
+    def __init__(self, *args, **kwds):
+        super(StoreError, self).__init__(*args, **kwds)
+#end 'class StoreError(ValueError):'
+
+
+def _values(scalars):
+    """
+    Returns the distinct normalized values of SCALARS, a scalar, Scalar
+    object or list of them, that can be stored. A property without
+    scalar values (e.g. a vector of objects) yields [None], so that its
+    name is still indexed.
+    """
+    if not isinstance(scalars, list):
+        scalars = [] if scalars is None else [scalars]
+    values = set()
+    for s in scalars:
+        key = value_key(s)
+        if isinstance(key, (basestring, float, bool)):
+            values.add(key)
+    return sorted(values) or [None]
+
+
+def index_rows(record):
+    """
+    Returns the (name, value) rows of the property and preparation
+    detail indexes of RECORD.
+
+    Returns
+    -------
+    (property rows, detail rows)
+    """
+    props, details = set(), set()
+    for prop in getattr(record, 'properties', None) or []:
+        name = fold(prop.name)
+        for value in _values(getattr(prop, 'scalars', None)):
+            props.add((name, value))
+    for step in getattr(record, 'preparation', None) or []:
+        for detail in getattr(step, 'details', None) or []:
+            name = fold(detail.name)
+            for value in _values(getattr(detail, 'scalars', None)):
+                if value is not None:
+                    details.add((name, value))
+    return (sorted(props), sorted(details))
+
+
+def _digest(text):
+    """
+    Returns the digest of the JSON text of a record.
+    """
+    return hashlib.sha1(text).hexdigest()
+
+
+def _term_query(kind, name, value):
+    """
+    Returns (SQL, parameters) selecting the IDs of the records that
+    match a selection term (see pifmod.selection.parse_selection).
+    """
+    if kind == 'uid':
+        return ('SELECT id FROM records WHERE uid = ?', [value])
+    table = 'properties' if kind == 'property' else 'details'
+    if value is None:
+        return ('SELECT record FROM {} WHERE name = ?'.format(table),
+                [fold(name)])
+    return ('SELECT record FROM {} WHERE name = ? AND value = ?'.format(
+            table), [fold(name), value_key(value)])
+
+
+class Store(object):
+    """
+    SQLite database of PIF records, FILENAME. Changes are committed by
+    commit(), or when the store is used as a context manager and the
+    block succeeds.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        # JSON text and UIDs as str, as from pif.dumps
+        self.conn.text_factory = str
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.conn.rollback()
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _index(self, rowid, record):
+        props, details = index_rows(record)
+        self.conn.execute('DELETE FROM properties WHERE record = ?', (rowid,))
+        self.conn.execute('DELETE FROM details WHERE record = ?', (rowid,))
+        self.conn.executemany(
+            'INSERT INTO properties (record, name, value) VALUES (?, ?, ?)',
+            [(rowid, name, value) for name, value in props])
+        self.conn.executemany(
+            'INSERT INTO details (record, name, value) VALUES (?, ?, ?)',
+            [(rowid, name, value) for name, value in details])
+
+    def add(self, record, source=None, replace=False):
+        """
+        Adds RECORD, read from the file SOURCE. A stored record with the
+        same UID is replaced if REPLACE, and otherwise kept. A record
+        without a UID is skipped if an identical one, also without a
+        UID, is stored.
+
+        Returns
+        -------
+        'added', 'replaced' or 'skipped'.
+        """
+        from pypif import pif
+        uid = getattr(record, 'uid', None)
+        text = pif.dumps(record)
+        digest = _digest(text)
+        if uid is None:
+            row = self.conn.execute('SELECT id FROM records WHERE ' \
+                'uid IS NULL AND digest = ?', (digest,)).fetchone()
+            if row is not None:
+                return 'skipped'
+        else:
+            row = self.conn.execute('SELECT id FROM records WHERE uid = ?',
+                                    (uid,)).fetchone()
+        if row is not None and not replace:
+            return 'skipped'
+        if row is not None:
+            rowid = row[0]
+            self.conn.execute('UPDATE records SET source = ?, digest = ?, ' \
+                'pif = ? WHERE id = ?', (source, digest, text, rowid))
+        else:
+            rowid = self.conn.execute('INSERT INTO records (uid, source, ' \
+                'digest, pif) VALUES (?, ?, ?, ?)',
+                (uid, source, digest, text)).lastrowid
+        self._index(rowid, record)
+        return 'added' if row is None else 'replaced'
+
+    def update(self, rowid, record):
+        """
+        Replaces the stored record ROWID with RECORD.
+
+        Raises
+        ------
+        StoreError if the UID of RECORD is that of another record.
+        """
+        from pypif import pif
+        uid = getattr(record, 'uid', None)
+        text = pif.dumps(record)
+        try:
+            self.conn.execute('UPDATE records SET uid = ?, digest = ?, ' \
+                'pif = ? WHERE id = ?', (uid, _digest(text), text, rowid))
+        except sqlite3.IntegrityError:
+            raise StoreError('A record with UID {} is already stored.'.format(
+                uid))
+        self._index(rowid, record)
+
+    def ids(self, uids=(), selections=()):
+        """
+        Returns the sorted IDs of the records with any of UIDS or that
+        match any of SELECTIONS, each a list of terms as from
+        pifmod.selection.parse_selection. With neither, the IDs of all
+        records are returned.
+
+        Raises
+        ------
+        StoreError if no record has one of UIDS.
+        """
+        if not uids and not selections:
+            return [row[0] for row in
+                    self.conn.execute('SELECT id FROM records ORDER BY id')]
+        ids = set()
+        for uid in uids:
+            row = self.conn.execute('SELECT id FROM records WHERE uid = ?',
+                                    (uid,)).fetchone()
+            if row is None:
+                raise StoreError('No record with UID {}.'.format(uid))
+            ids.add(row[0])
+        for terms in selections:
+            queries = [_term_query(*term) for term in terms]
+            sql = ' INTERSECT '.join(q for q, params in queries)
+            params = [p for q, params in queries for p in params]
+            ids.update(row[0] for row in self.conn.execute(sql, params))
+        return sorted(ids)
+
+    def texts(self, ids):
+        """
+        Returns the JSON text of the records ROWIDS, in order.
+        """
+        texts = []
+        for rowid in ids:
+            row = self.conn.execute('SELECT pif FROM records WHERE id = ?',
+                                    (rowid,)).fetchone()
+            if row is None:
+                raise StoreError('No record {} in {}.'.format(rowid,
+                                                              self.filename))
+            texts.append(row[0])
+        return texts
+
+    def load(self, ids):
+        """
+        Returns (ID, PIF record) for each of the records IDS, in order.
+        """
+        from pypif import pif
+        return [(rowid, pif.loads(text))
+                for rowid, text in zip(ids, self.texts(ids))]
+#end 'class Store(object):'
@@ -0,0 +1,131 @@
+"""
+Per-phase timing and byte counts for a pifmod run.
+
+Work is attributed to one of the phases
+
+    read        reading input PIFs and property source files
+    parse       decoding JSON into PIF objects and typed properties
+    fetch       network requests (see pifmod.urlio)
+    action      the requested action, excluding nested phases
+    serialize   encoding PIF objects as JSON
+    write       writing the output
+
+by running it inside `with phase(NAME):`. Phases may nest; each phase
+is charged only for the time not spent in the phases nested within it,
+so on a single thread the phases add up to (at most) the total. Phases
+run concurrently on other threads, e.g. catalogue fetches, are counted
+in full and may overlap.
+
+    timing.reset()
+    with timing.phase('read'):
+        text = ifs.read()
+    timing.add_bytes('read', len(text))
+    ...
+    record = timing.report()
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ('read', 'parse', 'fetch', 'action', 'serialize', 'write')
+
+# phase --> {'seconds', 'calls', 'bytes'}
+_totals = {}
+_lock = threading.Lock()
+# per thread stack of [phase, time spent in nested phases]
+_local = threading.local()
+_start = time.time()
+
+
+def _entry(name):
+    return _totals.setdefault(name, {'seconds' : 0., 'calls' : 0,
+                                     'bytes' : 0})
+
+
+def reset():
+    """
+    Clears the recorded phases and restarts the total clock.
+    """
+    global _start
+    with _lock:
+        _totals.clear()
+    _start = time.time()
+
+
+@contextmanager
+def phase(name):
+    """
+    Context manager that charges the enclosed work to phase NAME.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    frame = [name, 0.]
+    stack.append(frame)
+    start = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - start
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        with _lock:
+            entry = _entry(name)
+            entry['seconds'] += elapsed - frame[1]
+            entry['calls'] += 1
+
+
+def add_bytes(name, nbytes):
+    """
+    Adds NBYTES to the byte count of phase NAME.
+    """
+    with _lock:
+        _entry(name)['bytes'] += nbytes
+
+
+def merge(record):
+    """
+    Adds the phases of RECORD, as returned by report() in another
+    process, to those recorded here.
+    """
+    with _lock:
+        for name, other in iter(record['phases'].items()):
+            entry = _entry(name)
+            for key in ('seconds', 'calls', 'bytes'):
+                entry[key] += other[key]
+
+
+def report():
+    """
+    Returns the timings recorded since the last reset as a
+    JSON-serializable dict:
+
+        {"total": SECONDS, "phases": {PHASE: {"seconds": SECONDS,
+         "calls": N, "bytes": N}, ...}}
+    """
+    with _lock:
+        phases = dict((k, dict(v)) for k,v in iter(_totals.items()))
+    return {'total' : time.time() - _start, 'phases' : phases}
+
+
+class TimedWriter(object):
+    """
+    File-like wrapper of OFS that charges each write to phase NAME and
+    counts the bytes written, both in the phase and in `nbytes`.
+    """
+    def __init__(self, ofs, name='write'):
+        self.ofs = ofs
+        self.name = name
+        self.nbytes = 0
+
+    def write(self, data):
+        with phase(self.name):
+            self.ofs.write(data)
+        self.nbytes += len(data)
+        add_bytes(self.name, len(data))
+
+    def flush(self):
+        self.ofs.flush()
+#end 'class TimedWriter(object):'
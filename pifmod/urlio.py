@@ -1,9 +1,44 @@
-from subprocess import check_output
-import re
+import hashlib
+import httplib
+import json
+import os
+import socket
+import threading
+import time
+import urlparse
+from pifmod import diskcache, timing
 
-_404_not_found_re = re.compile(r'404 Not Found')
+# HTTP client settings
+# seconds to wait for a connection or response
+TIMEOUT = 30
+# number of times a failed request is retried
+RETRIES = 3
+# base, in seconds, of the exponential backoff between retries
+BACKOFF = 0.5
+# bytes read at a time when streaming response bodies
+CHUNK_SIZE = 64*1024
+# idle keep-alive connections kept per host
+POOL_SIZE = 4
+# redirects followed by fetch
+MAX_REDIRECTS = 5
 
-_cache = {}
+_retry_status = (429, 502, 503, 504)
+_redirect_status = (301, 302, 303, 307, 308)
+_pool = {}
+_pool_lock = threading.Lock()
+
+# persistent, on-disk cache of URL responses. Each URL is stored as a
+# pair of files named by the SHA-1 of the URL: KEY.body holds the
+# response body and KEY.json holds the URL, the time the response was
+# (re)validated and the validators (ETag/Last-Modified) sent by the
+# server. The modification time of KEY.body records the last access
+# and is used for least-recently-used eviction (see pifmod.diskcache).
+CACHE_DIR = os.environ.get('PIFMOD_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pifmod', 'urlio'))
+# seconds a cached response is used without revalidation
+CACHE_TTL = float(os.environ.get('PIFMOD_CACHE_TTL', 3600))
+# bytes of entries kept on disk
+CACHE_MAX_SIZE = int(os.environ.get('PIFMOD_CACHE_MAX_SIZE', 100*1024**2))
 
 class DataManagementError(Exception):
     def __init__(self, *args, **kwds):
@@ -12,32 +47,304 @@ class DataManagementError(Exception):
             'availability issue.'
         self.msg = msg
 
-# TODO: Add timestamps to cached values
-def fetch(url, cache=True):
-    global _cache
-    def action():
-        response = check_output(['curl', '-s', url])
-        if re.search(_404_not_found_re, response):
+
+def configure_cache(directory=None, ttl=None, max_size=None):
+    """
+    Sets the cache directory, time-to-live (seconds) and maximum size
+    (bytes). Parameters that are None are left unchanged.
+    """
+    global CACHE_DIR, CACHE_TTL, CACHE_MAX_SIZE
+    if directory is not None:
+        CACHE_DIR = directory
+    if ttl is not None:
+        CACHE_TTL = float(ttl)
+    if max_size is not None:
+        CACHE_MAX_SIZE = int(max_size)
+
+
+def _connection(scheme, netloc, reuse=True):
+    """
+    Returns an idle keep-alive connection to NETLOC from the pool, or a
+    new connection if none is available or not REUSE.
+
+    Returns
+    -------
+    (connection, True if the connection was reused)
+    """
+    with _pool_lock:
+        idle = _pool.get((scheme, netloc), [])
+        if idle and reuse:
+            return (idle.pop(), True)
+    if scheme == 'https':
+        return (httplib.HTTPSConnection(netloc, timeout=TIMEOUT), False)
+    elif scheme == 'http':
+        return (httplib.HTTPConnection(netloc, timeout=TIMEOUT), False)
+    else:
+        raise IOError('Unsupported URL scheme: {}'.format(scheme))
+
+
+def _release(scheme, netloc, conn):
+    """
+    Returns CONN to the pool so that it can be reused.
+    """
+    with _pool_lock:
+        idle = _pool.setdefault((scheme, netloc), [])
+        if len(idle) < POOL_SIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def close_connections():
+    """
+    Closes all pooled connections.
+    """
+    with _pool_lock:
+        for idle in _pool.values():
+            for conn in idle:
+                conn.close()
+        _pool.clear()
+
+
+def _request(url, headers=None, ofs=None, retries=None, backoff=None,
+             limiter=None):
+    """
+    Requests URL, sending the additional HEADERS (dict). Connections are
+    kept alive and reused for subsequent requests to the same host.
+    Connection errors and 429/502/503/504 responses are retried RETRIES
+    times, waiting BACKOFF*2**attempt seconds, or as long as the server
+    asks in Retry-After, between attempts. A pooled connection that
+    fails, e.g. because the server closed it while it was idle, is
+    retried once straight away on a new connection; this counts as an
+    attempt as well. If LIMITER is given,
+    LIMITER.wait() is called before each attempt, e.g. to limit the
+    rate of requests.
+
+    If OFS (file-like) is given, the body of a successful (200) response
+    is written to it in CHUNK_SIZE pieces rather than read into memory,
+    and the body returned is None. Once part of the body has been
+    written, the request is not retried, as the body would be written
+    twice, and IOError is raised if the connection fails or the body is
+    shorter or longer than its Content-Length.
+
+    Returns
+    -------
+    (status code, response headers (dict, lower case keys), body)
+    """
+    retries = RETRIES if retries is None else retries
+    backoff = BACKOFF if backoff is None else backoff
+    parts = urlparse.urlsplit(url)
+    path = urlparse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+    attempt = 0
+    stale = False
+    # bytes of the body written to OFS
+    written = 0
+    while True:
+        delay = backoff*2**attempt
+        if limiter is not None:
+            limiter.wait()
+        conn, reused = _connection(parts.scheme, parts.netloc,
+                                   reuse=not stale)
+        try:
+            conn.request('GET', path, headers=(headers or {}))
+            response = conn.getresponse()
+            status = response.status
+            rheaders = dict(response.getheaders())
+            if ofs is not None and status == 200:
+                body = None
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), ''):
+                    ofs.write(chunk)
+                    written += len(chunk)
+                length = rheaders.get('content-length', '')
+                if length.isdigit() and written != int(length):
+                    conn.close()
+                    raise IOError('Received {} of {} bytes from {}'.format(
+                        written, length, url))
+            else:
+                body = response.read()
+        except (httplib.HTTPException, socket.error), e:
+            conn.close()
+            if written:
+                raise IOError('Could not retrieve {} after {} bytes ' \
+                              '({})'.format(url, written, e))
+            # the server may have closed an idle connection; try again
+            # straight away on a new one, once per request.
+            if reused and not stale:
+                stale = True
+                attempt += 1
+                continue
+            if attempt >= retries:
+                raise IOError('Could not connect to {} ({})'.format(url, e))
+        else:
+            if response.will_close:
+                conn.close()
+            else:
+                _release(parts.scheme, parts.netloc, conn)
+            if status not in _retry_status or attempt >= retries:
+                return (status, rheaders, body)
+            # e.g. "Retry-After: 2" from a server that is rate limiting
+            if rheaders.get('retry-after', '').isdigit():
+                delay = max(delay, int(rheaders['retry-after']))
+        time.sleep(delay)
+        attempt += 1
+
+
+def download(url, ofs):
+    """
+    Streams the body of URL into the file-like OFS without caching it
+    or holding it in memory.
+    """
+    with timing.phase('fetch'):
+        status, headers, body = _request(url, ofs=ofs)
+    if status == 404:
+        raise IOError('Could not locate {}'.format(url))
+    if status != 200:
+        raise IOError('Could not retrieve {} ({})'.format(url, status))
+
+
+_extensions = ('.body', '.json')
+
+
+def _cache_paths(url):
+    key = hashlib.sha1(url).hexdigest()
+    base = os.path.join(CACHE_DIR, key)
+    return (base + '.body', base + '.json')
+
+
+def _read_entry(url):
+    """
+    Returns (metadata, body) of the cached response for URL, or None.
+    """
+    bodyfile, metafile = _cache_paths(url)
+    try:
+        with open(metafile) as ifs:
+            meta = json.load(ifs)
+        with open(bodyfile, 'rb') as ifs:
+            body = ifs.read()
+    except (IOError, ValueError):
+        return None
+    if meta.get('url') != url:
+        return None
+    return (meta, body)
+
+
+def _touch_entry(url, meta=None):
+    """
+    Marks the entry for URL as recently used and, if META is given,
+    stores the updated metadata. Failures are ignored.
+    """
+    bodyfile, metafile = _cache_paths(url)
+    try:
+        if meta is not None:
+            diskcache.write(metafile, json.dumps(meta))
+    except (IOError, OSError):
+        pass
+    diskcache.touch(bodyfile)
+
+
+def _write_entry(url, headers, body):
+    """
+    Stores BODY, the response from URL, in the cache. Failures to write,
+    e.g. to a read-only directory, are ignored: the response is used
+    whether or not it could be cached.
+    """
+    try:
+        diskcache.make_directory(CACHE_DIR)
+        _store_entry(url, headers, body)
+    except (IOError, OSError):
+        pass
+
+
+def _store_entry(url, headers, body):
+    bodyfile, metafile = _cache_paths(url)
+    meta = {
+        'url' : url,
+        'timestamp' : time.time(),
+        'etag' : headers.get('etag'),
+        'last-modified' : headers.get('last-modified'),
+        'size' : len(body)
+    }
+    diskcache.write(bodyfile, body)
+    diskcache.write(metafile, json.dumps(meta))
+    diskcache.evict(CACHE_DIR, CACHE_MAX_SIZE, _extensions)
+
+
+def fetch(url, cache=True, ttl=None, retries=None, backoff=None,
+          limiter=None):
+    """
+    Returns the body of the response from URL. Redirects are followed,
+    up to MAX_REDIRECTS of them, and any other response but 200 (or 304
+    when revalidating a cached response) raises IOError.
+
+    Parameters
+    ----------
+    :url, str: URL to retrieve.
+    :cache, bool: If True (default), responses are stored in and served
+        from the on-disk cache.
+    :ttl, float: Seconds a cached response is used without asking the
+        server whether it has changed. Older entries are revalidated
+        using ETag/Last-Modified, so an unchanged resource is not
+        downloaded again. Default: CACHE_TTL. A ttl of 0 always
+        revalidates.
+    :retries, int: Number of times a failed request is retried.
+        Default: RETRIES.
+    :backoff, float: Base, in seconds, of the backoff between retries.
+        Default: BACKOFF.
+    :limiter, object: If given, its wait() method is called before each
+        request sent to the server (but not for responses served from
+        the cache), e.g. to limit the rate of requests.
+    """
+    def action(headers=None):
+        target = url
+        for i in range(MAX_REDIRECTS + 1):
+            with timing.phase('fetch'):
+                status, rheaders, response = _request(target, headers,
+                    retries=retries, backoff=backoff, limiter=limiter)
+            timing.add_bytes('fetch', len(response))
+            if status not in _redirect_status or 'location' not in rheaders:
+                break
+            target = urlparse.urljoin(target, rheaders['location'])
+        if status == 404:
             raise IOError('Could not locate {}'.format(url))
-        return response
+        if status != 200 and not (status == 304 and headers):
+            raise IOError('Could not retrieve {} ({})'.format(url, status))
+        return (status, rheaders, response)
     # cached or not cached?
-    if cache:
-        # if cached, is or is not in _cache?
-        if url not in _cache:
-            response = action()
-            _cache[url] = response
-        else:
-            respone = _cache[url]
-    else:
-        response = action()
-    return response
+    if not cache:
+        return action()[2]
+    ttl = CACHE_TTL if ttl is None else ttl
+    entry = _read_entry(url)
+    # action returns complete (200) responses only, besides 304
+    if entry is None:
+        status, headers, response = action()
+        _write_entry(url, headers, response)
+        return response
+    meta, response = entry
+    # fresh
+    if time.time() - meta['timestamp'] < ttl:
+        _touch_entry(url)
+        return response
+    # stale: has it changed?
+    conditions = {}
+    if meta.get('etag'):
+        conditions['If-None-Match'] = meta['etag']
+    if meta.get('last-modified'):
+        conditions['If-Modified-Since'] = meta['last-modified']
+    status, headers, body = action(conditions)
+    if status == 304:
+        meta['timestamp'] = time.time()
+        _touch_entry(url, meta)
+        return response
+    _write_entry(url, headers, body)
+    return body
 
 
 def clear_cache(key=None):
-    global _cache
     # clear the entire cache
     if key is None:
-        _cache = {}
+        diskcache.clear(CACHE_DIR, _extensions)
     # clear a specific key/URL
-    elif key in _cache:
-        del _cache[key]
+    else:
+        bodyfile, metafile = _cache_paths(key)
+        diskcache.remove(CACHE_DIR,
+            os.path.basename(bodyfile)[:-len('.body')], _extensions)
@@ -0,0 +1,81 @@
+"""
+Classification of property values as scalars, vectors or matrices.
+
+Values arrive either as strings typed on the command line, which must be
+parsed, or as objects already decoded by json.load, which need only be
+inspected.
+"""
+
+import ast
+import re
+from pifmod import columns
+
+# ensure all character strings are quoted, otherwise they will
+# be treated as variables and raise an Exception
+_quoteRE = re.compile(r"""(\b[a-zA-Z_]\w*)""")
+
+
+def parse_value(vstr):
+    """
+    Infer whether the value string is a scalar, vector, or
+    matrix.
+
+        scalars: single value
+        vectors: one or more scalars in square brackets, e.g. [1, 2, 3]
+        matrices: vector of vectors (row-dominant).
+
+    Use this only for strings typed by the user; decoded JSON should be
+    passed to classify_value.
+
+    Returns
+    -------
+        (value type, value)
+    """
+    vstr = re.sub(_quoteRE, r'"\1"', str(vstr))
+    # do not use the built in eval as this is a huge security
+    # vulnerability. ast.literal_eval only allows evaluation to
+    # basic types, lists, tuples, dicts and None.
+    return classify_value(ast.literal_eval(vstr))
+
+
+def classify_value(value, as_array=False):
+    """
+    Infer whether an already decoded value is a scalar, vector, or
+    matrix.
+
+    Parameters
+    ----------
+    :value: Decoded value, e.g. from json.load.
+    :as_array, bool: If True, vectors and matrices of a single numeric
+        or string type are returned as typed NumPy arrays (see
+        columns.to_array).
+
+    Returns
+    -------
+        (value type, value)
+
+    Raises
+    ------
+    ValueError if a list mixes scalars and lists, nests deeper than a
+    matrix, or is a matrix whose rows differ in length.
+    """
+    if not isinstance(value, list):
+        return ('scalars', value)
+    # homogeneous vectors and matrices are validated by NumPy
+    array = columns.to_array(value)
+    if array is not None:
+        vtype = columns.value_type(array)
+        return (vtype, array if as_array else value)
+    # ragged, mixed or empty
+    nlists = sum(1 for v in value if isinstance(v, list))
+    if nlists == 0:
+        return ('vectors', value)
+    elif nlists != len(value):
+        raise ValueError('Value mixes scalars and lists.')
+    ncols = len(value[0])
+    for row in value:
+        if len(row) != ncols:
+            raise ValueError('Matrix rows must all have the same length.')
+        if any(isinstance(v, list) for v in row):
+            raise ValueError('Values may be nested at most two deep.')
+    return ('matrices', value)
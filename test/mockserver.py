@@ -0,0 +1,86 @@
+"""
+Mock HTTP server shared by the tests that fetch URLs and by the
+benchmark suite. A test defines only the do_GET of its handler:
+
+	class Handler(mockserver.Handler):
+		def do_GET(self):
+			self.send_body('[]')
+
+	class TestClass: # keep this the same
+		def setUp(self):
+			self.mock = mockserver.MockServer(Handler)
+			self.host = self.mock.host
+
+		def tearDown(self):
+			self.mock.close()
+"""
+
+import shutil
+import tempfile
+import threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from pifmod import urlio
+
+class Server(ThreadingMixIn, HTTPServer):
+	# one thread per connection, so that keep-alive clients do not
+	# block one another
+	daemon_threads = True
+
+class Handler(BaseHTTPRequestHandler):
+	"""
+	Quiet HTTP/1.1 (keep-alive) handler; subclasses define do_GET.
+	"""
+	protocol_version = 'HTTP/1.1'
+
+	def send_body(self, body, status=200, headers=()):
+		"""
+		Sends a response with BODY (str) and the (name, value) HEADERS.
+		"""
+		self.send_response(status)
+		for name, value in headers:
+			self.send_header(name, value)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+def serve(handler):
+	"""
+	Serves HANDLER on a free local port from a background thread.
+
+	Returns
+	-------
+	(server, host URL)
+	"""
+	server = Server(('127.0.0.1', 0), handler)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	return (server, 'http://127.0.0.1:{}'.format(server.server_port))
+
+class MockServer(object):
+	"""
+	Serves HANDLER (see serve) with the urlio cache in a temporary
+	directory, self.cachedir, a one hour TTL and a short backoff between
+	retries. close() stops the server and restores the urlio settings.
+	"""
+	def __init__(self, handler):
+		self.settings = (urlio.CACHE_DIR, urlio.CACHE_TTL,
+						 urlio.CACHE_MAX_SIZE, urlio.BACKOFF)
+		self.cachedir = tempfile.mkdtemp()
+		urlio.configure_cache(directory=self.cachedir, ttl=3600)
+		urlio.BACKOFF = 0.01
+		self.server, self.host = serve(handler)
+
+	def close(self):
+		urlio.close_connections()
+		self.server.shutdown()
+		self.server.server_close()
+		shutil.rmtree(self.cachedir)
+		directory, ttl, max_size, backoff = self.settings
+		urlio.configure_cache(directory=directory, ttl=ttl,
+							  max_size=max_size)
+		urlio.BACKOFF = backoff
@@ -0,0 +1,71 @@
+import os
+import shutil
+import stat
+import tempfile
+from pifmod.atomicfile import AtomicFile
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.tmpdir, 'out.pif')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def write(self, *chunks):
+		with AtomicFile(self.filename) as ofs:
+			for chunk in chunks:
+				ofs.write(chunk)
+		return ofs.changed
+
+	def read(self):
+		with open(self.filename) as ifs:
+			return ifs.read()
+
+	def test_replace(self):
+		assert self.write('abc', 'def') is True
+		assert self.read() == 'abcdef'
+		os.chmod(self.filename, 0640)
+		# differs after a matching prefix, shorter, longer
+		for chunks in (('abc', 'xyz'), ('abc',), ('abc', 'def', 'g')):
+			assert self.write(*chunks) is True
+			assert self.read() == ''.join(chunks)
+		assert stat.S_IMODE(os.stat(self.filename).st_mode) == 0640
+		assert os.listdir(self.tmpdir) == ['out.pif']
+
+	def test_new_file_mode(self):
+		# the process-wide umask is left alone while writing
+		umask = os.umask
+		def fail(mask):
+			raise AssertionError('umask changed while writing')
+		os.umask = fail
+		try:
+			self.write('abc')
+		finally:
+			os.umask = umask
+		mask = umask(0)
+		umask(mask)
+		assert stat.S_IMODE(os.stat(self.filename).st_mode) == 0666 & ~mask
+
+	def test_unchanged(self):
+		self.write('abcdef')
+		os.utime(self.filename, (1000000000, 1000000000))
+		# the same data, in other chunks
+		assert self.write('ab', 'cde', 'f') is False
+		assert os.stat(self.filename).st_mtime == 1000000000
+		assert self.read() == 'abcdef'
+
+	def test_discard(self):
+		self.write('abcdef')
+		try:
+			with AtomicFile(self.filename) as ofs:
+				ofs.write('xyz')
+				raise RuntimeError('interrupted')
+		except RuntimeError:
+			pass
+		assert self.read() == 'abcdef'
+		assert os.listdir(self.tmpdir) == ['out.pif']
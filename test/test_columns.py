@@ -0,0 +1,36 @@
+import json
+from pypif import pif
+from pypif.pif import Property
+from pifmod import columns
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def test_to_array_types(self):
+		assert columns.to_array([1, 2, 3]).dtype.kind == 'i'
+		assert columns.to_array([1, 2.5, 3]).dtype.kind == 'f'
+		assert columns.to_array([u'a', u'b']).dtype.kind == 'U'
+		matrix = columns.to_array([[1, 2], [3, 4]])
+		assert matrix.shape == (2, 2)
+		assert columns.value_type(matrix) == 'matrices'
+
+	def test_to_array_fallback(self):
+		# ragged, mixed, booleans, None, scalars and empty lists
+		for values in ([[1, 2], [3]], [1, u'a'], [1, True], [1, None],
+					   1.5, u'a', []):
+			assert columns.to_array(values) is None, values
+
+	def test_pore_distribution(self):
+		with open('data/pore-distribution.json') as ifs:
+			jdata = json.load(ifs)
+		for name, values in iter(jdata.items()):
+			if not isinstance(values, list):
+				continue
+			array = columns.to_array(values)
+			assert array is not None, name
+			expected = Property(name, vectors=values)
+			received = columns.ArrayProperty(name, vectors=array)
+			assert columns.is_array(received.vectors)
+			assert pif.dumps(received) == pif.dumps(expected), name
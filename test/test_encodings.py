@@ -0,0 +1,62 @@
+import numpy as np
+from StringIO import StringIO
+from pypif import pif
+from pifmod import encodings
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		with open('data/out_volume.pif') as ifs:
+			self.text = ifs.read()
+		self.pifdata = pif.loads(self.text)
+
+	def test_format_from_filename(self):
+		assert encodings.format_from_filename(None) == 'json'
+		assert encodings.format_from_filename('a/b.pif') == 'json'
+		assert encodings.format_from_filename('b.pif.GZ') == 'gz'
+		assert encodings.format_from_filename('b.bz2') == 'bz2'
+		assert encodings.format_from_filename('b.npz') == 'npz'
+
+	def test_round_trip(self):
+		expected = pif.dumps(self.pifdata)
+		for fmt in encodings.FORMATS:
+			data = encodings.encode(self.pifdata, fmt)
+			assert encodings.detect(data) == fmt, fmt
+			assert pif.dumps(encodings.decode(data)) == expected, fmt
+			if fmt != 'json':
+				assert len(data) < len(expected)/3, fmt
+
+	def test_npz_packing(self):
+		data = encodings.encode(self.pifdata, 'npz')
+		# the volume vector is stored as a binary array
+		with np.load(StringIO(data)) as npz:
+			assert npz['a0'].dtype == np.float64
+			assert '"$array"' in npz['pif'].tostring()
+		# mixed integers and floats, and short vectors, are kept as JSON
+		record = pif.System(properties=[
+			pif.Property(name='mixed', vectors=[1, 2.5]*40),
+			pif.Property(name='short', vectors=[1.5, 2.5])])
+		decoded = encodings.decode(encodings.encode(record, 'npz'))
+		assert decoded.properties[0].vectors == [1, 2.5]*40
+		assert isinstance(decoded.properties[0].vectors[0], int)
+		assert decoded.properties[1].vectors == [1.5, 2.5]
+
+	def test_package(self):
+		package = [self.pifdata, pif.System(uid='second')]
+		decoded = encodings.decode(encodings.encode(package, 'npz'))
+		assert isinstance(decoded, list) and len(decoded) == 2
+		assert decoded[1].uid == 'second'
+
+	def test_iterencode(self):
+		package = [self.pifdata, pif.System(uid='second', properties=[])]
+		for pifdata in (self.pifdata, package):
+			chunks = list(encodings.iterencode(pifdata, chunk_size=1000))
+			assert len(chunks) > 1
+			assert ''.join(chunks) == pif.dumps(pifdata)
+		# the same record always encodes to the same bytes
+		for fmt in encodings.FORMATS:
+			assert encodings.encode(package, fmt) == \
+				encodings.encode(package, fmt), fmt
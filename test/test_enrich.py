@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from pypif import pif
+from pifmod import urlio
+from pifmod.linkages import enrich
+from . import mockserver
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class Handler(mockserver.Handler):
+	"""
+	Mock sagittariidae server: serves /projects/proj/samples/ID from
+	Handler.samples, slowly, recording the number of requests in
+	flight. Samples listed in Handler.flaky fail with 503 once.
+	"""
+	samples = {}
+	flaky = set()
+	requests = []
+	in_flight = 0
+	max_in_flight = 0
+	lock = threading.Lock()
+
+	def do_GET(self):
+		with Handler.lock:
+			Handler.requests.append(self.path)
+			Handler.in_flight += 1
+			Handler.max_in_flight = max(Handler.max_in_flight,
+										Handler.in_flight)
+		try:
+			time.sleep(0.05)
+			sampleID = self.path.rstrip('/').split('/')[-1]
+			if sampleID in Handler.flaky:
+				Handler.flaky.discard(sampleID)
+				self.send_body('', status=503)
+				return
+			if sampleID not in Handler.samples:
+				self.send_error(404)
+				return
+			self.send_body(json.dumps(Handler.samples[sampleID]))
+		finally:
+			with Handler.lock:
+				Handler.in_flight -= 1
+
+class TestClass: # keep this the same
+	def setUp(self):
+		Handler.samples = dict(('s{}'.format(i),
+			{'id' : 's{}'.format(i), 'name' : 'P002_B001_N{:02d}'.format(i),
+			 'stage' : 'as-built', 'mass' : 1.5*i})
+			for i in range(8))
+		Handler.flaky = set(['s3'])
+		Handler.requests = []
+		Handler.max_in_flight = 0
+		self.mock = mockserver.MockServer(Handler)
+		self.host = self.mock.host
+
+	def records(self, ids):
+		records = []
+		for i,sampleID in enumerate(ids):
+			record = pif.System(uid='r{}'.format(i))
+			if sampleID is not None:
+				record.sagittariidae = pif.Reference(
+					url='{}/projects/proj/samples/{}'.format(self.host,
+															 sampleID))
+			records.append(record)
+		return records
+
+	def test_parse_fields(self):
+		assert enrich.parse_fields(['stage', 'mass = sample mass']) == \
+			[('stage', 'stage'), ('mass', 'sample mass')]
+
+	def test_enrich(self):
+		ids = ['s{}'.format(i) for i in range(8)] + ['s1', None, 'missing']
+		records = self.records(ids)
+		summary = enrich.enrich(records, enrich.parse_fields(
+			['stage', 'mass=sample mass']), jobs=3)
+		assert summary['enriched'] == range(9)
+		assert summary['unlinked'] == [9]
+		assert summary['failed'] == [10]
+		assert records[2].properties[1].name == 'sample mass'
+		assert records[2].properties[1].scalars == 3.0
+		assert records[8].properties[0].scalars == 'as-built'
+		# each sample is fetched once, s3 twice as it is retried
+		assert len(Handler.requests) == 10, Handler.requests
+		assert 1 < Handler.max_in_flight <= 3, Handler.max_in_flight
+		# existing properties are kept unless forced
+		Handler.samples['s0']['stage'] = 'annealed'
+		urlio.clear_cache()
+		enrich.enrich(records[:1], [('stage', 'stage')])
+		assert records[0].properties[0].scalars == 'as-built'
+		enrich.enrich(records[:1], [('stage', 'stage')], force=True)
+		assert records[0].properties[0].scalars == 'annealed'
+		assert len(records[0].properties) == 2
+
+	def test_rate(self):
+		records = self.records(['s{}'.format(i) for i in range(6)])
+		Handler.flaky = set()
+		start = time.time()
+		enrich.enrich(records, [('stage', 'stage')], jobs=6, rate=20.)
+		# six requests, at least 1/20 s apart
+		assert time.time() - start >= 0.25
+
+	def tearDown(self):
+		self.mock.close()
@@ -0,0 +1,82 @@
+import copy
+import json
+from pifmod import patch
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		with open('data/out_volume.pif') as ifs:
+			self.old = json.load(ifs)
+		self.new = copy.deepcopy(self.old)
+
+	def check(self, ops=None):
+		ops = patch.diff(self.old, self.new) if ops is None else ops
+		patched = patch.apply_patch(copy.deepcopy(self.old), ops)
+		assert patch.diff(patched, self.new) == []
+		assert json.dumps(patched, sort_keys=True) == \
+			json.dumps(self.new, sort_keys=True)
+		return ops
+
+	def test_identical(self):
+		assert patch.diff(self.old, self.new) == []
+
+	def test_named(self):
+		props = self.new['properties']
+		props[1]['units'] = 'mm^3'
+		props.insert(0, {'name' : 'mass', 'scalars' : 2.5})
+		del props[1]
+		self.new['preparation'][0]['details'][3]['scalars'] = 5.0
+		ops = self.check()
+		# matched by name, not by position
+		assert {'op' : 'replace', 'path' : '/properties/name=volume/units',
+				'value' : 'mm^3'} in ops
+		assert {'op' : 'remove',
+				'path' : '/properties/name=median pore spacing'} in ops
+		assert {'op' : 'add', 'path' : '/properties/0',
+				'value' : {'name' : 'mass', 'scalars' : 2.5}} in ops
+		assert len(ops) == 4, ops
+
+	def test_vectors(self):
+		volume = self.new['properties'][1]['scalars']
+		volume[10] = 1.0
+		volume.append(2.0)
+		assert len(self.check()) == 2
+		# mostly changed: replaced whole
+		self.new['properties'][1]['scalars'] = [v + 1 for v in volume]
+		assert len(self.check()) == 1
+		# 1 and 1.0 differ
+		self.new['properties'][0]['scalars'] = 50
+		self.old['properties'][0]['scalars'] = 50.0
+		self.check()
+
+	def test_records(self):
+		self.old = [{'uid' : 'a', 'properties' : []},
+					{'uid' : 'b', 'name' : 'x'}]
+		self.new = [{'uid' : 'b', 'name' : 'y'}, {'uid' : 'c'}]
+		ops = self.check()
+		assert {'op' : 'replace', 'path' : '/uid=b/name', 'value' : 'y'} in ops
+		# reordered: the list is replaced
+		self.new = list(reversed(self.old))
+		assert self.check() == [{'op' : 'replace', 'path' : '',
+								 'value' : self.new}]
+
+	def test_apply(self):
+		doc = {'a/b' : [1, 2], 'c' : {'name' : 'x'}}
+		ops = [{'op' : 'move', 'from' : '/a~1b/0', 'path' : '/a~1b/-'},
+			   {'op' : 'copy', 'from' : '/c', 'path' : '/d'},
+			   {'op' : 'test', 'path' : '/d/name', 'value' : 'x'}]
+		assert patch.apply_patch(doc, ops) == \
+			{'a/b' : [2, 1], 'c' : {'name' : 'x'}, 'd' : {'name' : 'x'}}
+		for op in ({'op' : 'remove', 'path' : '/properties/name=nope'},
+				   {'op' : 'replace', 'path' : '/properties/9999'},
+				   {'op' : 'test', 'path' : '/uid', 'value' : 'wrong'},
+				   {'op' : 'frobnicate', 'path' : '/uid'},
+				   {'path' : '/uid'}):
+			try:
+				patch.apply_patch(copy.deepcopy(self.old), [op])
+				assert False, op
+			except patch.PatchError:
+				pass
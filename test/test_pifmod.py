@@ -1,18 +1,43 @@
 import sys, os
+import glob
+import shutil
+import tempfile
+import time
 import subprocess as sub
 import shlex
 import json
+import pstats
+from StringIO import StringIO
 from pypif import pif
 import difflib
 from pifmod.linkages import sagittariidae
+from pifmod import client
 
 # To test, simply run
 # [...]$ nosetests (optionally with -v)
 # and a report a summary of the results
 
+# directory holding the caches (and daemon socket) of the commands run
+# by execute, rather than the user's; created for each test by TestClass.setUp
+CACHE_DIR = None
+
+def environment(**overrides):
+	"""
+	Environment in which pifmod commands are run, with OVERRIDES. The
+	commands are not forwarded to a daemon unless PIFMOD_SOCKET is
+	overridden.
+	"""
+	env = dict(os.environ,
+		PIFMOD_SOURCE_CACHE_DIR=os.path.join(CACHE_DIR, 'sources'),
+		PIFMOD_CACHE_DIR=os.path.join(CACHE_DIR, 'urlio'),
+		PIFMOD_SOCKET=os.path.join(CACHE_DIR, 'no-daemon.sock'))
+	env.update(overrides)
+	return env
+
 # test the expected use cases...
 def execute(command, **kwds):
 	args = shlex.split(command)
+	kwds['env'] = environment(**kwds.get('env', {}))
 	kwds['stdout'] = kwds.get('stdout', sub.PIPE)
 	kwds['stderr'] = kwds.get('stderr', sub.PIPE)
 	if kwds.has_key('stdin'):
@@ -59,8 +84,10 @@ def strdiff(a, b):
 
 class TestClass: # keep this the same
 	def setUp(self):
+		global CACHE_DIR
 		# construct objects and perform any necessary setup
 		self.pif_uid = 'fc836afc-773e-de46-f808-568265077c05'
+		CACHE_DIR = tempfile.mkdtemp()
 
 	def test_return_uid_Ifile(self):
 		rval, out, err = execute('pifmod -i data/pif.json uid')
@@ -234,6 +261,466 @@ class TestClass: # keep this the same
 									received.as_dictionary()), \
 			'{}'.format(strdiff(pif.dumps(expected), pif.dumps(received)))
 
+	def test_property_reduce(self):
+		# from a source file
+		rval, out, err = execute('pifmod -i data/pif.json property ' \
+			'--reduce=median,count data/pore-distribution.json volume')
+		assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+		props = dict((p['name'], p) for p in json.loads(out)['properties'])
+		assert 'volume' not in props
+		assert props['median volume'] == {'name' : 'median volume',
+			'scalars' : 4172.22, 'units' : '$\\mu$m^3'}
+		assert props['count volume'] == {'name' : 'count volume',
+			'scalars' : 3785}
+		# from a property of the PIF, with other units
+		tmpdir = tempfile.mkdtemp()
+		try:
+			ifile = os.path.join(tmpdir, 'volume.pif')
+			rval, out, err = execute('pifmod -i data/pif.json -o {} ' \
+				'property data/pore-distribution.json volume'.format(ifile))
+			rval, out, err = execute('pifmod -i {} property --units=um^3 ' \
+				'--reduce=p95 volume'.format(ifile))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			props = dict((p['name'], p) for p in json.loads(out)['properties'])
+			assert props['p95 volume']['units'] == 'um^3'
+			assert abs(props['p95 volume']['scalars'] - 43503.84) < 1e-6
+			# scalars cannot be reduced
+			rval, out, err = execute('pifmod -i {} property --reduce=mean ' \
+				'"median pore spacing"'.format(ifile))
+			assert rval != 0, 'Nonzero exit status expected.'
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_formats(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			ofile = os.path.join(tmpdir, 'volume.pif')
+			rval, out, err = execute('pifmod -i data/pif.json -o {} ' \
+				'property data/pore-distribution.json volume'.format(ofile))
+			with open(ofile) as ifs:
+				expected = pif.dumps(pif.load(ifs))
+			for fmt in ('gz', 'bz2', 'npz'):
+				# from the extension...
+				ofile = os.path.join(tmpdir, 'volume.pif.{}'.format(fmt))
+				rval, out, err = execute('pifmod -i data/pif.json -o {} ' \
+					'property data/pore-distribution.json volume'.format(ofile))
+				assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+				assert os.path.getsize(ofile) < 15000, fmt
+				# ...detected on read...
+				rval, out, err = execute('pifmod -i {} uid'.format(ofile))
+				assert out == self.pif_uid, fmt
+				rval, out, err = execute('pifmod -i {} -o {} property ' \
+					'--units=m new=1'.format(ofile, ofile + '.json'))
+				with open(ofile + '.json') as ifs:
+					received = pif.load(ifs)
+				received.properties.pop()
+				assert pif.dumps(received) == expected, fmt
+				# ...including from stdin
+				rval, out, err = execute('pifmod uid', stdin=ofile)
+				assert out == self.pif_uid, fmt
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_output_unchanged(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			ofile = os.path.join(tmpdir, 'out.pif')
+			command = 'pifmod -f -i data/pif.json -o {} property {}'
+			rval, out, err = execute(command.format(ofile, 'foo=bar'))
+			os.utime(ofile, (1000000000, 1000000000))
+			# identical output is not written
+			rval, out, err = execute(command.format(ofile, 'foo=bar'))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert os.stat(ofile).st_mtime == 1000000000
+			rval, out, err = execute(command.format(ofile, 'foo=baz'))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert os.stat(ofile).st_mtime != 1000000000
+			with open(ofile) as ifs:
+				assert pif.load(ifs).properties[-1].scalars == 'baz'
+			assert os.listdir(tmpdir) == ['out.pif']
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_diff_patch(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			new = os.path.join(tmpdir, 'new.pif.gz')
+			pfile = os.path.join(tmpdir, 'changes.json')
+			rval, out, err = execute('pifmod -i data/out_volume.pif -o {} ' \
+				'property --units=mm foo=bar'.format(new))
+			rval, out, err = execute('pifmod -o {} diff data/out_volume.pif ' \
+				'{}'.format(pfile, new))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			with open(pfile) as ifs:
+				ops = json.load(ifs)
+			assert ops == [{'op' : 'add', 'path' : '/properties/2',
+				'value' : {'name' : 'foo', 'scalars' : 'bar', 'units' : 'mm'}}]
+			rval, out, err = execute('pifmod -i data/out_volume.pif ' \
+				'patch {}'.format(pfile))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert pif.loads(out).properties[-1].name == 'foo'
+			rval, out, err = execute('pifmod diff - {}'.format(new),
+				stdin='data/out_volume.pif')
+			assert json.loads(out) == ops
+			# the reverse patch removes foo, once
+			rval, out, err = execute('pifmod -f -o {} diff {} ' \
+				'data/out_volume.pif'.format(pfile, new))
+			rval, out, err = execute('pifmod -f -i {0} -o {0} patch ' \
+				'{1}'.format(new, pfile))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			rval, out, err = execute('pifmod -i {} patch {}'.format(
+				new, pfile))
+			assert rval != 0, 'Nonzero exit status expected.'
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_select(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			with open('data/pif.json') as ifs:
+				record = json.load(ifs)
+			package = []
+			for i in range(4):
+				package.append(dict(record, uid='u{}'.format(i)))
+			ifile = os.path.join(tmpdir, 'package.json')
+			ofile = os.path.join(tmpdir, 'out.json')
+			with open(ifile, 'w') as ofs:
+				json.dump(package, ofs)
+			# every record of a package
+			rval, out, err = execute('pifmod -i {} uid'.format(ifile))
+			assert out.split() == ['u0', 'u1', 'u2', 'u3']
+			rval, out, err = execute('pifmod -i {} -o {} --select uid=u1 ' \
+				'--select uid=u3 property foo=bar'.format(ifile, ofile))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			with open(ofile) as ifs:
+				received = pif.load(ifs)
+			assert [len(r.properties) for r in received] == [1, 2, 1, 2]
+			rval, out, err = execute('pifmod -i {} --select property:foo=BAR ' \
+				'--select "plate number=3" uid'.format(ofile))
+			assert out.split() == ['u1', 'u3']
+			# nothing selected, nothing written
+			rval, out, err = execute('pifmod -i {} --select uid=u9 ' \
+				'property foo=baz'.format(ofile))
+			assert rval == 0 and empty(out)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_workers(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			with open('data/pif.json') as ifs:
+				record = json.load(ifs)
+			package = []
+			for i in range(9):
+				package.append(dict(record, uid='u{}'.format(i)))
+			ifile = os.path.join(tmpdir, 'package.json')
+			with open(ifile, 'w') as ofs:
+				json.dump(package, ofs)
+			# the workers' output is that of a single process
+			for cmd in ('property --units=mm foo=bar', 'uid',
+						'--select uid=u4 --select uid=u7 property foo=bar'):
+				serial = os.path.join(tmpdir, 'serial.json')
+				parallel = os.path.join(tmpdir, 'parallel.json')
+				rval, out, err = execute('pifmod -f -i {} -o {} {}'.format(
+					ifile, serial, cmd))
+				assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+				rval, out, err = execute('pifmod -f --workers 3 -i {} -o {} ' \
+					'{}'.format(ifile, parallel, cmd))
+				assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+				with open(serial) as a, open(parallel) as b:
+					assert a.read() == b.read(), cmd
+			# an error in a worker is that of the command
+			rval, out, err = execute('pifmod --workers 3 -i {} ' \
+				'property foo=baz'.format(parallel))
+			assert rval != 0
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_store(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			with open('data/pif.json') as ifs:
+				record = json.load(ifs)
+			ifile = os.path.join(tmpdir, 'package.json')
+			with open(ifile, 'w') as ofs:
+				json.dump([dict(record, uid='u{}'.format(i))
+						   for i in range(3)], ofs)
+			db = os.path.join(tmpdir, 'pifs.db')
+			rval, out, err = execute('pifmod store --db {} ingest ' \
+				'"{}/*.json"'.format(db, tmpdir))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert out.splitlines()[0].endswith('3 added, 0 replaced, ' \
+				'0 skipped'), out
+			rval, out, err = execute('pifmod store --db {} --record u1 ' \
+				'property foo=bar'.format(db))
+			assert rval == 0 and empty(out)
+			rval, out, err = execute('pifmod --select property:foo=bar ' \
+				'store --db {} uid'.format(db))
+			assert out.split() == ['u1']
+			rval, out, err = execute('pifmod store --db {} export'.format(db))
+			received = pif.loads(out)
+			assert [len(r.properties) for r in received] == [1, 2, 1]
+			rval, out, err = execute('pifmod store --db {} --record u9 ' \
+				'uid'.format(db))
+			assert rval != 0
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_batch_property_add(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			indir = os.path.join(tmpdir, 'in')
+			outdir = os.path.join(tmpdir, 'out')
+			os.mkdir(indir)
+			for i in range(4):
+				shutil.copy('data/pif.json',
+							os.path.join(indir, 'pif{}.json'.format(i)))
+			rval, out, err = execute('pifmod batch -j 2 ' \
+				'--inputs "{}/*.json" --outdir {} ' \
+				'property --units=mm foo=bar'.format(indir, outdir))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert out.splitlines()[-1] == '4 succeeded, 0 failed', out
+			with open('data/out_units.pif') as ifs:
+				expected = pif.load(ifs).as_dictionary()
+			received = sorted(glob.glob(os.path.join(outdir, '*.json')))
+			assert len(received) == 4
+			for filename in received:
+				with open(filename) as ifs:
+					assert pif.load(ifs).as_dictionary() == expected
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_batch_reports_failures(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			shutil.copy('data/pif.json', os.path.join(tmpdir, 'good.json'))
+			with open(os.path.join(tmpdir, 'bad.json'), 'w') as ofs:
+				ofs.write('{not json')
+			rval, out, err = execute('pifmod batch ' \
+				'--inputs "{0}/*.json" --outdir {0}/out ' \
+				'uid {1}'.format(tmpdir, 'not-the-uid'))
+			lines = out.splitlines()
+			assert rval != 0, 'Nonzero exit status expected.'
+			assert lines[-1] == '0 succeeded, 2 failed', out
+			assert any(l.startswith('FAILED') and 'bad.json' in l
+					   for l in lines)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_batch_output_collision(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			for d in ('a', 'b'):
+				os.mkdir(os.path.join(tmpdir, d))
+				shutil.copy('data/pif.json', os.path.join(tmpdir, d, 'pif.json'))
+			rval, out, err = execute('pifmod batch ' \
+				'--inputs "{0}/*/pif.json" --outdir {0}/out ' \
+				'property foo=bar'.format(tmpdir))
+			lines = out.splitlines()
+			assert rval != 0, 'Nonzero exit status expected.'
+			assert len(lines) == 1 and lines[0].startswith('FAILED') and \
+				os.path.join(tmpdir, 'b', 'pif.json') in lines[0], out
+			# nothing is written
+			assert not os.path.exists(os.path.join(tmpdir, 'out'))
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_jsonl_property_add_stdin(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			with open('data/pif.json') as ifs:
+				record = json.dumps(json.load(ifs))
+			ifile = os.path.join(tmpdir, 'package.jsonl')
+			with open(ifile, 'w') as ofs:
+				ofs.write('\n'.join(3*[record]) + '\n')
+			rval, out, err = execute('pifmod --jsonl property --units=mm ' \
+				'foo=bar', stdin=ifile)
+			with open('data/out_units.pif') as ifs:
+				expected = pif.load(ifs).as_dictionary()
+			lines = out.splitlines()
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert len(lines) == 3
+			for line in lines:
+				assert pif.loads(line).as_dictionary() == expected
+			assert empty(err)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_apply_edits(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			edits = [
+				{'op' : 'set', 'name' : 'foo', 'value' : 'bar',
+				 'units' : 'mm', 'conditions' : ['laser=95=%']},
+				{'op' : 'import', 'file' : 'data/pore-distribution.json',
+				 'name' : 'volume'},
+				{'op' : 'uid', 'uid' : 'abc', 'force' : True}]
+			efile = os.path.join(tmpdir, 'edits.json')
+			ofile = os.path.join(tmpdir, 'out.pif')
+			with open(efile, 'w') as ofs:
+				json.dump(edits, ofs)
+			rval, out, err = execute('pifmod -i data/pif.json -o {} ' \
+				'apply {} --set baz=[1,2]'.format(ofile, efile))
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			with open(ofile) as ifs:
+				received = json.load(ifs)
+			props = dict((p['name'], p) for p in received['properties'])
+			assert received['uid'] == 'abc'
+			assert props['foo']['scalars'] == 'bar'
+			assert props['foo']['units'] == 'mm'
+			assert props['foo']['conditions'][0]['units'] == '%'
+			assert len(props['volume']['vectors']) == 3785
+			assert props['baz']['vectors'] == [1, 2]
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_apply_edits_atomic(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			# the second edit is invalid, so nothing is written
+			edits = [{'op' : 'set', 'name' : 'foo', 'value' : 'bar'},
+					 {'op' : 'set', 'name' : 'foo', 'value' : 'baz'}]
+			efile = os.path.join(tmpdir, 'edits.json')
+			ofile = os.path.join(tmpdir, 'out.pif')
+			with open(efile, 'w') as ofs:
+				json.dump(edits, ofs)
+			rval, out, err = execute('pifmod -i data/pif.json -o {} ' \
+				'apply {}'.format(ofile, efile))
+			assert rval != 0, 'Nonzero exit status expected.'
+			assert not os.path.exists(ofile)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_serve(self):
+		tmpdir = tempfile.mkdtemp()
+		socket_path = os.path.join(tmpdir, 'pifmod.sock')
+		env = {'PIFMOD_SOCKET' : socket_path}
+		daemon = sub.Popen(['pifmod', 'serve'], env=environment(**env),
+						   stdout=sub.PIPE, stderr=sub.PIPE)
+		try:
+			for i in range(100):
+				if os.path.exists(socket_path): break
+				time.sleep(0.05)
+			# answered by the daemon
+			response = client.request({'argv' : ['-i', 'data/pif.json', 'uid'],
+									   'cwd' : os.getcwd()}, socket_path)
+			assert response['status'] == 'ok', response
+			assert response['output'].strip() == self.pif_uid
+			# forwarded by the command line client, with stdin
+			rval, out, err = execute('pifmod property "median pore spacing"',
+									 stdin='data/pif.json', env=env)
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert json.loads(out)['scalars'] == 50.40827706835452
+			rval, out, err = execute(
+				'pifmod -i data/pif.json uid 12345678987654321', env=env)
+			assert rval != 0, 'Nonzero exit status expected.'
+			# written by the client, over an existing file with -f
+			ofile = os.path.join(tmpdir, 'out.json')
+			open(ofile, 'w').close()
+			rval, out, err = execute('pifmod -f -i data/pif.json -o {} ' \
+				'property "median pore spacing"'.format(ofile), env=env)
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			with open(ofile) as ifs:
+				assert json.load(ifs)['scalars'] == 50.40827706835452
+			# input that is not UTF-8 is handed back for the in-process run
+			text = '{"uid" : "caf\xe9"}'
+			stdin = sys.stdin
+			try:
+				sys.stdin = StringIO(text)
+				assert client.run(['uid'], socket_path) is None
+				assert sys.stdin.read() == text
+			finally:
+				sys.stdin = stdin
+		finally:
+			daemon.terminate()
+			daemon.wait()
+			shutil.rmtree(tmpdir)
+
+	def test_timings_profile(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			tfile = os.path.join(tmpdir, 'timings.jsonl')
+			pfile = os.path.join(tmpdir, 'pifmod.prof')
+			for i in range(2):
+				rval, out, err = execute('pifmod -v -i data/pif.json ' \
+					'--timings {} --profile {} --no-source-cache property ' \
+					'data/pore-distribution.json volume'.format(tfile, pfile))
+				assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert pif.loads(out).properties[-1].name == 'volume'
+			# -v writes the record to stderr, --timings appends it to FILE
+			record = json.loads(err)
+			assert record['action'] == 'property'
+			with open(tfile) as ifs:
+				records = [json.loads(l) for l in ifs]
+			assert len(records) == 2
+			assert records[-1] == record
+			phases = record['phases']
+			for name in ('read', 'parse', 'action', 'serialize', 'write'):
+				assert phases[name]['calls'] > 0, name
+			# the input PIF and the source file, up to the property
+			assert os.path.getsize('data/pif.json') < \
+				phases['read']['bytes'] <= \
+				os.path.getsize('data/pif.json') + \
+				os.path.getsize('data/pore-distribution.json')
+			assert phases['write']['bytes'] == phases['serialize']['bytes'] == \
+				len(out)
+			assert sum(p['seconds'] for p in phases.values()) <= \
+				record['total']
+			stats = pstats.Stats(pfile)
+			assert any(func[2] == 'perform' for func in stats.stats)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_property_source_cache(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			env = {'PIFMOD_SOURCE_CACHE_DIR' : tmpdir}
+			command = 'pifmod -i data/pif.json {} property ' \
+				'data/pore-distribution.json volume'
+			# bypassed
+			rval, out, err = execute(command.format('--no-source-cache'),
+									 env=env)
+			assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+			assert os.listdir(tmpdir) == []
+			expected = out
+			# stored, then reused
+			for i in range(2):
+				rval, out, err = execute(command.format(''), env=env)
+				assert rval == 0, 'Nonzero ({}) exit status.'.format(rval)
+				assert out == expected
+				assert sorted(os.path.splitext(f)[1]
+							  for f in os.listdir(tmpdir)) == ['.json', '.npz']
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_source_memory_bound(self):
+		# a daemon keeps only the MAX_SOURCES most recently used files
+		from pifmod import main
+		tmpdir = tempfile.mkdtemp()
+		max_sources = main.MAX_SOURCES
+		try:
+			main.args = main.build_parser().parse_args(
+				['--no-source-cache', 'uid'])
+			main.MAX_SOURCES = 2
+			sources = []
+			for i in range(3):
+				sources.append(os.path.join(tmpdir, '{}.json'.format(i)))
+				with open(sources[-1], 'w') as ofs:
+					json.dump({'foo' : i}, ofs)
+			for filename in sources[:2] + sources[:1] + sources[2:]:
+				assert main.source_property(filename, 'foo').scalars == \
+					int(os.path.basename(filename)[0])
+			assert [key[0] for key in main._source_properties] == \
+				[os.path.abspath(sources[0]), os.path.abspath(sources[2])]
+			main.load_source(sources[1])
+			main.load_source(sources[2])
+			main.load_source(sources[0])
+			assert len(main._sources) == 2
+		finally:
+			main.MAX_SOURCES = max_sources
+			main.clear_sources()
+			shutil.rmtree(tmpdir)
+
 	def test_linkages_sagittariidae(self):
 		# try:
 		with open('data/package.json') as ifs:
@@ -259,5 +746,6 @@ class TestClass: # keep this the same
 
 	def tearDown(self):
 		# clean up
+		shutil.rmtree(CACHE_DIR)
 		if os.path.isfile('data/test.pif'):
 			os.remove('data/test.pif')
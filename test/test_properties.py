@@ -0,0 +1,36 @@
+from pypif.pif import Property
+from pifmod.properties import PropertyIndex
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		self.plist = [Property(name, scalars=i)
+					  for i,name in enumerate(['a', 'B', 'c', 'b'])]
+		self.index = PropertyIndex(self.plist)
+
+	def test_get(self):
+		assert self.index.get('A').scalars == 0
+		# first match wins
+		assert self.index.get('b').scalars == 1
+		assert self.index.get('missing') is None
+		assert self.index.duplicates == set(['b'])
+
+	def test_add_replace(self):
+		self.index.add(Property('D', scalars=4))
+		self.index.replace(Property('c', scalars=5))
+		self.index.replace(Property('e', scalars=6))
+		assert [p.scalars for p in self.plist] == [0, 1, 5, 3, 4, 6]
+		assert self.index.get('d') is self.plist[4]
+		assert self.index.get('E') is self.plist[5]
+
+	def test_remove(self):
+		assert self.index.remove('a').scalars == 0
+		assert self.index.get('c') is self.plist[1]
+		# removing the first "b" exposes the second
+		assert self.index.remove('B').scalars == 1
+		assert self.index.get('b').scalars == 3
+		assert self.index.duplicates == set()
+		assert self.index.names() == ['c', 'b']
@@ -0,0 +1,52 @@
+import numpy as np
+from pypif import pif
+from pifmod import reductions
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def test_parse_reductions(self):
+		assert reductions.parse_reductions('median, MEAN,p95,p99.9,count') == \
+			['median', 'mean', 'p95', 'p99.9', 'count']
+		for spec in ('', 'mode', 'p101', 'p', 'median,pX'):
+			try:
+				reductions.parse_reductions(spec)
+				assert False, 'ValueError expected for "{}"'.format(spec)
+			except ValueError:
+				pass
+
+	def test_reduce_values(self):
+		values = [4, 1, 3, 2, 10]
+		received = dict(reductions.reduce_values(values,
+			['count', 'sum', 'mean', 'std', 'min', 'max', 'median', 'p25']))
+		assert received['count'] == 5
+		assert isinstance(received['count'], int)
+		assert received['sum'] == 20
+		assert received['mean'] == 4.
+		assert abs(received['std'] - np.std(values)) < 1e-12
+		assert (received['min'], received['max']) == (1, 10)
+		assert received['median'] == 3.
+		assert received['p25'] == 2.
+		# matrices are reduced over all elements; order is kept
+		assert reductions.reduce_values(np.array([[1., 2.], [3., 4.]]),
+			['max', 'median']) == [('max', 4.), ('median', 2.5)]
+
+	def test_reduce_scalars(self):
+		# Scalars, as dictionaries or objects, are reduced by value
+		values = [{'value' : 4}, {'value' : 1, 'units' : 'mm'},
+				  pif.Scalar(value=3), 2]
+		assert reductions.reduce_values(values, ['sum', 'max']) == \
+			[('sum', 10), ('max', 4)]
+		assert reductions.reduce_values([[{'value' : 1.}, {'value' : 3.}]],
+			['mean']) == [('mean', 2.)]
+
+	def test_reduce_invalid(self):
+		for values in ([u'a', u'b'], [], [[1, 2], [3]]):
+			try:
+				reductions.reduce_values(values, ['mean'])
+				assert False, 'ValueError expected for {}'.format(values)
+			except ValueError:
+				pass
+		assert reductions.reduce_values([], ['count']) == [('count', 0)]
@@ -0,0 +1,174 @@
+import json
+import os
+import shlex
+import subprocess as sub
+from pypif import pif
+from pifmod.linkages import sagittariidae
+from . import mockserver
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class Handler(mockserver.Handler):
+	"""
+	Mock sagittariidae catalogue: serves /projects/PROJECT/samples and
+	/projects/PROJECT/samples/ID from Handler.projects, recording the
+	paths requested.
+	"""
+	projects = {}
+	requests = []
+
+	def do_GET(self):
+		Handler.requests.append(self.path)
+		parts = self.path.strip('/').split('/')
+		try:
+			samples = Handler.projects[parts[1]]
+			if len(parts) == 3:
+				body = json.dumps(samples)
+			else:
+				body = json.dumps([s for s in samples if s['id'] == parts[3]][0])
+		except (IndexError, KeyError):
+			self.send_error(404)
+			return
+		self.send_body(body)
+
+def record(plate, build, column, row):
+	"""Copy of data/pif.json with the given sample name details."""
+	with open('data/pif.json') as ifs:
+		p = pif.load(ifs)
+	values = {'plate number' : plate, 'build' : build,
+			  'column' : column, 'row' : row}
+	for d in p.preparation[0].details:
+		if d.name in values:
+			d.scalars = values[d.name]
+	return p
+
+class TestClass: # keep this the same
+	def setUp(self):
+		Handler.projects = {'proj' : [
+			{'id' : 'a1', 'name' : 'P002_B001_N02'},
+			{'id' : 'a2', 'name' : 'P002_B001_N03'},
+			{'id' : 'a3', 'name' : 'P002_B001_N04'},
+			{'id' : 'a4', 'name' : 'P002_B001_N04'}]}
+		Handler.requests = []
+		self.mock = mockserver.MockServer(Handler)
+		self.host = self.mock.host
+		self.cachedir = self.mock.cachedir
+
+	def environment(self):
+		# commands run with the test's URL cache and without a daemon
+		return dict(os.environ, PIFMOD_CACHE_DIR=self.cachedir,
+			PIFMOD_SOCKET=os.path.join(self.cachedir, 'no-daemon.sock'))
+
+	def test_index_samples(self):
+		index, duplicates = sagittariidae.index_samples(
+			Handler.projects['proj'])
+		assert index == {'P002_B001_N02' : 'a1', 'P002_B001_N03' : 'a2'}
+		assert duplicates == set(['P002_B001_N04'])
+
+	def test_link_all(self):
+		records = [record(2, 1, 'N', 2), record(2, 1, 'N', 3),
+				   record(2, 1, 'N', 4), record(9, 9, 'Z', 9)]
+		add_link = sagittariidae.link_factory('proj', host=self.host)
+		summary = add_link.link_all(records)
+		assert summary['linked'] == ['P002_B001_N02', 'P002_B001_N03']
+		assert summary['missing'] == ['P002_B001_N04', 'P009_B009_Z09']
+		assert summary['ambiguous'] == ['P002_B001_N04']
+		assert records[0].sagittariidae.url == \
+			'{}/projects/proj/samples/a1'.format(self.host)
+		assert getattr(records[3], 'sagittariidae', None) is None
+
+	def test_catalogue_cached(self):
+		# the catalogue is fetched once per TTL unless refreshed
+		for refresh in (False, False, True):
+			sagittariidae.link_factory('proj', host=self.host,
+									   refresh=refresh)
+		assert Handler.requests == 2*['/projects/proj/samples'], \
+			Handler.requests
+
+	def test_multi_project(self):
+		Handler.projects['other'] = [
+			{'id' : 'b1', 'name' : 'P003_B001_N02'},
+			{'id' : 'b2', 'name' : 'P002_B001_N03'}]
+		records = [record(2, 1, 'N', 2), record(3, 1, 'N', 2),
+				   record(2, 1, 'N', 3)]
+		add_link = sagittariidae.multi_link_factory(
+			[(self.host, 'proj'), (self.host, 'other')], jobs=2)
+		summary = add_link.link_all(records)
+		assert summary['linked'] == ['P002_B001_N02', 'P003_B001_N02']
+		assert summary['ambiguous'] == ['P002_B001_N03']
+		assert records[1].sagittariidae.url == \
+			'{}/projects/other/samples/b1'.format(self.host)
+
+	def test_sagittariidae_action(self):
+		env = self.environment()
+		command = 'pifmod -i data/pif.json sagittariidae ' \
+			'--project proj@{}'.format(self.host)
+		p = sub.Popen(shlex.split(command), stdout=sub.PIPE, stderr=sub.PIPE,
+					  env=env)
+		out, err = p.communicate()
+		assert p.returncode == 0, err
+		received = json.loads(out)
+		assert received['sagittariidae']['url'] == \
+			'{}/projects/proj/samples/a1'.format(self.host)
+
+	def test_enrich_action(self):
+		env = self.environment()
+		command = 'pifmod -i data/pif.json sagittariidae ' \
+			'--project proj@{} --enrich "name=sample name" --enrich id ' \
+			'-j 2 --rate 50'.format(self.host)
+		p = sub.Popen(shlex.split(command), stdout=sub.PIPE, stderr=sub.PIPE,
+					  env=env)
+		out, err = p.communicate()
+		assert p.returncode == 0, err
+		received = pif.loads(out)
+		assert [(prop.name, prop.scalars) for prop in
+				received.properties[-2:]] == \
+			[('sample name', 'P002_B001_N02'), ('id', 'a1')]
+
+	def test_snapshot(self):
+		snapshot = os.path.join(self.cachedir, 'samples.snapshot')
+		sagittariidae.write_snapshot(snapshot, [(self.host, 'proj')])
+		# linking reads the snapshot only
+		Handler.projects = {}
+		records = [record(2, 1, 'N', 2), record(2, 1, 'N', 4)]
+		add_link = sagittariidae.snapshot_link_factory(snapshot)
+		summary = add_link.link_all(records)
+		assert summary['linked'] == ['P002_B001_N02']
+		assert summary['ambiguous'] == ['P002_B001_N04']
+		assert records[0].sagittariidae.url == \
+			'{}/projects/proj/samples/a1'.format(self.host)
+		try:
+			sagittariidae.snapshot_link_factory(snapshot,
+				[(self.host, 'other')])
+			assert False, 'Project not in the snapshot was linked.'
+		except sagittariidae.SnapshotError:
+			pass
+
+	def test_snapshot_action(self):
+		env = self.environment()
+		snapshot = os.path.join(self.cachedir, 'samples.snapshot')
+		command = 'pifmod sagittariidae --project proj@{} ' \
+			'--snapshot {}'.format(self.host, snapshot)
+		p = sub.Popen(shlex.split(command), stdout=sub.PIPE, stderr=sub.PIPE,
+					  env=env)
+		out, err = p.communicate()
+		assert p.returncode == 0, err
+		Handler.projects = {}
+		command = 'pifmod -i data/pif.json sagittariidae ' \
+			'--catalog {}'.format(snapshot)
+		for max_age, stale in (('3600', False), ('-1', True)):
+			env['PIFMOD_SNAPSHOT_MAX_AGE'] = max_age
+			p = sub.Popen(shlex.split(command), stdout=sub.PIPE,
+						  stderr=sub.PIPE, env=env)
+			out, err = p.communicate()
+			assert p.returncode == 0, err
+			assert ('days old' in err) == stale, err
+			received = json.loads(out)
+			assert received['sagittariidae']['url'] == \
+				'{}/projects/proj/samples/a1'.format(self.host)
+
+	def tearDown(self):
+		# clean up
+		self.mock.close()
@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import tempfile
+from pifmod import scan
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.tmpdir, 'source.json')
+		# strings that contain brackets, quotes and escapes must not
+		# confuse the scan
+		self.text = '{ "a": {"values": [1, 2, 3], "units": "m]m"},\n' \
+			'  "b\\"]": "x\\\\" ,"C" : [[1.5, -2e3], [3, 4]],\n' \
+			'"d": null, "e": true, "f": -1.25e-3 , "a": "second"}'
+		with open(self.filename, 'w') as ofs:
+			ofs.write(self.text)
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def test_keys(self):
+		assert scan.keys(self.filename) == \
+			['a', 'b"]', 'C', 'd', 'e', 'f', 'a']
+
+	def test_extract(self):
+		assert scan.extract(self.filename, 'b"]')[1] == 'x\\'
+		key, value, nbytes = scan.extract(self.filename, 'c')
+		assert (key, value) == ('C', [[1.5, -2e3], [3, 4]])
+		# only the prefix up to the value was scanned
+		assert nbytes == self.text.index(']],') + 2
+		assert scan.extract(self.filename, 'd')[1] is None
+		assert scan.extract(self.filename, 'e')[1] is True
+		assert scan.extract(self.filename, 'f')[1] == -1.25e-3
+		# first occurrence wins
+		assert scan.extract(self.filename, 'a')[1]['units'] == 'm]m'
+		assert scan.extract(self.filename, 'missing') is None
+
+	def test_malformed(self):
+		for text in ('', '[1, 2]', '{"a": [1, 2}', '{"a" 1}', '{"a": "b'):
+			with open(self.filename, 'w') as ofs:
+				ofs.write(text)
+			try:
+				scan.keys(self.filename)
+				assert False, 'ScanError expected for {}'.format(text)
+			except scan.ScanError:
+				pass
+
+	def test_pore_distribution(self):
+		filename = 'data/pore-distribution.json'
+		with open(filename) as ifs:
+			jdata = json.load(ifs)
+		assert sorted(scan.keys(filename)) == sorted(jdata.keys())
+		for name in jdata:
+			assert scan.extract(filename, name)[1] == jdata[name], name
@@ -0,0 +1,51 @@
+import copy
+from pypif import pif
+from pifmod.selection import RecordIndex, SelectionError, parse_selection
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		with open('data/pif.json') as ifs:
+			record = pif.load(ifs)
+		self.records = []
+		for i in range(6):
+			r = copy.deepcopy(record)
+			r.uid = 'u{}'.format(i)
+			for detail in r.preparation[0].details:
+				if detail.name == 'plate number':
+					detail.scalars = i % 3
+				elif detail.name == 'build':
+					detail.scalars = str(i % 2)
+			if i == 4:
+				r.properties.append(pif.Property(name='Mass', scalars=[1, 2.5]))
+			self.records.append(r)
+		self.index = RecordIndex(self.records)
+
+	def select(self, *specs):
+		return self.index.select([parse_selection(s) for s in specs])
+
+	def test_parse(self):
+		assert parse_selection(' uid=a, property:foo ,property:Bar=1, x=y') == \
+			[('uid', None, 'a'), ('property', 'foo', None),
+			 ('property', 'Bar', '1'), ('detail', 'x', 'y')]
+		for spec in ('', 'plate number', 'property:', '=2'):
+			try:
+				parse_selection(spec)
+				assert False, spec
+			except SelectionError:
+				pass
+
+	def test_select(self):
+		assert self.select('uid=u3') == [3]
+		# numbers match numeric strings and floats
+		assert self.select('plate number=2,build=1') == [5]
+		assert self.select('Plate Number=1.0') == [1, 4]
+		assert self.select('plate number=2', 'uid=u0') == [0, 2, 5]
+		assert self.select('property:mass') == [4]
+		assert self.select('property:mass=2.5,build=0') == [4]
+		assert self.select('property:median pore spacing') == range(6)
+		assert self.select('uid=u3,build=0') == []
+		assert self.select('column=n') == range(6)
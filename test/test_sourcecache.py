@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from pifmod import sourcecache
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		self.cachedir = tempfile.mkdtemp()
+		self.settings = (sourcecache.CACHE_DIR, sourcecache.CACHE_MAX_SIZE,
+						 sourcecache.ENABLED)
+		sourcecache.configure_cache(directory=self.cachedir,
+									max_size=1024**2, enabled=True)
+		self.source = ('/data/source.json', 1234, 1500000000.25)
+
+	def tearDown(self):
+		directory, max_size, enabled = self.settings
+		sourcecache.configure_cache(directory=directory, max_size=max_size,
+									enabled=enabled)
+		shutil.rmtree(self.cachedir)
+
+	def test_roundtrip(self):
+		fields = {'name' : 'volume', 'units' : 'mm^3',
+				  'vectors' : np.arange(5, dtype=float)}
+		assert sourcecache.get(self.source, 'Volume') is None
+		sourcecache.put(self.source, 'volume', fields)
+		received = sourcecache.get(self.source, 'VOLUME')
+		assert received['name'] == 'volume'
+		assert received['units'] == 'mm^3'
+		assert received['vectors'].dtype == fields['vectors'].dtype
+		assert (received['vectors'] == fields['vectors']).all()
+		# strings and ragged (non-array) values
+		sourcecache.put(self.source, 'labels',
+			{'name' : 'labels', 'vectors' : np.array([u'a', u'bc']),
+			 'matrices' : [[1], [2, 3]]})
+		received = sourcecache.get(self.source, 'labels')
+		assert list(received['vectors']) == [u'a', u'bc']
+		assert received['matrices'] == [[1], [2, 3]]
+		sourcecache.put_names(self.source, ['volume', 'labels'])
+		assert sourcecache.get_names(self.source) == ['volume', 'labels']
+
+	def test_source_changed(self):
+		sourcecache.put(self.source, 'x', {'name' : 'x', 'scalars' : 1})
+		path, size, mtime = self.source
+		assert sourcecache.get((path, size, mtime + 1), 'x') is None
+		assert sourcecache.get((path, size + 1, mtime), 'x') is None
+		assert sourcecache.get(self.source, 'x')['scalars'] == 1
+
+	def test_disabled(self):
+		sourcecache.configure_cache(enabled=False)
+		sourcecache.put(self.source, 'x', {'name' : 'x', 'scalars' : 1})
+		assert os.listdir(self.cachedir) == []
+		sourcecache.configure_cache(enabled=True)
+		sourcecache.put(self.source, 'x', {'name' : 'x', 'scalars' : 1})
+		sourcecache.configure_cache(enabled=False)
+		assert sourcecache.get(self.source, 'x') is None
+
+	def test_eviction(self):
+		sourcecache.configure_cache(max_size=200*1024)
+		column = np.zeros(10000)  # ~80 kB
+		for i,name in enumerate(('a', 'b', 'c')):
+			sourcecache.put(self.source, name,
+							{'name' : name, 'vectors' : column})
+			# last accessed i hours ago
+			atime = time.time() - 3600*(3 - i)
+			os.utime(sourcecache._cache_paths(self.source, name)[0],
+					 (atime, atime))
+		# the least recently used entry was evicted
+		assert sourcecache.get(self.source, 'a') is None
+		assert sourcecache.get(self.source, 'b') is not None
+		assert sourcecache.get(self.source, 'c') is not None
+		sourcecache.clear_cache()
+		assert os.listdir(self.cachedir) == []
@@ -0,0 +1,61 @@
+import json
+import subprocess
+import sys
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+# Modules that must not be loaded by "import pifmod.main", i.e. before
+# an action is chosen. For a per-module report of import times, run
+# benchmarks/bench_startup.py.
+DEFERRED = ['pypif', 'numpy', 'pifmod.columns', 'pifmod.values',
+	'pifmod.linkages', 'pifmod.urlio', 'httplib', 'multiprocessing',
+	'SocketServer', 'pifmod.store', 'sqlite3']
+# Time (s) to import pifmod.main, best of REPEAT fresh interpreters.
+# This was ~0.12 s with the modules above imported eagerly and is
+# ~0.03 s without them.
+STARTUP_BUDGET = 0.075
+REPEAT = 5
+
+def loaded_modules(code):
+	"""
+	Runs CODE in a fresh interpreter and returns the names of the
+	modules it has loaded.
+	"""
+	code += '\nimport sys, json\n' \
+			'print json.dumps([k for k,v in sys.modules.items() if v])'
+	output = subprocess.check_output([sys.executable, '-c', code])
+	return set(json.loads(output.strip().splitlines()[-1]))
+
+def deferred(modules):
+	return sorted(m for m in modules
+				  if any(m == d or m.startswith(d + '.') for d in DEFERRED))
+
+class TestClass: # keep this the same
+	def test_import_main(self):
+		assert deferred(loaded_modules('import pifmod.main')) == []
+
+	def test_uid_imports(self):
+		# uid reads the PIF (pypif), but needs neither the linkages
+		# nor the worker/daemon machinery
+		modules = loaded_modules(
+			'from pifmod import main\n'
+			'main.args = main.build_parser().parse_args(\n'
+			'    ["-i", "data/pif.json", "-f", "uid", "abc"])\n'
+			'main.perform(main.read_pif(main.args.ifile), "uid")')
+		assert 'pypif' in modules
+		for module in ('pifmod.linkages', 'pifmod.urlio', 'httplib',
+					   'multiprocessing', 'SocketServer'):
+			assert module not in modules, module
+
+	def test_startup_budget(self):
+		code = 'import time\n' \
+			   't = time.time()\n' \
+			   'import pifmod.main\n' \
+			   'print time.time() - t'
+		best = min(float(subprocess.check_output(
+						[sys.executable, '-c', code]))
+				   for i in range(REPEAT))
+		assert best < STARTUP_BUDGET, \
+			'importing pifmod.main took {:.3f} s'.format(best)
@@ -0,0 +1,87 @@
+import copy
+import os
+import shutil
+import tempfile
+from pypif import pif
+from pifmod.selection import RecordIndex, parse_selection
+from pifmod.store import Store, StoreError
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		with open('data/pif.json') as ifs:
+			record = pif.load(ifs)
+		self.records = []
+		for i in range(6):
+			r = copy.deepcopy(record)
+			r.uid = 'u{}'.format(i)
+			for detail in r.preparation[0].details:
+				if detail.name == 'plate number':
+					detail.scalars = i % 3
+			if i == 4:
+				r.properties.append(pif.Property(name='Mass', scalars=[1, 2.5]))
+			self.records.append(r)
+		self.tmpdir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.tmpdir, 'pifs.db')
+		with Store(self.filename) as store:
+			for r in self.records:
+				assert store.add(r, source='data/pif.json') == 'added'
+
+	def test_select(self):
+		# the indexes answer selections as RecordIndex does
+		index = RecordIndex(self.records)
+		with Store(self.filename) as store:
+			assert len(store) == 6
+			for specs in (['uid=u3'], ['plate number=2'], ['property:mass'],
+						  ['property:mass=2.5', 'plate number=0'],
+						  ['plate number=1,property:volume']):
+				selections = [parse_selection(s) for s in specs]
+				assert [i - 1 for i in store.ids(selections=selections)] == \
+					index.select(selections), specs
+			assert store.ids(uids=['u5'], selections=[
+				parse_selection('plate number=0')]) == [1, 4, 6]
+
+	def test_add_update(self):
+		with Store(self.filename) as store:
+			record = copy.deepcopy(self.records[1])
+			record.properties.append(pif.Property(name='foo', scalars='bar'))
+			assert store.add(record) == 'skipped'
+			assert store.ids(selections=[parse_selection('property:foo')]) == []
+			assert store.add(record, replace=True) == 'replaced'
+			assert store.ids(selections=[parse_selection('property:foo')]) == [2]
+			rowid, loaded = store.load([2])[0]
+			loaded.uid = 'u0'
+			try:
+				store.update(rowid, loaded)
+				assert False, 'Duplicate UID was stored.'
+			except StoreError:
+				pass
+			loaded.uid = 'new'
+			store.update(rowid, loaded)
+			assert store.ids(uids=['new']) == [2]
+		# committed
+		with Store(self.filename) as store:
+			assert pif.loads(store.texts([2])[0]).uid == 'new'
+			try:
+				store.ids(uids=['u1'])
+				assert False, 'Missing UID was found.'
+			except StoreError:
+				pass
+
+	def test_add_without_uid(self):
+		# identified by content rather than duplicated
+		record = copy.deepcopy(self.records[0])
+		record.uid = None
+		with Store(self.filename) as store:
+			assert store.add(record) == 'added'
+			assert store.add(copy.deepcopy(record), replace=True) == 'skipped'
+			assert len(store) == 7
+			record.properties.append(pif.Property(name='foo', scalars='bar'))
+			assert store.add(record) == 'added'
+			assert len(store) == 8
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
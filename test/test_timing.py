@@ -0,0 +1,38 @@
+import time
+from pifmod import timing
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def setUp(self):
+		timing.reset()
+
+	def test_nested_phases(self):
+		with timing.phase('action'):
+			time.sleep(0.02)
+			with timing.phase('serialize'):
+				time.sleep(0.05)
+		timing.add_bytes('serialize', 10)
+		record = timing.report()
+		phases = record['phases']
+		# nested time is charged to the inner phase only
+		assert 0.015 < phases['action']['seconds'] < 0.045, phases
+		assert phases['serialize']['seconds'] >= 0.045, phases
+		assert phases['serialize']['bytes'] == 10
+		assert phases['action']['calls'] == phases['serialize']['calls'] == 1
+		assert record['total'] >= phases['action']['seconds'] + \
+			phases['serialize']['seconds']
+
+	def test_merge(self):
+		with timing.phase('read'):
+			pass
+		timing.add_bytes('read', 5)
+		record = timing.report()
+		timing.merge(record)
+		phases = timing.report()['phases']
+		assert phases['read']['calls'] == 2
+		assert phases['read']['bytes'] == 10
+		timing.reset()
+		assert timing.report()['phases'] == {}
@@ -0,0 +1,208 @@
+import httplib
+import os
+import time
+from StringIO import StringIO
+from multiprocessing.pool import ThreadPool
+from pifmod import urlio
+from . import mockserver
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class Handler(mockserver.Handler):
+	"""
+	Serves /samples (with an ETag), /flaky (503 until the third request),
+	redirects /moved to /samples and /loop to itself, drops the
+	connection for /reset, sends half of the body of /truncated and
+	/chunked and returns 404 for anything else.
+	"""
+	body = '[{"id": "abc", "name": "P002_B001_N02"}]'
+	etag = '"v1"'
+	requests = []
+	clients = set()
+
+	def do_GET(self):
+		Handler.requests.append((self.path, self.headers.get('If-None-Match')))
+		Handler.clients.add(self.client_address)
+		if self.path == '/flaky' and len(Handler.requests) < 3:
+			self.send_body('', status=503)
+			return
+		if self.path == '/reset':
+			# close the connection without a response
+			self.close_connection = 1
+			return
+		if self.path == '/truncated':
+			self.send_response(200)
+			self.send_header('Content-Length', '200')
+			self.end_headers()
+			self.wfile.write(100*'x')
+			self.close_connection = 1
+			return
+		if self.path == '/chunked':
+			self.send_response(200)
+			self.send_header('Transfer-Encoding', 'chunked')
+			self.end_headers()
+			self.wfile.write('64\r\n' + 100*'x' + '\r\n')
+			self.close_connection = 1
+			return
+		if self.path in ('/moved', '/loop'):
+			location = '/samples' if self.path == '/moved' else '/loop'
+			self.send_body('moved', status=302,
+						   headers=[('Location', location)])
+			return
+		if self.path.split('?')[0] not in ('/samples', '/flaky'):
+			self.send_error(404)
+			return
+		if self.headers.get('If-None-Match') == Handler.etag:
+			self.send_response(304)
+			self.end_headers()
+			return
+		self.send_body(Handler.body, headers=[('ETag', Handler.etag)])
+
+class TestClass: # keep this the same
+	def setUp(self):
+		self.mock = mockserver.MockServer(Handler)
+		self.host = self.mock.host
+		self.cachedir = self.mock.cachedir
+		Handler.requests = []
+		Handler.clients = set()
+		Handler.etag = '"v1"'
+
+	def test_fetch_cached_across_calls(self):
+		url = self.host + '/samples'
+		assert urlio.fetch(url) == Handler.body
+		assert urlio.fetch(url) == Handler.body
+		assert len(Handler.requests) == 1, Handler.requests
+
+	def test_fetch_revalidates_stale_entry(self):
+		url = self.host + '/samples'
+		urlio.fetch(url)
+		assert urlio.fetch(url, ttl=0) == Handler.body
+		assert Handler.requests[-1] == ('/samples', '"v1"'), Handler.requests
+		# changed on the server
+		Handler.etag = '"v2"'
+		assert urlio.fetch(url, ttl=0) == Handler.body
+		assert len(Handler.requests) == 3
+
+	def test_fetch_not_found(self):
+		try:
+			urlio.fetch(self.host + '/missing')
+			assert False, 'IOError expected.'
+		except IOError:
+			pass
+
+	def test_redirect_followed(self):
+		# the resource, not the redirect, is returned and cached
+		url = self.host + '/moved'
+		assert urlio.fetch(url) == Handler.body
+		assert urlio.fetch(url) == Handler.body
+		assert [path for path, etag in Handler.requests] == \
+			['/moved', '/samples'], Handler.requests
+		# redirected too often
+		try:
+			urlio.fetch(self.host + '/loop')
+			assert False, 'IOError expected.'
+		except IOError:
+			pass
+		assert len(Handler.requests) == 3 + urlio.MAX_REDIRECTS
+
+	def test_clear_cache(self):
+		url = self.host + '/samples'
+		urlio.fetch(url)
+		urlio.clear_cache(url)
+		assert os.listdir(self.cachedir) == []
+		urlio.fetch(url)
+		assert len(Handler.requests) == 2
+
+	def test_eviction(self):
+		urlio.fetch(self.host + '/samples')
+		# room for one entry (body and metadata), not two
+		urlio.configure_cache(max_size=64 + sum(
+			os.path.getsize(os.path.join(self.cachedir, name))
+			for name in os.listdir(self.cachedir)))
+		urlio.fetch(self.host + '/samples?page=2')
+		assert len(os.listdir(self.cachedir)) == 2
+
+	def test_cold_cache_concurrent(self):
+		# the cache directory is created by whichever fetch gets there
+		# first; slowing makedirs down lets the others try as well
+		urlio.configure_cache(directory=os.path.join(self.cachedir, 'new'))
+		urls = [self.host + '/samples?page={}'.format(i) for i in range(16)]
+		makedirs = os.makedirs
+		def slow_makedirs(*args, **kwds):
+			time.sleep(0.05)
+			return makedirs(*args, **kwds)
+		os.makedirs = slow_makedirs
+		pool = ThreadPool(16)
+		try:
+			bodies = pool.map(urlio.fetch, urls)
+		finally:
+			os.makedirs = makedirs
+			pool.close()
+			pool.join()
+		assert bodies == [Handler.body]*16
+		assert len(os.listdir(urlio.CACHE_DIR)) == 32
+
+	def test_cache_write_fails(self):
+		# a response that cannot be cached is still returned
+		blocker = os.path.join(self.cachedir, 'file')
+		open(blocker, 'w').close()
+		urlio.configure_cache(directory=os.path.join(blocker, 'cache'))
+		assert urlio.fetch(self.host + '/samples') == Handler.body
+		assert urlio.fetch(self.host + '/samples') == Handler.body
+		assert len(Handler.requests) == 2
+
+	def test_connection_reused(self):
+		for i in range(3):
+			urlio.fetch(self.host + '/samples', cache=False)
+		assert len(Handler.requests) == 3
+		assert len(Handler.clients) == 1, Handler.clients
+
+	def test_retry_unavailable(self):
+		assert urlio.fetch(self.host + '/flaky', cache=False) == Handler.body
+		assert len(Handler.requests) == 3
+
+	def test_retries_bounded(self):
+		# pooled connections that fail are retried once, not once each
+		netloc = self.host[len('http://'):]
+		urlio._pool[('http', netloc)] = [httplib.HTTPConnection(netloc)
+										 for i in range(urlio.POOL_SIZE)]
+		try:
+			urlio.fetch(self.host + '/reset', cache=False, retries=1)
+			assert False, 'IOError expected.'
+		except IOError:
+			pass
+		assert len(Handler.requests) == 2, Handler.requests
+
+	def test_download(self):
+		urlio.CHUNK_SIZE, chunk_size = 8, urlio.CHUNK_SIZE
+		try:
+			ofs = StringIO()
+			urlio.download(self.host + '/samples', ofs)
+			assert ofs.getvalue() == Handler.body
+			assert os.listdir(self.cachedir) == []
+		finally:
+			urlio.CHUNK_SIZE = chunk_size
+
+	def test_download_incomplete(self):
+		# a body cut short is neither accepted nor requested again
+		urlio.CHUNK_SIZE, chunk_size = 8, urlio.CHUNK_SIZE
+		try:
+			for path in ('/truncated', '/chunked'):
+				Handler.requests = []
+				ofs = StringIO()
+				try:
+					urlio.download(self.host + path, ofs)
+					assert False, 'IOError expected.'
+				except IOError:
+					pass
+				assert 0 < len(ofs.getvalue()) <= 100, \
+					(path, len(ofs.getvalue()))
+				assert len(Handler.requests) == 1, Handler.requests
+		finally:
+			urlio.CHUNK_SIZE = chunk_size
+
+	def tearDown(self):
+		# clean up
+		self.mock.close()
@@ -0,0 +1,31 @@
+from pifmod import values
+
+# To test, simply run
+# [...]$ nosetests (optionally with -v)
+# and a report a summary of the results
+
+class TestClass: # keep this the same
+	def test_parse_value(self):
+		assert values.parse_value('bar') == ('scalars', 'bar')
+		assert values.parse_value('3.5') == ('scalars', 3.5)
+		assert values.parse_value('[1, 2, 3]') == ('vectors', [1, 2, 3])
+		assert values.parse_value('[a, b]') == ('vectors', ['a', 'b'])
+		assert values.parse_value('[[1, 2], [3, 4]]') == \
+			('matrices', [[1, 2], [3, 4]])
+
+	def test_classify_value(self):
+		# decoded strings are used as-is, not re-quoted
+		assert values.classify_value(u'Ar gas') == ('scalars', u'Ar gas')
+		assert values.classify_value([u'a b', 1]) == ('vectors', [u'a b', 1])
+		vtype, array = values.classify_value([[1., 2.], [3., 4.]],
+											 as_array=True)
+		assert vtype == 'matrices' and array.shape == (2, 2)
+		assert values.classify_value([]) == ('vectors', [])
+
+	def test_classify_value_invalid(self):
+		for value in ([[1, 2], [3]], [1, [2]], [[[1]], [[2]]]):
+			try:
+				values.classify_value(value)
+				assert False, 'ValueError expected for {}'.format(value)
+			except ValueError:
+				pass